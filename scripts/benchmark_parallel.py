@@ -0,0 +1,143 @@
+""" benchmark_parallel.py
+
+Compares the two ways the Evaluator can send work to its worker processes when run in parallel:
+    - USE_WORKER_INITIALIZER False: the datasets and metrics are pickled together with every (tracker, seq) task.
+    - USE_WORKER_INITIALIZER True: the datasets and metrics are sent once to each worker (or inherited if processes are
+      forked), and tasks only carry their keys.
+For each mode the number of bytes pickled for inter-process communication and the wall time are reported.
+This matters most for TAO and YouTubeVIS, where the dataset holds all gt annotations and tracker predictions.
+
+Run example:
+benchmark_parallel.py --DATASET TAO --NUM_PARALLEL_CORES 8 --TRACKERS_TO_EVAL Tracktor++
+
+Command Line Arguments: Defaults, # Comments
+    Benchmark arguments:
+        'DATASET': 'TAO',  # Valid: 'TAO', 'YouTubeVIS'
+        'NUM_PARALLEL_CORES': 8,
+        'METRICS': ['HOTA', 'CLEAR', 'Identity', 'TrackMAP']
+    Dataset arguments:
+        All dataset arguments of the chosen dataset (see run_tao.py and run_youtube_vis.py).
+"""
+
+import sys
+import os
+import time
+import pickle
+import argparse
+import multiprocessing
+from functools import partial
+from multiprocessing import freeze_support
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from trackeval.eval import _eval_sequence_task  # noqa: E402
+
+
+def get_ipc_bytes(dataset_list, metrics_list, num_cores, use_worker_initializer):
+    """Returns the number of bytes pickled to send all tasks (and the worker initial state) to the workers"""
+    metrics_list = metrics_list + [trackeval.metrics.Count()]
+    metric_names = trackeval.utils.validate_metrics_list(metrics_list)
+    tasks = []
+    for dataset_idx, dataset in enumerate(dataset_list):
+        tracker_list, seq_list, _ = dataset.get_eval_info()
+        tasks += [(dataset_idx, tracker, seq, None) for tracker in tracker_list for seq in seq_list]
+    if use_worker_initializer:
+        # Initial state is pickled once per worker, unless processes are forked.
+        if multiprocessing.get_start_method() == 'fork':
+            init_bytes = 0
+        else:
+            init_bytes = num_cores * len(pickle.dumps((dataset_list, metrics_list, metric_names)))
+        task_bytes = sum(len(pickle.dumps((_eval_sequence_task, task))) for task in tasks)
+    else:
+        init_bytes = 0
+        eval_task = partial(_eval_sequence_task, dataset_list=dataset_list, metrics_list=metrics_list,
+                            metric_names=metric_names)
+        # The pickled function is the same for each task, so it is only pickled once here.
+        task_bytes = len(tasks) * len(pickle.dumps(eval_task)) + sum(len(pickle.dumps(task)) for task in tasks)
+    return init_bytes + task_bytes, len(tasks)
+
+
+if __name__ == '__main__':
+    freeze_support()
+
+    # Command line interface:
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument('--DATASET', default='TAO', choices=['TAO', 'YouTubeVIS'])
+    dataset_name = pre_parser.parse_known_args()[0].DATASET
+    dataset_class = getattr(trackeval.datasets, dataset_name)
+
+    default_benchmark_config = {'NUM_PARALLEL_CORES': 8, 'METRICS': ['HOTA', 'CLEAR', 'Identity', 'TrackMAP']}
+    default_dataset_config = dataset_class.get_default_dataset_config()
+    default_dataset_config['PRINT_CONFIG'] = False
+    config = {**default_benchmark_config, **default_dataset_config}  # Merge default configs
+    parser = argparse.ArgumentParser(parents=[pre_parser])
+    for setting in config.keys():
+        if type(config[setting]) == list or type(config[setting]) == type(None):
+            parser.add_argument("--" + setting, nargs='+')
+        else:
+            parser.add_argument("--" + setting)
+    args = parser.parse_args().__dict__
+    args.pop('DATASET')
+    for setting in args.keys():
+        if args[setting] is not None:
+            if type(config[setting]) == type(True):
+                if args[setting] == 'True':
+                    x = True
+                elif args[setting] == 'False':
+                    x = False
+                else:
+                    raise Exception('Command line parameter ' + setting + 'must be True or False')
+            elif type(config[setting]) == type(1):
+                x = int(args[setting])
+            elif type(args[setting]) == type(None):
+                x = None
+            else:
+                x = args[setting]
+            config[setting] = x
+    dataset_config = {k: v for k, v in config.items() if k in default_dataset_config.keys()}
+
+    # Run code
+    time_start = time.time()
+    dataset_list = [dataset_class(dataset_config)]
+    print('Loaded %s dataset in %.2f seconds' % (dataset_name, time.time() - time_start))
+    metrics_list = []
+    for metric in [trackeval.metrics.HOTA, trackeval.metrics.CLEAR, trackeval.metrics.Identity,
+                   trackeval.metrics.TrackMAP]:
+        if metric.get_name() in config['METRICS']:
+            if metric == trackeval.metrics.TrackMAP and dataset_name == 'YouTubeVIS':
+                # specify TrackMAP config for YouTubeVIS
+                track_map_config = metric.get_default_metric_config()
+                track_map_config['USE_TIME_RANGES'] = False
+                track_map_config['AREA_RANGES'] = [[0 ** 2, 128 ** 2], [128 ** 2, 256 ** 2], [256 ** 2, 1e5 ** 2]]
+                metrics_list.append(metric(track_map_config))
+            else:
+                metrics_list.append(metric())
+    if len(metrics_list) == 0:
+        raise Exception('No metrics selected for evaluation')
+
+    results = {}
+    for use_worker_initializer in [False, True]:
+        eval_config = {'USE_PARALLEL': True,
+                       'NUM_PARALLEL_CORES': config['NUM_PARALLEL_CORES'],
+                       'USE_WORKER_INITIALIZER': use_worker_initializer,
+                       'PRINT_RESULTS': False,
+                       'PRINT_CONFIG': False,
+                       'TIME_PROGRESS': False,
+                       'OUTPUT_SUMMARY': False,
+                       'OUTPUT_DETAILED': False,
+                       'PLOT_CURVES': False,
+                       }
+        ipc_bytes, num_tasks = get_ipc_bytes(dataset_list, metrics_list, config['NUM_PARALLEL_CORES'],
+                                             use_worker_initializer)
+        time_start = time.time()
+        trackeval.Evaluator(eval_config).evaluate(dataset_list, metrics_list)
+        results[use_worker_initializer] = (ipc_bytes, num_tasks, time.time() - time_start)
+
+    print('\n%-25s%20s%20s%15s' % ('Mode', 'IPC MB', 'IPC MB per task', 'Wall time (s)'))
+    for use_worker_initializer, (ipc_bytes, num_tasks, wall_time) in results.items():
+        mode = 'worker initializer' if use_worker_initializer else 'pickle with each task'
+        print('%-25s%20.2f%20.4f%15.2f' % (mode, ipc_bytes / 2 ** 20, ipc_bytes / 2 ** 20 / max(1, num_tasks),
+                                           wall_time))
+    print('\nIPC reduced %.1fx, wall time reduced %.2fx (start method: %s)'
+          % (results[False][0] / max(1, results[True][0]), results[False][2] / max(1e-9, results[True][2]),
+             multiprocessing.get_start_method()))
@@ -0,0 +1,510 @@
+""" Tests for the Evaluator, run on small randomly generated sequences in the MOT Challenge format.
+These tests do not require any downloaded data.
+"""
+
+import json
+import os
+import re
+import numpy as np
+import pytest
+
+import trackeval
+
+
+def _write_mot_data(root, num_seqs=3, num_trackers=2, num_timesteps=30, seed=0):
+    """Writes random gt and tracker files in the MOT Challenge format and returns a dataset config for them"""
+    rng = np.random.RandomState(seed)
+    gt_fol = os.path.join(str(root), 'gt')
+    trackers_fol = os.path.join(str(root), 'trackers')
+    seq_info = {}
+    for s in range(num_seqs):
+        seq = 'seq-%02i' % s
+        seq_info[seq] = num_timesteps
+        num_objects = 5 + 3 * s
+        starts = rng.randint(0, num_timesteps // 2, num_objects)
+        ends = rng.randint(num_timesteps // 2, num_timesteps, num_objects) + 1
+        pos = rng.uniform(0, 500, (num_objects, 2))
+        vel = rng.uniform(-5, 5, (num_objects, 2))
+        size = rng.uniform(20, 80, (num_objects, 2))
+        classes = np.where(rng.uniform(size=num_objects) < 0.8, 1, 7)
+        gt_rows = []
+        for t in range(num_timesteps):
+            for i in range(num_objects):
+                if starts[i] <= t < ends[i]:
+                    x, y = pos[i] + t * vel[i]
+                    gt_rows.append([t + 1, i + 1, x, y, size[i, 0], size[i, 1], int(rng.uniform() < 0.95), classes[i],
+                                    1])
+        os.makedirs(os.path.join(gt_fol, seq, 'gt'))
+        np.savetxt(os.path.join(gt_fol, seq, 'gt', 'gt.txt'), np.array(gt_rows), delimiter=',',
+                   fmt=['%i', '%i', '%.2f', '%.2f', '%.2f', '%.2f', '%i', '%i', '%.1f'])
+
+        for k in range(num_trackers):
+            tracker_rows = []
+            for row in gt_rows:
+                if rng.uniform() < 0.1 * (k + 1):
+                    continue
+                # Introduce id switches by offsetting ids in the second half of the sequence.
+                tracker_id = row[1] + (100 if row[0] > num_timesteps // 2 and row[1] % (k + 2) == 0 else 0)
+                box = np.array(row[2:6]) + rng.normal(0, 4, 4)
+                tracker_rows.append([row[0], tracker_id, box[0], box[1], box[2], box[3], rng.uniform(), -1, -1, -1])
+            for t in range(num_timesteps):
+                if rng.uniform() < 0.3:
+                    box = np.concatenate((rng.uniform(0, 500, 2), rng.uniform(20, 80, 2)))
+                    tracker_rows.append([t + 1, 1000 + t, box[0], box[1], box[2], box[3], rng.uniform(), -1, -1, -1])
+            tracker_fol = os.path.join(trackers_fol, 'tracker_%i' % k, 'data')
+            os.makedirs(tracker_fol, exist_ok=True)
+            np.savetxt(os.path.join(tracker_fol, seq + '.txt'), np.array(tracker_rows), delimiter=',',
+                       fmt=['%i', '%i', '%.2f', '%.2f', '%.2f', '%.2f', '%.4f', '%i', '%i', '%i'])
+
+    dataset_config = {
+        'GT_FOLDER': gt_fol,
+        'TRACKERS_FOLDER': trackers_fol,
+        'SKIP_SPLIT_FOL': True,
+        'SEQ_INFO': seq_info,
+        'PRINT_CONFIG': False,
+    }
+    return dataset_config
+
+
+def _write_kitti_data(root, num_seqs=3, num_trackers=2, num_timesteps=30, seed=0):
+    """Writes random gt and tracker files in the Kitti 2D box format (cars and pedestrians) and returns a dataset
+    config for them"""
+    rng = np.random.RandomState(seed)
+    gt_fol = os.path.join(str(root), 'gt')
+    trackers_fol = os.path.join(str(root), 'trackers')
+    os.makedirs(os.path.join(gt_fol, 'label_02'))
+    seqmap = []
+    for s in range(num_seqs):
+        seq = '%04i' % s
+        seqmap.append('%s empty 000000 %06i' % (seq, num_timesteps))
+        num_objects = 6 + 3 * s
+        classes = np.where(rng.uniform(size=num_objects) < 0.5, 'Car', 'Pedestrian')
+        starts = rng.randint(0, num_timesteps // 2, num_objects)
+        ends = rng.randint(num_timesteps // 2, num_timesteps, num_objects) + 1
+        pos = rng.uniform(0, 500, (num_objects, 2))
+        vel = rng.uniform(-5, 5, (num_objects, 2))
+        size = rng.uniform(30, 80, (num_objects, 2))
+        gt_rows = []
+        for t in range(num_timesteps):
+            for i in range(num_objects):
+                if starts[i] <= t < ends[i]:
+                    x0, y0 = pos[i] + t * vel[i]
+                    gt_rows.append((t, i, classes[i], x0, y0, x0 + size[i, 0], y0 + size[i, 1]))
+        with open(os.path.join(gt_fol, 'label_02', seq + '.txt'), 'w') as f:
+            for t, i, cls, x0, y0, x1, y1 in gt_rows:
+                f.write('%i %i %s 0 0 0 %.2f %.2f %.2f %.2f 0 0 0 0 0 0 0\n' % (t, i, cls, x0, y0, x1, y1))
+        for k in range(num_trackers):
+            tracker_fol = os.path.join(trackers_fol, 'tracker_%i' % k, 'data')
+            os.makedirs(tracker_fol, exist_ok=True)
+            with open(os.path.join(tracker_fol, seq + '.txt'), 'w') as f:
+                for t, i, cls, x0, y0, x1, y1 in gt_rows:
+                    if rng.uniform() < 0.1 * (k + 1):
+                        continue
+                    tracker_id = i + (100 if t > num_timesteps // 2 and i % (k + 2) == 0 else 0)
+                    box = np.array([x0, y0, x1, y1]) + rng.normal(0, 4, 4)
+                    f.write('%i %i %s 0 0 0 %.2f %.2f %.2f %.2f 0 0 0 0 0 0 0 %.4f\n'
+                            % (t, tracker_id, cls, box[0], box[1], box[2], box[3], rng.uniform()))
+    with open(os.path.join(gt_fol, 'evaluate_tracking.seqmap.training'), 'w') as f:
+        f.write('\n'.join(seqmap) + '\n')
+
+    dataset_config = {
+        'GT_FOLDER': gt_fol,
+        'TRACKERS_FOLDER': trackers_fol,
+        'PRINT_CONFIG': False,
+    }
+    return dataset_config
+
+
+def _eval_config(**kwargs):
+    config = {
+        'PRINT_RESULTS': False,
+        'PRINT_CONFIG': False,
+        'TIME_PROGRESS': False,
+        'OUTPUT_SUMMARY': False,
+        'OUTPUT_DETAILED': False,
+        'PLOT_CURVES': False,
+        'LOG_ON_ERROR': None,
+        'NUM_PARALLEL_CORES': 2,
+    }
+    config.update(kwargs)
+    return config
+
+
+def _metrics():
+    return [trackeval.metrics.HOTA(), trackeval.metrics.CLEAR(), trackeval.metrics.Identity(),
+            trackeval.metrics.VACE()]
+
+
+def _assert_results_equal(res_a, res_b):
+    assert res_a.keys() == res_b.keys()
+    for key in res_a.keys():
+        if isinstance(res_a[key], dict):
+            _assert_results_equal(res_a[key], res_b[key])
+        else:
+            np.testing.assert_allclose(res_a[key], res_b[key], rtol=1e-12, atol=1e-12, err_msg=key)
+
+
+@pytest.fixture
+def mot_data(tmp_path):
+    return _write_mot_data(tmp_path)
+
+
+def _evaluate(eval_config, dataset_config):
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(dataset_config))
+    return trackeval.Evaluator(eval_config).evaluate([dataset], _metrics())
+
+
+@pytest.mark.parametrize('use_worker_initializer', [True, False])
+def test_parallel_matches_serial(mot_data, use_worker_initializer):
+    serial_res, serial_msg = _evaluate(_eval_config(USE_PARALLEL=False), mot_data)
+    parallel_res, parallel_msg = _evaluate(_eval_config(USE_PARALLEL=True,
+                                                        USE_WORKER_INITIALIZER=use_worker_initializer), mot_data)
+    assert serial_msg == parallel_msg
+    assert all(msg == 'Success' for msg in serial_msg['MotChallenge2DBox'].values())
+    assert list(parallel_res['MotChallenge2DBox'].keys()) == list(serial_res['MotChallenge2DBox'].keys())
+    _assert_results_equal(serial_res, parallel_res)
+
+
+def test_parallel_error_does_not_stop_other_trackers(mot_data):
+    with open(os.path.join(mot_data['TRACKERS_FOLDER'], 'tracker_0', 'data', 'seq-01.txt'), 'a') as f:
+        f.write('1,1,not,a,valid,box,1,-1,-1,-1\n')
+    res, msg = _evaluate(_eval_config(USE_PARALLEL=True, BREAK_ON_ERROR=False), mot_data)
+    assert res['MotChallenge2DBox']['tracker_0'] is None
+    assert msg['MotChallenge2DBox']['tracker_1'] == 'Success'
+    assert res['MotChallenge2DBox']['tracker_1']['COMBINED_SEQ']['pedestrian']['HOTA']['HOTA_TP'][0] > 0
+
+
+def test_cost_estimate_and_report(mot_data, tmp_path):
+    # Sequences with more objects are estimated to be more expensive.
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data))
+    estimates = [dataset.get_seq_cost_estimate('tracker_0', seq) for seq in ['seq-00', 'seq-01', 'seq-02']]
+    assert estimates[0] < estimates[1] < estimates[2]
+
+    report_file = os.path.join(str(tmp_path), 'cost_report.csv')
+    serial_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), mot_data)
+    parallel_res, _ = _evaluate(_eval_config(USE_PARALLEL=True, COST_REPORT_FILE=report_file), mot_data)
+    _assert_results_equal(serial_res, parallel_res)
+    with open(report_file) as f:
+        rows = [line.strip().split(',') for line in f]
+    assert rows[0] == ['dataset', 'tracker', 'seq', 'estimated_cost', 'scaled_estimate', 'seconds']
+    assert len(rows) == 1 + 6 + 2
+    assert {(row[1], row[2]) for row in rows[1:7]} == {('tracker_%i' % k, 'seq-%02i' % s)
+                                                       for k in range(2) for s in range(3)}
+
+
+
+def test_cost_estimate_without_text_files(tmp_path):
+    # BDD100K sequences are json files, whose lengths are only known once they are loaded.
+    gt_fol = os.path.join(str(tmp_path), 'gt')
+    tracker_fol = os.path.join(str(tmp_path), 'trackers', 'tracker_0', 'data')
+    os.makedirs(gt_fol)
+    os.makedirs(tracker_fol)
+    for s, num_dets in enumerate([1, 5]):
+        frames = [{'name': 'frame-%i' % t, 'index': t,
+                   'labels': [{'id': str(i), 'category': 'car', 'box2d': {'x1': 10 * i, 'y1': 0, 'x2': 10 * i + 5,
+                                                                          'y2': 5}} for i in range(num_dets)]}
+                  for t in range(4)]
+        for fol in [gt_fol, tracker_fol]:
+            with open(os.path.join(fol, 'seq-%i.json' % s), 'w') as f:
+                json.dump(frames, f)
+    dataset = trackeval.datasets.BDD100K2DBox({'GT_FOLDER': gt_fol, 'TRACKERS_FOLDER': os.path.dirname(
+        os.path.dirname(tracker_fol)), 'PRINT_CONFIG': False})
+    estimates = [dataset.get_seq_cost_estimate('tracker_0', seq) for seq in ['seq-0', 'seq-1']]
+    assert 0 < estimates[0] < estimates[1]
+    dataset.get_raw_seq_data('tracker_0', 'seq-0')
+    assert dataset.get_seq_cost_estimate('tracker_0', 'seq-0') == estimates[0]
+
+    # Other files and folders are estimated from their size.
+    assert trackeval.datasets.MotChallenge2DBox._estimate_file_rows(gt_fol) > 0
+    assert trackeval.datasets.MotChallenge2DBox._estimate_file_rows(os.path.join(gt_fol, 'seq-0.json')) > 0
+def test_longest_job_first(mot_data, monkeypatch):
+    dispatched_tasks = []
+
+    class SerialPool:
+        """Runs the tasks in the main process in the order in which they are handed out"""
+        def __init__(self, processes, initializer, initargs):
+            initializer(*initargs)
+
+        def imap_unordered(self, func, tasks, chunksize=1):
+            for task in tasks:
+                dispatched_tasks.append(task)
+                yield func(task)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+    monkeypatch.setattr(trackeval.eval, 'Pool', SerialPool)
+    serial_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), mot_data)
+    res, _ = _evaluate(_eval_config(USE_PARALLEL=True), mot_data)
+    _assert_results_equal(serial_res, res)
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data))
+    estimates = [dataset.get_seq_cost_estimate(tracker, seq) for _, tracker, seq, _ in dispatched_tasks]
+    assert len(dispatched_tasks) == 6
+    assert estimates == sorted(estimates, reverse=True)
+    assert [seq for _, _, seq, _ in dispatched_tasks[:2]] == ['seq-02', 'seq-02']
+
+    dispatched_tasks.clear()
+    _evaluate(_eval_config(USE_PARALLEL=True, ORDER_BY_COST_ESTIMATE=False), mot_data)
+    assert [task[1:3] for task in dispatched_tasks] == [(tracker, seq) for tracker in dataset.tracker_list
+                                                        for seq in dataset.seq_list]
+
+
+def test_gt_loaded_once_for_all_trackers(tmp_path):
+    dataset_config = _write_mot_data(tmp_path, num_trackers=3)
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(dataset_config))
+    load_raw_file = dataset._load_raw_file
+    gt_loads = []
+
+    def counting_load_raw_file(tracker, seq, is_gt):
+        if is_gt:
+            gt_loads.append(seq)
+        return load_raw_file(tracker, seq, is_gt)
+
+    dataset._load_raw_file = counting_load_raw_file
+    cached_res, _ = trackeval.Evaluator(_eval_config(USE_PARALLEL=False)).evaluate([dataset], _metrics())
+    assert sorted(gt_loads) == ['seq-00', 'seq-01', 'seq-02']
+
+    uncached_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), dict(dataset_config, GT_CACHE_SIZE_MB=0))
+    _assert_results_equal(cached_res, uncached_res)
+
+
+def test_gt_cache_size(mot_data):
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data, GT_CACHE_SIZE_MB=1024))
+    for seq in dataset.seq_list:
+        dataset._get_raw_gt_data('tracker_0', seq)
+    nbytes = {seq: seq_nbytes for seq, (_, seq_nbytes) in dataset.gt_cache.items()}
+    # Only the two largest sequences fit into the cache at once.
+    max_nbytes = nbytes['seq-01'] + nbytes['seq-02']
+    assert nbytes['seq-00'] + max_nbytes > max_nbytes
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data, GT_CACHE_SIZE_MB=max_nbytes / 2 ** 20))
+    for seq, cached_seqs in [('seq-00', ['seq-00']), ('seq-01', ['seq-00', 'seq-01']), ('seq-02', ['seq-01', 'seq-02']),
+                             ('seq-01', ['seq-02', 'seq-01']), ('seq-00', ['seq-01', 'seq-00'])]:
+        dataset._get_raw_gt_data('tracker_0', seq)
+        assert list(dataset.gt_cache.keys()) == cached_seqs
+        assert dataset.gt_cache_nbytes == sum(nbytes[cached_seq] for cached_seq in cached_seqs) <= max_nbytes
+
+    # Sequences larger than the cache are not cached.
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data, GT_CACHE_SIZE_MB=nbytes['seq-01'] / 2 ** 20))
+    dataset._get_raw_gt_data('tracker_0', 'seq-01')
+    dataset._get_raw_gt_data('tracker_0', 'seq-02')
+    assert list(dataset.gt_cache.keys()) == ['seq-01']
+    assert dataset.gt_cache_nbytes == nbytes['seq-01']
+
+
+def test_shared_memory_released_after_error(mot_data, monkeypatch):
+    from multiprocessing import shared_memory
+    shared_gt_data_list = []
+
+    class RecordedSharedGtData(trackeval._shared_memory.SharedGtData):
+        def __init__(self, dataset_list):
+            super().__init__(dataset_list)
+            shared_gt_data_list.append(self)
+
+    monkeypatch.setattr(trackeval.eval, 'SharedGtData', RecordedSharedGtData)
+    with open(os.path.join(mot_data['TRACKERS_FOLDER'], 'tracker_0', 'data', 'seq-01.txt'), 'a') as f:
+        f.write('1,1,not,a,valid,box,1,-1,-1,-1\n')
+    res, msg = _evaluate(_eval_config(USE_PARALLEL=True, USE_SHARED_MEMORY_GT=True, BREAK_ON_ERROR=False), mot_data)
+    assert res['MotChallenge2DBox']['tracker_0'] is None
+    assert msg['MotChallenge2DBox']['tracker_1'] == 'Success'
+    block_names = [descriptor[0] for shared_gt_data in shared_gt_data_list
+                   for descriptor in shared_gt_data.descriptors if descriptor is not None]
+    assert len(block_names) == 1
+    for block_name in block_names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=block_name)
+        if os.path.isdir('/dev/shm'):
+            assert block_name.lstrip('/') not in os.listdir('/dev/shm')
+
+
+def test_parallel_shared_memory_gt_matches_serial(mot_data):
+    serial_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), mot_data)
+    parallel_res, parallel_msg = _evaluate(_eval_config(USE_PARALLEL=True, USE_SHARED_MEMORY_GT=True), mot_data)
+    assert all(msg == 'Success' for msg in parallel_msg['MotChallenge2DBox'].values())
+    _assert_results_equal(serial_res, parallel_res)
+
+
+def test_shared_gt_data_round_trip(mot_data):
+    from trackeval._shared_memory import SharedGtData, attach_shared_gt_data
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data))
+    shared_gt_data = SharedGtData([dataset])
+    try:
+        worker_dataset = trackeval.datasets.MotChallenge2DBox(dict(mot_data))
+        blocks = attach_shared_gt_data([worker_dataset], shared_gt_data.descriptors)
+        for seq in dataset.seq_list:
+            expected = dataset._load_raw_file('tracker_0', seq, is_gt=True)
+            shared = worker_dataset._get_raw_gt_data('tracker_0', seq)
+            for key in ['gt_ids', 'gt_classes', 'gt_dets']:
+                assert all(not v.flags.writeable for v in shared[key])
+                for expected_t, shared_t in zip(expected[key], shared[key]):
+                    np.testing.assert_array_equal(expected_t, shared_t)
+                    assert expected_t.dtype == shared_t.dtype and expected_t.shape == shared_t.shape
+            for expected_t, shared_t in zip(expected['gt_extras'], shared['gt_extras']):
+                np.testing.assert_array_equal(expected_t['zero_marked'], shared_t['zero_marked'])
+        assert len(blocks) == 1
+    finally:
+        shared_gt_data.unlink()
+
+
+def test_parallel_class_chunks_match_serial(tmp_path):
+    # With more cores than sequences, each sequence is split into one task per class.
+    dataset_config = _write_kitti_data(tmp_path, num_seqs=1)
+    results = []
+    for eval_config in [_eval_config(USE_PARALLEL=False),
+                        _eval_config(USE_PARALLEL=True, CLASSES_PER_TASK=1, NUM_PARALLEL_CORES=4)]:
+        dataset = trackeval.datasets.Kitti2DBox(dict(dataset_config))
+        res, msg = trackeval.Evaluator(eval_config).evaluate([dataset], _metrics())
+        assert all(m == 'Success' for m in msg['Kitti2DBox'].values())
+        assert list(res['Kitti2DBox']['tracker_0']['0000'].keys()) == ['car', 'pedestrian']
+        results.append(res)
+    assert results[0]['Kitti2DBox']['tracker_0']['COMBINED_SEQ']['car']['HOTA']['HOTA_TP'][0] > 0
+    assert results[0]['Kitti2DBox']['tracker_0']['COMBINED_SEQ']['pedestrian']['HOTA']['HOTA_TP'][0] > 0
+    _assert_results_equal(results[0], results[1])
+
+
+
+def test_split_class_tasks(tmp_path):
+    dataset = trackeval.datasets.Kitti2DBox(dict(_write_kitti_data(tmp_path, num_seqs=2, num_trackers=1)))
+    tasks = [(0, 'tracker_0', '0000', None), (0, 'tracker_0', '0001', None)]
+    split_tasks = trackeval.Evaluator._split_class_tasks
+    # Sequences are only split as far as needed to spread their estimated cost evenly over the cores.
+    assert split_tasks(tasks, [dataset], {task[:3]: 1 for task in tasks}, 1, 2) == tasks
+    cost_estimates = {(0, 'tracker_0', '0000'): 3, (0, 'tracker_0', '0001'): 1}
+    assert split_tasks(tasks, [dataset], cost_estimates, 1, 4) == [
+        (0, 'tracker_0', '0000', ('car',)), (0, 'tracker_0', '0000', ('pedestrian',)), tasks[1]]
+    assert split_tasks(tasks, [dataset], cost_estimates, 2, 4) == tasks
+    # Without cost estimates, all sequences are split alike.
+    cost_estimates = {(0, 'tracker_0', '0000'): 0, (0, 'tracker_0', '0001'): 0}
+    assert split_tasks(tasks, [dataset], cost_estimates, 1, 4) == [
+        (0, 'tracker_0', seq, (cls,)) for seq in ['0000', '0001'] for cls in ['car', 'pedestrian']]
+def test_parallel_timing(mot_data, monkeypatch, capsys):
+    # The Evaluator enables timing globally, which is undone after the test.
+    monkeypatch.setattr(trackeval._timing, 'DO_TIMING', False)
+    monkeypatch.setattr(trackeval._timing, 'DISPLAY_LESS_PROGRESS', False)
+    _evaluate(_eval_config(USE_PARALLEL=True, TIME_PROGRESS=True), mot_data)
+    out = capsys.readouterr().out
+    workers_out = out[out.index('Timing analysis of workers'):]
+    for method_name in ['MotChallenge2DBox.get_raw_seq_data', 'MotChallenge2DBox._calculate_seq_similarities',
+                        'MotChallenge2DBox.get_preprocessed_seq_data', 'HOTA.eval_sequence', 'eval_sequence']:
+        assert method_name in workers_out
+    assert 'Worker utilization' in workers_out
+    # The assignment problems solved in the workers are counted as well.
+    num_assignments = int(re.search(r'Assignments: (\d+), of which (\d+)', workers_out).group(1))
+    assert num_assignments > 0
+
+    _evaluate(_eval_config(USE_PARALLEL=False, TIME_PROGRESS=True), mot_data)
+    out = capsys.readouterr().out
+    assert int(re.search(r'Assignments: (\d+), of which (\d+)', out).group(1)) == num_assignments
+
+
+@pytest.mark.parametrize('use_parallel', [False, True])
+def test_result_cache(mot_data, tmp_path, use_parallel):
+    dataset_config = dict(mot_data, OUTPUT_FOLDER=os.path.join(str(tmp_path), 'output'))
+    eval_config = _eval_config(USE_PARALLEL=use_parallel, USE_RESULT_CACHE=True)
+    uncached_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), dataset_config)
+    first_res, _ = _evaluate(eval_config, dataset_config)
+    _assert_results_equal(uncached_res, first_res)
+
+    # Only sequences whose files changed are evaluated again.
+    with open(os.path.join(mot_data['TRACKERS_FOLDER'], 'tracker_1', 'data', 'seq-01.txt'), 'a') as f:
+        f.write('1,2000,10,10,50,50,0.5,-1,-1,-1\n')
+    dataset = trackeval.datasets.MotChallenge2DBox(dict(dataset_config))
+    load_raw_file = dataset._load_raw_file
+    tracker_loads = []
+
+    def counting_load_raw_file(tracker, seq, is_gt):
+        if not is_gt:
+            tracker_loads.append((tracker, seq))
+        return load_raw_file(tracker, seq, is_gt)
+
+    dataset._load_raw_file = counting_load_raw_file
+    second_res, _ = trackeval.Evaluator(_eval_config(USE_PARALLEL=False, USE_RESULT_CACHE=True)).evaluate(
+        [dataset], _metrics())
+    assert tracker_loads == [('tracker_1', 'seq-01')]
+    _assert_results_equal(first_res['MotChallenge2DBox']['tracker_0'], second_res['MotChallenge2DBox']['tracker_0'])
+    changed_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), dataset_config)
+    _assert_results_equal(changed_res, second_res)
+
+    # All results are now cached.
+    cached_res, cached_msg = _evaluate(eval_config, dataset_config)
+    assert all(msg == 'Success' for msg in cached_msg['MotChallenge2DBox'].values())
+    _assert_results_equal(changed_res, cached_res)
+
+
+@pytest.mark.parametrize('use_parallel', [False, True])
+def test_time_chunks_match_serial(tmp_path, use_parallel):
+    dataset_config = _write_mot_data(tmp_path, num_timesteps=60)
+    serial_res, _ = _evaluate(_eval_config(USE_PARALLEL=False), dataset_config)
+    chunked_res, chunked_msg = _evaluate(_eval_config(USE_PARALLEL=use_parallel, TIME_CHUNK_SIZE=7), dataset_config)
+    assert all(msg == 'Success' for msg in chunked_msg['MotChallenge2DBox'].values())
+    # Results must be bit-identical, not only close.
+    np.testing.assert_equal(serial_res, chunked_res)
+
+
+def test_result_cache_seq_info(mot_data, tmp_path):
+    # Sequences are read from a seqmap file and their lengths from seqinfo.ini files instead of from SEQ_INFO.
+    seqmap_file = os.path.join(str(tmp_path), 'seqmap.txt')
+    with open(seqmap_file, 'w') as f:
+        f.write('name\n' + '\n'.join(mot_data['SEQ_INFO']) + '\n')
+    for seq, seq_length in mot_data['SEQ_INFO'].items():
+        with open(os.path.join(mot_data['GT_FOLDER'], seq, 'seqinfo.ini'), 'w') as f:
+            f.write('[Sequence]\nname=%s\nseqLength=%i\n' % (seq, seq_length))
+    dataset_config = dict(mot_data, SEQ_INFO=None, SEQMAP_FILE=seqmap_file,
+                          OUTPUT_FOLDER=os.path.join(str(tmp_path), 'output'))
+    eval_config = _eval_config(USE_PARALLEL=False, USE_RESULT_CACHE=True)
+    _evaluate(eval_config, dataset_config)
+
+    def evaluated_seqs():
+        dataset = trackeval.datasets.MotChallenge2DBox(dict(dataset_config))
+        load_raw_file = dataset._load_raw_file
+        tracker_loads = []
+
+        def counting_load_raw_file(tracker, seq, is_gt):
+            if not is_gt:
+                tracker_loads.append((tracker, seq))
+            return load_raw_file(tracker, seq, is_gt)
+
+        dataset._load_raw_file = counting_load_raw_file
+        trackeval.Evaluator(eval_config).evaluate([dataset], _metrics())
+        return sorted(tracker_loads)
+
+    assert evaluated_seqs() == []
+    # Changing the length of a sequence in its ini file changes its results.
+    with open(os.path.join(mot_data['GT_FOLDER'], 'seq-01', 'seqinfo.ini'), 'w') as f:
+        f.write('[Sequence]\nname=seq-01\nseqLength=%i\n' % (mot_data['SEQ_INFO']['seq-01'] + 5))
+    assert evaluated_seqs() == [('tracker_0', 'seq-01'), ('tracker_1', 'seq-01')]
+    assert evaluated_seqs() == []
+
+
+class _LengthsOnLoadDataset(trackeval.datasets.MotChallenge2DBox):
+    """Only knows the length of a sequence once it is loaded, like BDD100K"""
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self._loaded_lengths, self.seq_lengths = self.seq_lengths, {}
+
+    def _load_raw_file(self, tracker, seq, is_gt):
+        self.seq_lengths[seq] = self._loaded_lengths[seq]
+        return super()._load_raw_file(tracker, seq, is_gt)
+
+
+def test_result_cache_lengths_known_after_loading(mot_data, tmp_path):
+    dataset_config = dict(mot_data, OUTPUT_FOLDER=os.path.join(str(tmp_path), 'output'))
+    eval_config = _eval_config(USE_PARALLEL=False, USE_RESULT_CACHE=True)
+    first_res, _ = trackeval.Evaluator(eval_config).evaluate([_LengthsOnLoadDataset(dict(dataset_config))], _metrics())
+
+    # A fresh dataset and evaluator read all results back from the cache.
+    dataset = _LengthsOnLoadDataset(dict(dataset_config))
+    load_raw_file = dataset._load_raw_file
+    loads = []
+
+    def counting_load_raw_file(tracker, seq, is_gt):
+        loads.append((tracker, seq))
+        return load_raw_file(tracker, seq, is_gt)
+
+    dataset._load_raw_file = counting_load_raw_file
+    cached_res, _ = trackeval.Evaluator(eval_config).evaluate([dataset], _metrics())
+    assert loads == []
+    _assert_results_equal(first_res, cached_res)
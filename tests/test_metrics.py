@@ -1,5 +1,6 @@
 import numpy as np
 import pytest
+from scipy.optimize import linear_sum_assignment
 
 import trackeval
 
@@ -160,6 +161,48 @@ def split_tracks():
     return data, expected
 
 
+def continued_tracks():
+    num_timesteps = 6
+    num_gt_ids = 2
+    num_tracker_ids = 2
+
+    # After the first timestep, both tracks overlap more with the other ground-truth, but continuing the tracks of the
+    # previous timestep takes precedence in CLEAR matching.
+    similarity = np.zeros([num_timesteps, num_gt_ids, num_tracker_ids])
+    similarity[:, 0, 0] = [0.9, 0.6, 0.6, 0.6, 0.6, 0.6]
+    similarity[:, 1, 1] = [0.9, 0.6, 0.6, 0.6, 0.6, 0.6]
+    similarity[:, 0, 1] = [0.6, 0.9, 0.9, 0.9, 0.9, 0.9]
+    similarity[:, 1, 0] = [0.6, 0.9, 0.9, 0.9, 0.9, 0.9]
+    gt_present = np.ones([num_timesteps, num_gt_ids])
+    tracker_present = np.ones([num_timesteps, num_tracker_ids])
+
+    expected = {
+            'clear': {
+                    'CLR_TP': 12,
+                    'CLR_FN': 0,
+                    'CLR_FP': 0,
+                    'IDSW': 0,
+                    'MOTA': 1,
+                    'MOTP': (2 * 0.9 + 10 * 0.6) / 12,
+            },
+            'identity': {
+                    'IDTP': 12,
+                    'IDFN': 0,
+                    'IDFP': 0,
+            },
+    }
+
+    data = _from_dense(
+            num_timesteps=num_timesteps,
+            num_gt_ids=num_gt_ids,
+            num_tracker_ids=num_tracker_ids,
+            gt_present=gt_present,
+            tracker_present=tracker_present,
+            similarity=similarity,
+    )
+    return data, expected
+
+
 def _from_dense(num_timesteps, num_gt_ids, num_tracker_ids, gt_present, tracker_present, similarity):
     gt_subset = [np.flatnonzero(gt_present[t, :]) for t in range(num_timesteps)]
     tracker_subset = [np.flatnonzero(tracker_present[t, :]) for t in range(num_timesteps)]
@@ -184,12 +227,14 @@ METRICS_BY_NAME = {
         'clear': trackeval.metrics.CLEAR(),
         'identity': trackeval.metrics.Identity(),
         'vace': trackeval.metrics.VACE(),
+        'hota': trackeval.metrics.HOTA(),
 }
 
 SEQUENCE_BY_NAME = {
         'no_confusion': no_confusion(),
         'with_confusion': with_confusion(),
         'split_tracks': split_tracks(),
+        'continued_tracks': continued_tracks(),
 }
 
 
@@ -203,6 +248,8 @@ SEQUENCE_BY_NAME = {
         ('split_tracks', 'clear'),
         ('split_tracks', 'identity'),
         ('split_tracks', 'vace'),
+        ('continued_tracks', 'clear'),
+        ('continued_tracks', 'identity'),
 ])
 def test_metric(sequence_name, metric_name):
     data, expected = SEQUENCE_BY_NAME[sequence_name]
@@ -210,3 +257,347 @@ def test_metric(sequence_name, metric_name):
     result = metric.eval_sequence(data)
     for key, value in expected[metric_name].items():
         assert result[key] == pytest.approx(value), key
+
+
+@pytest.mark.parametrize('sequence_name', sorted(SEQUENCE_BY_NAME.keys()))
+@pytest.mark.parametrize('metric_name', sorted(METRICS_BY_NAME.keys()))
+@pytest.mark.parametrize('chunk_size', [1, 2, 4])
+def test_metric_chunked(sequence_name, metric_name, chunk_size):
+    data, _ = SEQUENCE_BY_NAME[sequence_name]
+    metric = METRICS_BY_NAME[metric_name]
+    # Evaluating in time chunks must give exactly the same results.
+    np.testing.assert_equal(metric.eval_sequence_chunked(data, chunk_size), metric.eval_sequence(data))
+
+
+@pytest.mark.parametrize('sequence_name', sorted(SEQUENCE_BY_NAME.keys()))
+@pytest.mark.parametrize('chunk_size', [None, 2])
+def test_hota_sparse_id_pairs(sequence_name, chunk_size):
+    data, _ = SEQUENCE_BY_NAME[sequence_name]
+    dense_metric, sparse_metric = trackeval.metrics.HOTA(), trackeval.metrics.HOTA()
+    sparse_metric.sparse_id_pairs_threshold = 0
+    # Storing the alignment scores of id pairs sparsely must give exactly the same results.
+    if chunk_size is None:
+        np.testing.assert_equal(sparse_metric.eval_sequence(data), dense_metric.eval_sequence(data))
+    else:
+        np.testing.assert_equal(sparse_metric.eval_sequence_chunked(data, chunk_size),
+                                dense_metric.eval_sequence(data))
+
+
+@pytest.mark.parametrize('min_size_to_split', [1, 64])
+def test_max_score_assignment(monkeypatch, min_size_to_split):
+    monkeypatch.setattr(trackeval._assignment, 'MIN_SIZE_TO_SPLIT', min_size_to_split)
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        num_rows, num_cols = rng.randint(0, 20, size=2)
+        score_mat = rng.rand(num_rows, num_cols) * (rng.rand(num_rows, num_cols) < rng.rand() * 0.3)
+        match_rows, match_cols = trackeval._assignment.max_score_assignment(score_mat)
+        # The assignment must be optimal, and only contain matches with non-zero score.
+        opt_rows, opt_cols = linear_sum_assignment(-score_mat)
+        assert np.isclose(score_mat[match_rows, match_cols].sum(), score_mat[opt_rows, opt_cols].sum())
+        assert np.all(score_mat[match_rows, match_cols] > 0)
+        assert np.all(np.diff(match_rows) > 0) and len(np.unique(match_cols)) == len(match_cols)
+        # The same for the score matrix given by its non-zero entries.
+        rows, cols = np.nonzero(score_mat)
+        matched = trackeval._assignment.sparse_max_score_assignment(rows, cols, score_mat[rows, cols])
+        assert np.isclose(score_mat[rows[matched], cols[matched]].sum(), score_mat[opt_rows, opt_cols].sum())
+        assert np.all(np.diff(rows[matched]) > 0) and len(np.unique(cols[matched])) == len(matched)
+
+
+@pytest.mark.parametrize('min_size_to_split', [1, 64])
+def test_max_score_assignment_ties(monkeypatch, min_size_to_split):
+    monkeypatch.setattr(trackeval._assignment, 'MIN_SIZE_TO_SPLIT', min_size_to_split)
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        num_rows, num_cols = rng.randint(64, 80, size=2)
+        score_mat = np.zeros((num_rows, num_cols))
+        num_scores = rng.randint(num_rows // 2, 3 * num_rows)
+        score_mat[rng.randint(0, num_rows, num_scores), rng.randint(0, num_cols, num_scores)] = rng.choice(
+            [0.5, 0.75, 1, 1000.5, 1001], num_scores)
+        # Ties are broken as by the hungarian algorithm on the full matrix.
+        opt_rows, opt_cols = linear_sum_assignment(-score_mat)
+        opt_mask = score_mat[opt_rows, opt_cols] > 0
+        match_rows, match_cols = trackeval._assignment.max_score_assignment(score_mat)
+        np.testing.assert_equal(match_rows, opt_rows[opt_mask])
+        np.testing.assert_equal(match_cols, opt_cols[opt_mask])
+
+
+def test_max_score_assignment_permutation():
+    trackeval._assignment.pop_counts()
+    score_mat = np.array([[0, 0.9, 0, 0], [0, 0, 0, 0], [0.6, 0, 0, 0]])
+    match_rows, match_cols = trackeval._assignment.max_score_assignment(score_mat)
+    np.testing.assert_equal(match_rows, [0, 2])
+    np.testing.assert_equal(match_cols, [1, 0])
+    score_mat[1, 1] = 0.7
+    match_rows, match_cols = trackeval._assignment.max_score_assignment(score_mat)
+    np.testing.assert_equal(match_rows, [0, 2])
+    assert trackeval._assignment.pop_counts() == {'permutation': 1, 'solved': 1}
+
+
+def test_shared_products(monkeypatch):
+    monkeypatch.setattr(trackeval.metrics._shared_products, '_PRODUCTS',
+                        dict(trackeval.metrics._shared_products._PRODUCTS))
+    calls = []
+
+    @trackeval.metrics.register_shared_product('num_dets', per_timestep=True)
+    def num_dets(data, t, key):
+        calls.append((key, t))
+        return len(data[key][t])
+
+    data, _ = no_confusion()
+    data = dict(data)
+    trackeval.metrics._shared_products.compute_shared_products(
+        data, [('num_dets', 'gt_ids'), ('num_dets', 'tracker_ids'), ('num_dets', 'gt_ids'), ('id_counts',)])
+    # The per-timestep products are calculated in one loop over the timesteps, and each product only once.
+    assert calls == [(key, t) for t in range(data['num_timesteps']) for key in ['gt_ids', 'tracker_ids']]
+    assert trackeval.metrics.get_shared_product(data, 'num_dets', 'gt_ids') == [len(ids) for ids in data['gt_ids']]
+    np.testing.assert_equal(trackeval.metrics.get_shared_product(data, 'id_counts')[0],
+                            np.bincount(np.concatenate(data['gt_ids']), minlength=data['num_gt_ids']))
+    assert len(calls) == 2 * data['num_timesteps']
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        trackeval.metrics.get_shared_product(data, 'unknown')
+
+
+def test_track_lifespans():
+    for _, (data, _) in sorted(SEQUENCE_BY_NAME.items()):
+        data = dict(data)
+        lifespans = trackeval.metrics.get_shared_product(data, 'track_lifespans')
+        for i, (ids_key, num_ids_key) in enumerate([('gt_ids', 'num_gt_ids'), ('tracker_ids', 'num_tracker_ids')]):
+            for id_ in range(data[num_ids_key]):
+                timesteps = [t for t, ids_t in enumerate(data[ids_key]) if id_ in ids_t]
+                assert lifespans[2 * i][id_] == (timesteps[0] if timesteps else -1)
+                assert lifespans[2 * i + 1][id_] == (timesteps[-1] if timesteps else -1)
+
+
+def test_identity_assignment():
+    # Compare to the assignment of gt_ids and tracker_ids (each with a dummy to stay unmatched) minimising IDFN + IDFP.
+    rng = np.random.RandomState(0)
+    metric = trackeval.metrics.Identity()
+    for _ in range(100):
+        num_gt_ids, num_tracker_ids = rng.randint(1, 15, size=2)
+        potential_matches_count = rng.randint(0, 10, size=(num_gt_ids, num_tracker_ids)) * \
+            (rng.rand(num_gt_ids, num_tracker_ids) < 0.3)
+        gt_id_count = potential_matches_count.sum(1) + rng.randint(0, 10, size=num_gt_ids)
+        tracker_id_count = potential_matches_count.sum(0) + rng.randint(0, 10, size=num_tracker_ids)
+        fn_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
+        fp_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
+        fn_mat[:num_gt_ids, num_tracker_ids:] = 1e10
+        fp_mat[num_gt_ids:, :num_tracker_ids] = 1e10
+        fn_mat[:num_gt_ids, :num_tracker_ids] = gt_id_count[:, np.newaxis] - potential_matches_count
+        fn_mat[np.arange(num_gt_ids), num_tracker_ids + np.arange(num_gt_ids)] = gt_id_count
+        fp_mat[:num_gt_ids, :num_tracker_ids] = tracker_id_count[np.newaxis, :] - potential_matches_count
+        fp_mat[num_gt_ids + np.arange(num_tracker_ids), np.arange(num_tracker_ids)] = tracker_id_count
+        match_rows, match_cols = linear_sum_assignment(fn_mat + fp_mat)
+
+        gt_ids, tracker_ids = np.nonzero(potential_matches_count)
+        res = metric._compute_id_scores(gt_ids, tracker_ids, potential_matches_count[gt_ids, tracker_ids],
+                                        gt_id_count, tracker_id_count)
+        assert res['IDFN'] == fn_mat[match_rows, match_cols].sum()
+        assert res['IDFP'] == fp_mat[match_rows, match_cols].sum()
+
+
+@pytest.mark.parametrize('metric_class', [trackeval.metrics.CLEAR, trackeval.metrics.Identity])
+def test_multiple_thresholds(metric_class):
+    thresholds = [0.3, 0.5, 0.8]
+    metric = metric_class({'THRESHOLD': thresholds})
+    array_fields = metric.float_array_fields + metric.integer_array_fields
+    all_res = {}
+    for sequence_name, (data, _) in sorted(SEQUENCE_BY_NAME.items()):
+        all_res[sequence_name] = metric.eval_sequence(data)
+        np.testing.assert_equal(metric.eval_sequence_chunked(data, 2), all_res[sequence_name])
+    all_res['COMBINED_SEQ'] = metric.combine_sequences(all_res)
+
+    # Evaluating several thresholds at once must give the results of evaluating each threshold on its own.
+    for i, threshold in enumerate(thresholds):
+        single_metric = metric_class({'THRESHOLD': threshold})
+        single_res = {sequence_name: single_metric.eval_sequence(data)
+                      for sequence_name, (data, _) in sorted(SEQUENCE_BY_NAME.items())}
+        single_res['COMBINED_SEQ'] = single_metric.combine_sequences(single_res)
+        for sequence_name, res in single_res.items():
+            for field in single_metric.fields:
+                value = all_res[sequence_name][field]
+                assert (value[i] if field in array_fields else value) == res[field], field
+
+    detailed = metric.detailed_results(all_res)
+    assert detailed['COMBINED_SEQ'][array_fields[0] + '___80'] == all_res['COMBINED_SEQ'][array_fields[0]][2]
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        trackeval.StreamingEvaluator([metric])
+
+
+def test_j_and_f_pairs():
+    mask_utils = pytest.importorskip('pycocotools.mask')
+    cv2 = pytest.importorskip('cv2')
+    disk = pytest.importorskip('skimage.morphology').disk
+    from trackeval.metrics.j_and_f import JAndF
+
+    def encode(boxes, frame_shape=(30, 40)):
+        masks = []
+        for box in boxes:
+            mask = np.zeros(frame_shape, dtype=np.uint8)
+            if box is not None:
+                mask[box[0]:box[1], box[2]:box[3]] = 1
+            masks.append(mask_utils.encode(np.asfortranarray(mask)))
+        return masks
+
+    # Masks of 3 gt and 3 tracker ids in 3 timesteps, including empty masks and masks without overlap.
+    gt_data = [encode([(2, 12, 3, 15), (15, 28, 20, 38), None]),
+               encode([(3, 13, 4, 16), (16, 29, 21, 39), (0, 5, 0, 5)]),
+               encode([None, (16, 29, 22, 39), (0, 6, 0, 6)])]
+    tracker_data = [encode([(2, 11, 4, 15), None, (16, 27, 19, 36)]),
+                    encode([(4, 13, 4, 17), (1, 5, 0, 4), (16, 28, 21, 37)]),
+                    encode([(10, 20, 10, 20), (0, 6, 1, 6), None])]
+    bound_th = 0.1
+    j = JAndF._compute_j(gt_data, tracker_data, 3, 3, 3)
+    f = JAndF._compute_f(gt_data, tracker_data, range(3), range(3), bound_th)
+    pairs = ([2, 0, 1], [0, 2, 1])
+    f_paired = JAndF._compute_f(gt_data, tracker_data, pairs[0], pairs[1], bound_th, paired=True)
+    np.testing.assert_equal(f_paired, f[pairs])
+
+    # Compare to J and F computed for each pair of masks on its own.
+    for k, i, t in np.ndindex(3, 3, 3):
+        tracker_mask = mask_utils.decode(tracker_data[t][k])
+        gt_mask = mask_utils.decode(gt_data[t][i])
+        union = np.sum(tracker_mask | gt_mask)
+        assert j[k, i, t] == pytest.approx(np.sum(tracker_mask & gt_mask) / union if union > 0 else 1)
+
+        kernel = disk(np.ceil(bound_th * np.linalg.norm(tracker_mask.shape))).astype(np.uint8)
+        fg_boundary = JAndF._seg2bmap(tracker_mask)
+        gt_boundary = JAndF._seg2bmap(gt_mask)
+        fg_dil = cv2.dilate(fg_boundary.astype(np.uint8), kernel)
+        gt_dil = cv2.dilate(gt_boundary.astype(np.uint8), kernel)
+        n_fg, n_gt = np.sum(fg_boundary), np.sum(gt_boundary)
+        precision = np.sum(fg_boundary * gt_dil) / n_fg if n_fg > 0 else 1
+        recall = np.sum(gt_boundary * fg_dil) / n_gt if n_gt > 0 else 1
+        if (n_fg == 0) != (n_gt == 0):
+            precision, recall = float(n_fg == 0), float(n_gt == 0)
+        expected = 0 if precision + recall == 0 else 2 * precision * recall / (precision + recall)
+        assert f[k, i, t] == expected
+
+
+def test_track_map_matching():
+    rng = np.random.RandomState(0)
+    metric = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False})
+    num_thrs = len(metric.array_labels)
+    for _ in range(100):
+        num_dt, num_gt = rng.randint(1, 12, size=2)
+        ious = rng.choice([0, 0.5, 0.6, 0.7, 0.95], size=(num_dt, num_gt)) * (rng.rand(num_dt, num_gt) < 0.7)
+        ious = np.where(rng.rand(num_dt, num_gt) < 0.2, np.nextafter(ious, 0), ious)
+        dt_ids = rng.permutation(num_dt)
+        gt_ig = rng.rand(metric.num_ig_masks, num_gt) < 0.3
+        gt_idx = np.argsort(gt_ig, axis=1, kind='mergesort')
+        gt_ig = np.take_along_axis(gt_ig, gt_idx, axis=1)
+        dt_m, gt_m, dt_ig = metric._match_tracks(ious, dt_ids, gt_idx, gt_idx + 100, list(gt_ig))
+
+        # Matching all thresholds and ignore masks at once must give the matches of matching one gt track after the
+        # other for each threshold and ignore mask.
+        for mask_idx, thr_idx in np.ndindex(metric.num_ig_masks, num_thrs):
+            gt_matches = np.zeros(num_gt) - 1
+            for dt_idx, dt_id in enumerate(dt_ids):
+                m = metric._match_track(ious[dt_idx, gt_idx[mask_idx]], gt_matches > 0, gt_ig[mask_idx],
+                                        metric.array_labels[thr_idx])
+                assert dt_m[mask_idx, thr_idx, dt_idx] == (-1 if m == -1 else gt_idx[mask_idx, m] + 100)
+                assert dt_ig[mask_idx, thr_idx, dt_idx] == (m > -1 and gt_ig[mask_idx, m])
+                if m > -1:
+                    gt_matches[m] = dt_id
+            np.testing.assert_equal(gt_m[mask_idx, thr_idx], gt_matches)
+
+
+@pytest.mark.parametrize('boxformat', ['xywh', 'x0y0x1y1'])
+def test_track_map_bb_ious(boxformat):
+    rng = np.random.RandomState(0)
+
+    def random_tracks(num_tracks):
+        tracks = []
+        for _ in range(num_tracks):
+            start = rng.randint(0, 20)
+            boxes = rng.rand(rng.randint(0, 10), 4) * [50, 50, 20, 20] + [0, 0, 1, 1]
+            if boxformat == 'x0y0x1y1':
+                boxes[:, 2:] += boxes[:, :2]
+            tracks.append({start + i: box for i, box in enumerate(boxes) if rng.rand() < 0.8})
+        return tracks
+
+    def box_area(box):
+        return box[2] * box[3] if boxformat == 'xywh' else (box[2] - box[0]) * (box[3] - box[1])
+
+    dt, gt = random_tracks(12), random_tracks(9)
+    ious = trackeval.metrics.TrackMAP._compute_track_ious(dt, gt, boxformat=boxformat)
+    for i, j in np.ndindex(len(dt), len(gt)):
+        intersect, union = 0, 0
+        for frame in set(dt[i].keys()) | set(gt[j].keys()):
+            if frame in dt[i] and frame in gt[j]:
+                d, g = dt[i][frame].copy(), gt[j][frame].copy()
+                if boxformat == 'xywh':
+                    d[2:] += d[:2]
+                    g[2:] += g[:2]
+                intersect += max(min(d[2], g[2]) - max(d[0], g[0]), 0) * max(min(d[3], g[3]) - max(d[1], g[1]), 0)
+            union += box_area(dt[i][frame]) if frame in dt[i] else 0
+            union += box_area(gt[j][frame]) if frame in gt[j] else 0
+        union -= intersect
+        assert ious[i, j] == pytest.approx(intersect / union if union > 0 else 0)
+
+
+def test_track_map_mask_ious():
+    mask_utils = pytest.importorskip('pycocotools.mask')
+    rng = np.random.RandomState(0)
+
+    def random_tracks(num_tracks):
+        tracks = []
+        for _ in range(num_tracks):
+            start = rng.randint(0, 15)
+            track = {}
+            for frame in range(start, start + rng.randint(0, 8)):
+                mask = np.zeros((24, 32), dtype=np.uint8)
+                # Some masks are empty.
+                if rng.rand() < 0.85:
+                    y, x = rng.randint(0, 20), rng.randint(0, 28)
+                    mask[y:y + rng.randint(1, 12), x:x + rng.randint(1, 12)] = 1
+                track[frame] = mask_utils.encode(np.asfortranarray(mask))
+            tracks.append(track)
+        return tracks
+
+    dt, gt = random_tracks(10), random_tracks(8)
+    ious = trackeval.metrics.TrackMAP._compute_track_ious(dt, gt, iou_function='mask')
+    # Compare to the IoU of each pair of tracks computed frame by frame with merged masks.
+    for i, j in np.ndindex(len(dt), len(gt)):
+        intersect, union = 0.0, 0.0
+        for frame in set(dt[i].keys()) | set(gt[j].keys()):
+            d, g = dt[i].get(frame), gt[j].get(frame)
+            if d and g:
+                intersect += mask_utils.area(mask_utils.merge([d, g], True))
+                union += mask_utils.area(mask_utils.merge([d, g], False))
+            elif g:
+                union += mask_utils.area(g)
+            elif d:
+                union += mask_utils.area(d)
+        assert ious[i, j] == (intersect / union if union > 0 + np.finfo('float').eps else 0)
+
+
+def test_track_map_precision_recall():
+    rng = np.random.RandomState(0)
+    metric = trackeval.metrics.TrackMAP({'PRINT_CONFIG': False, 'USE_TIME_RANGES': False})
+    num_thrs, num_recalls = len(metric.array_labels), len(metric.rec_thrs)
+    all_res = {}
+    for seq in range(5):
+        num_dt, num_gt = rng.randint(0, 10, size=2)
+        all_res[seq] = {mask_idx: {
+            'dt_matches': np.where(rng.rand(num_thrs, num_dt) < 0.5, 1, -1),
+            'dt_ignore': rng.rand(num_thrs, num_dt) < 0.2,
+            'dt_scores': rng.rand(num_dt),
+            'gt_ignore': (rng.rand(num_gt) < 0.2) * mask_idx} for mask_idx in range(metric.num_ig_masks)}
+    res = metric.combine_sequences(all_res)
+
+    # Compare to the precision and recall of each IoU threshold and ignore mask computed one by one.
+    for mask_idx, thr_idx in np.ndindex(metric.num_ig_masks, num_thrs):
+        results = [r[mask_idx] for r in all_res.values()]
+        dt_idx = np.argsort(-np.concatenate([r['dt_scores'] for r in results]), kind='mergesort')
+        dt_m = np.concatenate([r['dt_matches'][thr_idx] for r in results])[dt_idx]
+        dt_ig = np.concatenate([r['dt_ignore'][thr_idx] for r in results])[dt_idx]
+        num_gt = np.count_nonzero(np.concatenate([r['gt_ignore'] for r in results]) == 0)
+        tp = np.cumsum((dt_m != -1) & ~dt_ig)
+        fp = np.cumsum((dt_m == -1) & ~dt_ig)
+        rc = tp / num_gt
+        pr = list(tp / (tp + fp + np.spacing(1)))
+        for i in range(len(pr) - 1, 0, -1):
+            pr[i - 1] = max(pr[i - 1], pr[i])
+        pr_at_recall = [pr[i] if i < len(pr) else 0.0 for i in np.searchsorted(rc, metric.rec_thrs, side='left')]
+        assert res['recall'][thr_idx, mask_idx] == (rc[-1] if len(rc) else 0)
+        np.testing.assert_equal(res['precision'][thr_idx, :, mask_idx], pr_at_recall)
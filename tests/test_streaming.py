@@ -0,0 +1,62 @@
+""" Tests for the StreamingEvaluator, which must give the same results as evaluating the whole sequence at once.
+These tests do not require any downloaded data.
+"""
+
+import numpy as np
+import pytest
+
+import trackeval
+from test_eval import _write_mot_data, _assert_results_equal
+
+
+def _metrics():
+    return [trackeval.metrics.HOTA(), trackeval.metrics.CLEAR(), trackeval.metrics.Identity(),
+            trackeval.metrics.VACE()]
+
+
+def _stream_sequence(data, metrics_list, config=None):
+    """Streams the frames of preprocessed sequence data, with ids relabelled to arbitrary values"""
+    evaluator = trackeval.StreamingEvaluator(metrics_list, config)
+    for gt_ids_t, gt_dets_t, tracker_ids_t, tracker_dets_t in zip(data['gt_ids'], data['gt_dets'],
+                                                                  data['tracker_ids'], data['tracker_dets']):
+        evaluator.add_frame(1000 - 7 * gt_ids_t, gt_dets_t, 5 * tracker_ids_t + 3, tracker_dets_t)
+    return evaluator.finish()
+
+
+@pytest.mark.parametrize('buffer_size', [1 << 16, 5])
+def test_streaming_matches_eval_sequence(tmp_path, monkeypatch, buffer_size):
+    monkeypatch.setattr(trackeval.streaming._PairSums, 'buffer_size', buffer_size)
+    dataset = trackeval.datasets.MotChallenge2DBox(_write_mot_data(tmp_path))
+    metrics_list = _metrics() + [trackeval.metrics.Count()]
+    for tracker in ['tracker_0', 'tracker_1']:
+        for seq in ['seq-00', 'seq-01', 'seq-02']:
+            data = dataset.get_preprocessed_seq_data(dataset.get_raw_seq_data(tracker, seq), 'pedestrian')
+            streaming_res = _stream_sequence(data, _metrics(), {'FRAME_LOG_FOLDER': str(tmp_path)})
+            for metric in metrics_list:
+                _assert_results_equal(metric.eval_sequence(data), streaming_res[metric.get_name()])
+
+
+@pytest.mark.parametrize('empty', ['gt', 'tracker'])
+def test_streaming_empty_sequence(tmp_path, empty):
+    dataset = trackeval.datasets.MotChallenge2DBox(_write_mot_data(tmp_path, num_seqs=1))
+    data = dataset.get_preprocessed_seq_data(dataset.get_raw_seq_data('tracker_0', 'seq-00'), 'pedestrian')
+    data[empty + '_ids'] = [ids[:0] for ids in data[empty + '_ids']]
+    data[empty + '_dets'] = [dets[:0] for dets in data[empty + '_dets']]
+    data['similarity_scores'] = [np.zeros((len(gt_ids_t), len(tracker_ids_t)))
+                                 for gt_ids_t, tracker_ids_t in zip(data['gt_ids'], data['tracker_ids'])]
+    data['num_%s_dets' % empty] = 0
+    data['num_%s_ids' % empty] = 0
+    streaming_res = _stream_sequence(data, _metrics())
+    for metric in _metrics():
+        _assert_results_equal(metric.eval_sequence(data), streaming_res[metric.get_name()])
+
+
+def test_streaming_errors():
+    evaluator = trackeval.StreamingEvaluator([trackeval.metrics.CLEAR()])
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        evaluator.add_frame([1, 1], np.zeros((2, 4)), [], np.zeros((0, 4)))
+    evaluator.finish()
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        evaluator.add_frame([1], np.zeros((1, 4)), [], np.zeros((0, 4)))
+    with pytest.raises(trackeval.utils.TrackEvalException):
+        trackeval.StreamingEvaluator([trackeval.metrics.TrackMAP()])
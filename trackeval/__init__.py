@@ -1,4 +1,5 @@
 from .eval import Evaluator
+from .streaming import StreamingEvaluator
 from . import datasets
 from . import metrics
 from . import plotting
@@ -0,0 +1,126 @@
+""" Solves the assignment problems of the metrics and datasets, which match gt dets to tracker dets so that the total
+matching score is maximised.
+
+Most pairs of dets have a score of zero (e.g. boxes which do not overlap), so that the bipartite graph of the pairs with
+non-zero score falls apart into many small connected components. Pairs with a score of zero do not add to the total
+score, so large matrices are reduced before solving them: components of a single pair are matched directly, and rows
+and columns without any non-zero score are left out. All remaining components are then solved together in one call of
+the hungarian algorithm, on a matrix of only their rows and columns (solving them one by one costs more in overhead
+than it saves).
+
+If several assignments are optimal, which one the hungarian algorithm returns depends on all rows and columns of the
+matrix, so that the reduced matrix could break ties differently. The full matrix is therefore solved if any two
+non-zero scores of the remaining components are equal, which keeps the matches the same as those of the hungarian
+algorithm on the full matrix. (Different assignments with the same total score but without equal scores would need
+sums of different scores to be exactly equal, which does not happen for the overlaps of real detections.)
+
+After thresholding the scores (e.g. at an IoU of 0.5), each row and column usually has at most one non-zero score. The
+non-zero pairs are then the optimal assignment, and are returned without running the hungarian algorithm. How often this
+happens is counted in counts (per process), which the Evaluator reports with its timing (TIME_PROGRESS).
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Matrices with fewer rows or columns are solved at once, as splitting them costs more than it saves.
+MIN_SIZE_TO_SPLIT = 64
+
+# Number of assignments which were a partial permutation, and which needed the hungarian algorithm.
+counts = {'permutation': 0, 'solved': 0}
+
+
+def pop_counts():
+    """Returns the assignment counts so far and resets them"""
+    global counts
+    recorded, counts = counts, {'permutation': 0, 'solved': 0}
+    return recorded
+
+
+def max_score_assignment(score_mat):
+    """ Returns the rows and columns of the matches of an assignment maximising the total score of a non-negative score
+    matrix. Only matches with a non-zero score are returned, sorted by row.
+    """
+    score_mat = np.asarray(score_mat)
+    non_zero = score_mat > 0
+    row_degree = non_zero.sum(1)
+    col_degree = non_zero.sum(0)
+    if score_mat.size == 0 or (row_degree.max() <= 1 and col_degree.max() <= 1):
+        counts['permutation'] += 1
+        return np.nonzero(non_zero)
+    counts['solved'] += 1
+
+    if min(score_mat.shape) < MIN_SIZE_TO_SPLIT:
+        return _solve_full_matrix(score_mat)
+
+    # Find the components of a single pair: pairs which are the only non-zero pair of both their row and column.
+    single_rows = np.flatnonzero(row_degree == 1)
+    single_cols = np.argmax(non_zero[single_rows], axis=1)
+    single_mask = col_degree[single_cols] == 1
+    single_rows, single_cols = single_rows[single_mask], single_cols[single_mask]
+
+    # Solve the other components together.
+    other_rows = row_degree > 0
+    other_rows[single_rows] = False
+    other_rows = np.flatnonzero(other_rows)
+    other_cols = col_degree > 0
+    other_cols[single_cols] = False
+    other_cols = np.flatnonzero(other_cols)
+    other_score_mat = score_mat[np.ix_(other_rows, other_cols)]
+    other_scores = other_score_mat[other_score_mat > 0]
+    if len(np.unique(other_scores)) < len(other_scores):
+        return _solve_full_matrix(score_mat)  # Tied scores, see above.
+    match_rows, match_cols = linear_sum_assignment(-other_score_mat)
+
+    match_rows = np.concatenate((single_rows, other_rows[match_rows]))
+    match_cols = np.concatenate((single_cols, other_cols[match_cols]))
+    matched_mask = score_mat[match_rows, match_cols] > 0
+    match_rows, match_cols = match_rows[matched_mask], match_cols[matched_mask]
+    order = np.argsort(match_rows)
+    return match_rows[order], match_cols[order]
+
+
+def _solve_full_matrix(score_mat):
+    """Solves the assignment problem of a score matrix with the hungarian algorithm, without reducing it"""
+    match_rows, match_cols = linear_sum_assignment(-score_mat)
+    matched_mask = score_mat[match_rows, match_cols] > 0
+    return match_rows[matched_mask], match_cols[matched_mask]
+
+
+def sparse_max_score_assignment(rows, cols, scores):
+    """ Like max_score_assignment, for a score matrix given by its non-zero entries (rows[i], cols[i], scores[i]), each
+    at a distinct position. Returns the indices of the matched entries, sorted by row.
+    The connected components of the entries are solved independently, on dense matrices of only their rows and
+    columns, so that memory does not grow with the number of rows times the number of columns.
+    """
+    rows, cols, scores = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64), np.asarray(scores)
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, row_idx = np.unique(rows, return_inverse=True)
+    _, col_idx = np.unique(cols, return_inverse=True)
+    num_rows, num_cols = row_idx.max() + 1, col_idx.max() + 1
+    graph = coo_matrix((np.ones(len(rows)), (row_idx, num_rows + col_idx)), shape=(num_rows + num_cols,) * 2)
+    _, labels = connected_components(graph, directed=False)
+    entry_labels = labels[row_idx]
+
+    # Components of a single entry are matched directly, and the others are solved one by one.
+    component_sizes = np.bincount(entry_labels)
+    matched = [np.flatnonzero(component_sizes[entry_labels] == 1)]
+    entries = np.flatnonzero(component_sizes[entry_labels] > 1)
+    entries = entries[np.argsort(entry_labels[entries], kind='stable')]
+    for component in np.split(entries, np.flatnonzero(np.diff(entry_labels[entries])) + 1):
+        if len(component) == 0:
+            continue
+        component_rows, sub_rows = np.unique(row_idx[component], return_inverse=True)
+        component_cols, sub_cols = np.unique(col_idx[component], return_inverse=True)
+        score_mat = np.zeros((len(component_rows), len(component_cols)))
+        entry_mat = np.zeros((len(component_rows), len(component_cols)), dtype=np.int64)
+        score_mat[sub_rows, sub_cols] = scores[component]
+        entry_mat[sub_rows, sub_cols] = component
+        match_rows, match_cols = max_score_assignment(score_mat)
+        matched.append(entry_mat[match_rows, match_cols])
+
+    matched = np.concatenate(matched)
+    matched = matched[scores[matched] > 0]
+    return matched[np.argsort(rows[matched], kind='stable')]
@@ -0,0 +1,136 @@
+""" On-disk cache of the per sequence results of an evaluation, so that re-evaluating a folder of trackers only
+evaluates the trackers and sequences whose data changed.
+
+Results are content-addressed: the cache entry of a (tracker, sequence) is found by a hash of the contents of the gt
+and tracker files of the sequence, of the files giving information about the sequence (e.g. seqmap and seqinfo.ini
+files), of the dataset config and of the source code of the evaluation. Within an entry, the result of each class and
+metric is stored under the metric's name and a hash of its config. The cache is stored in a folder next to the output
+folder of the dataset (OUTPUT_FOLDER + '_eval_cache').
+"""
+
+import os
+import sys
+import glob
+import pickle
+import inspect
+import hashlib
+import numpy as np
+
+# Increase if the format of the cache entries changes. Changes to the code which can change the results are detected by
+# hashing the source code (see _get_code_hash), so that results of previous versions are not used.
+CACHE_VERSION = 2
+
+# Dataset config values which do not change the results of the evaluation. The locations of the gt and trackers are
+# excluded as the contents of the files are hashed instead.
+_CONFIG_KEYS_NOT_AFFECTING_RESULTS = ['GT_FOLDER', 'TRACKERS_FOLDER', 'OUTPUT_FOLDER', 'OUTPUT_SUB_FOLDER',
+                                      'TRACKERS_TO_EVAL', 'TRACKER_DISPLAY_NAMES', 'PRINT_CONFIG', 'GT_CACHE_SIZE_MB']
+
+
+class ResultCache:
+    """Cache of the per sequence results of a dataset, for a list of metrics"""
+
+    def __init__(self, dataset, metrics_list, metric_names):
+        self.dataset = dataset
+        self.cache_fol = os.path.join(os.path.normpath(dataset.output_fol) + '_eval_cache', dataset.get_name())
+        config = getattr(dataset, 'config', {})
+        code_hash = _get_code_hash([type(dataset)] + [type(metric) for metric in metrics_list])
+        self.dataset_hash = _hash_object((CACHE_VERSION, code_hash, dataset.get_name(), sorted(
+            (key, value) for key, value in config.items() if key not in _CONFIG_KEYS_NOT_AFFECTING_RESULTS)))
+        self.metric_keys = [(metric_name, _hash_object((type(metric).__name__, sorted(
+            (key, value) for key, value in vars(metric).items() if not key.startswith('_')))))
+            for metric, metric_name in zip(metrics_list, metric_names)]
+        self.file_hashes = {}
+
+    def get(self, tracker, seq, class_list):
+        """Returns the cached results of a sequence, or None if they are not (all) cached"""
+        entry = self._load_entry(self._get_entry_file(tracker, seq))
+        if entry is None:
+            return None
+        try:
+            return {cls: {metric_name: entry[cls, metric_name, metric_hash] for metric_name, metric_hash
+                          in self.metric_keys} for cls in class_list}
+        except KeyError:
+            return None
+
+    def put(self, tracker, seq, seq_res):
+        """Stores the results of a sequence, in addition to cached results of other classes and metrics"""
+        entry_file = self._get_entry_file(tracker, seq)
+        if entry_file is None:
+            return
+        entry = self._load_entry(entry_file) or {}
+        for cls, cls_res in seq_res.items():
+            for metric_name, metric_hash in self.metric_keys:
+                entry[cls, metric_name, metric_hash] = cls_res[metric_name]
+        os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+        # Write to a temporary file first, so that an interrupted write does not leave a corrupt entry.
+        tmp_file = entry_file + '.%i.tmp' % os.getpid()
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, entry_file)
+
+    def _get_entry_file(self, tracker, seq):
+        """Returns the file of the cache entry of a sequence, or None if its results cannot be cached because the
+        dataset does not give the files of the sequence"""
+        gt_file, tracker_file = self.dataset.get_seq_files(tracker, seq)
+        if gt_file is None or tracker_file is None:
+            return None
+        # Files holding several sequences (zip and json files) are identified by the sequence name as well.
+        seq_info_hashes = [self._get_file_hash(file) for file in self.dataset.get_seq_info_files(seq)]
+        # Sequence lengths are not part of the key: they come from the dataset config, from these files or from the
+        # gt and tracker files, and some datasets only know them after loading the sequence.
+        key = _hash_object((self.dataset_hash, seq, seq_info_hashes, self._get_file_hash(gt_file),
+                            self._get_file_hash(tracker_file)))
+        return os.path.join(self.cache_fol, key[:2], key + '.pkl')
+
+    def _get_file_hash(self, file):
+        """Hashes the contents of a file, or of all files in a folder. Hashes are computed once for each file."""
+        if file not in self.file_hashes:
+            sha = hashlib.sha1()
+            if os.path.isdir(file):
+                for root, dirs, files in os.walk(file):
+                    dirs.sort()
+                    for name in sorted(files):
+                        sha.update(os.path.relpath(os.path.join(root, name), file).encode())
+                        _update_hash_with_file(sha, os.path.join(root, name))
+            elif os.path.isfile(file):
+                _update_hash_with_file(sha, file)
+            self.file_hashes[file] = sha.hexdigest()
+        return self.file_hashes[file]
+
+    @staticmethod
+    def _load_entry(entry_file):
+        if entry_file is None or not os.path.isfile(entry_file):
+            return None
+        try:
+            with open(entry_file, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None  # Corrupt or incompatible entries are recomputed.
+
+
+def _get_code_hash(classes):
+    """Hashes the source code of the trackeval package and of the given (e.g. custom dataset and metric) classes"""
+    package_fol = os.path.dirname(os.path.abspath(__file__))
+    files = set(glob.glob(os.path.join(package_fol, '**', '*.py'), recursive=True))
+    for cls in classes:
+        try:
+            files.add(os.path.abspath(inspect.getsourcefile(cls)))
+        except (TypeError, OSError):
+            pass  # Classes without source files (e.g. defined interactively) are identified by their name only.
+    sha = hashlib.sha1()
+    for file in sorted(files):
+        sha.update(os.path.relpath(file, package_fol).encode())
+        _update_hash_with_file(sha, file)
+    return sha.hexdigest()
+
+
+def _update_hash_with_file(sha, file):
+    with open(file, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            sha.update(block)
+
+
+def _hash_object(obj):
+    """Hashes the repr of an object consisting of basic types and numpy arrays"""
+    with np.printoptions(threshold=sys.maxsize):
+        return hashlib.sha1(repr(obj).encode()).hexdigest()
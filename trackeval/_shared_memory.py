@@ -0,0 +1,159 @@
+""" Shares the ground-truth data of datasets between the worker processes of a parallel evaluation.
+
+The parent process loads the gt of each sequence once and stores all per-timestep arrays (dets, ids, classes, extras,
+crowd ignore regions) column-wise in one shared memory block per dataset: the arrays of all timesteps are concatenated
+and frame offsets give the rows of each timestep. Workers attach to the block and rebuild the raw gt data of each
+sequence as read-only numpy views into the shared memory, without copying. Data which are not numpy arrays (e.g. run
+length encoded masks) are sent to each worker as is.
+"""
+
+import numpy as np
+from .utils import TrackEvalException
+
+_ALIGNMENT = 64
+
+
+class SharedGtData:
+    """ Owns the shared memory blocks holding the gt data of a list of datasets.
+    The blocks must be released with unlink() once all workers are done, also if an error occurred.
+    """
+
+    def __init__(self, dataset_list):
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise TrackEvalException('Sharing gt data between processes requires python 3.8 or newer.')
+        self.shared_memory_blocks = []
+        self.descriptors = []
+        try:
+            for dataset in dataset_list:
+                self.descriptors.append(self._share_dataset(dataset, shared_memory))
+        except BaseException:
+            self.unlink()
+            raise
+
+    def _share_dataset(self, dataset, shared_memory):
+        tracker_list, seq_list, _ = dataset.get_eval_info()
+        seq_layouts = {}
+        columns = []
+        nbytes = 0
+        for seq in seq_list:
+            try:
+                # The gt does not depend on the tracker. If the gt cannot be loaded it is not shared, and loaded (and
+                # the error reported) for each tracker by the workers as usual.
+                raw_gt_data = dataset._load_raw_file(tracker_list[0], seq, is_gt=True)
+            except Exception:
+                continue
+            layout, seq_columns, nbytes = _pack_raw_gt_data(raw_gt_data, nbytes)
+            seq_layouts[seq] = layout
+            columns += seq_columns
+        if not seq_layouts:
+            return None
+        block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self.shared_memory_blocks.append(block)
+        for byte_offset, values in columns:
+            view = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf, offset=byte_offset)
+            view[...] = values
+        return block.name, seq_layouts
+
+    def unlink(self):
+        """Releases the shared memory blocks"""
+        for block in self.shared_memory_blocks:
+            block.close()
+            block.unlink()
+        self.shared_memory_blocks = []
+
+
+def attach_shared_gt_data(dataset_list, descriptors):
+    """ Attaches to the shared memory blocks described by descriptors (SharedGtData.descriptors) and pins the raw gt
+    data of each sequence into the gt cache of the corresponding dataset, as read-only views into shared memory.
+    Returns the attached blocks, which must be kept referenced for as long as the views are in use.
+    """
+    from multiprocessing import shared_memory
+    blocks = []
+    for dataset, descriptor in zip(dataset_list, descriptors):
+        if descriptor is None:
+            continue
+        block_name, seq_layouts = descriptor
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        for seq, layout in seq_layouts.items():
+            dataset.pin_raw_gt_data(seq, _unpack_raw_gt_data(layout, block.buf))
+    return blocks
+
+
+def _pack_raw_gt_data(raw_gt_data, nbytes):
+    """ Splits raw gt data into columns of concatenated per-timestep arrays, which are placed in shared memory starting
+    at byte offset nbytes, and a layout describing how to rebuild the raw gt data from them.
+    A list of timesteps is stored as a column if each timestep is an array with the same dtype and the same shape
+    apart from the first dimension. All other data is kept in the layout as is.
+    Returns the layout, the columns as (byte offset, array) and the byte offset after the columns.
+    """
+    layout = {'columns': [], 'other': {}, 'gt_extras': None}
+    columns = []
+    for key, value in raw_gt_data.items():
+        if key == 'gt_extras' and _is_list_of_dicts_of_arrays(value):
+            layout['gt_extras'] = {'num_timesteps': len(value), 'other': []}
+            for extra_key in value[0].keys():
+                column = _pack_column([extras_t[extra_key] for extras_t in value])
+                if column is None:
+                    layout['gt_extras']['other'].append((extra_key, [extras_t[extra_key] for extras_t in value]))
+                    continue
+                nbytes = _add_column(layout, columns, ('gt_extras', extra_key), column, nbytes)
+            continue
+        column = _pack_column(value)
+        if column is None:
+            layout['other'][key] = value
+        else:
+            nbytes = _add_column(layout, columns, key, column, nbytes)
+    return layout, columns, nbytes
+
+
+def _is_list_of_dicts_of_arrays(value):
+    if not isinstance(value, list) or len(value) == 0 or not all(isinstance(v, dict) for v in value):
+        return False
+    keys = value[0].keys()
+    return all(v.keys() == keys for v in value)
+
+
+def _pack_column(value):
+    """Concatenates a list of per-timestep arrays, if possible. Returns (values, frame offsets) or None."""
+    if not isinstance(value, list) or len(value) == 0 or not all(isinstance(v, np.ndarray) for v in value):
+        return None
+    dtype = value[0].dtype
+    trailing_shape = value[0].shape[1:]
+    if value[0].ndim == 0 or dtype.hasobject:
+        return None
+    if any(v.dtype != dtype or v.shape[1:] != trailing_shape for v in value):
+        return None
+    frame_offsets = np.zeros(len(value) + 1, dtype=np.int64)
+    frame_offsets[1:] = np.cumsum([len(v) for v in value])
+    return np.concatenate(value, axis=0), frame_offsets
+
+
+def _add_column(layout, columns, key, column, nbytes):
+    values, frame_offsets = column
+    byte_offset = -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+    layout['columns'].append((key, values.dtype.str, values.shape, byte_offset, frame_offsets))
+    columns.append((byte_offset, values))
+    return byte_offset + values.nbytes
+
+
+def _unpack_raw_gt_data(layout, buffer):
+    """Rebuilds raw gt data from its layout, with read-only views into the shared memory buffer"""
+    raw_gt_data = dict(layout['other'])
+    if layout['gt_extras'] is not None:
+        raw_gt_data['gt_extras'] = [{} for _ in range(layout['gt_extras']['num_timesteps'])]
+        for extra_key, values in layout['gt_extras']['other']:
+            for extras_t, value in zip(raw_gt_data['gt_extras'], values):
+                extras_t[extra_key] = value
+    for key, dtype, shape, byte_offset, frame_offsets in layout['columns']:
+        values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=byte_offset)
+        values.flags.writeable = False
+        per_timestep = [values[start:end] for start, end in zip(frame_offsets[:-1], frame_offsets[1:])]
+        if isinstance(key, tuple):
+            for extras_t, value in zip(raw_gt_data['gt_extras'], per_timestep):
+                extras_t[key[1]] = value
+        else:
+            raw_gt_data[key] = per_timestep
+    return raw_gt_data
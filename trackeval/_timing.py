@@ -4,9 +4,25 @@ import inspect
 
 DO_TIMING = False
 DISPLAY_LESS_PROGRESS = False
+PRINT_PROGRESS = True  # If False, times are only recorded (e.g. in worker processes) and not printed
 timer_dict = {}
 
 
+def start_worker_timing():
+    """Records the time of all functions and methods without printing, for sending back to the main process"""
+    global DO_TIMING, DISPLAY_LESS_PROGRESS, PRINT_PROGRESS
+    DO_TIMING = True
+    DISPLAY_LESS_PROGRESS = False
+    PRINT_PROGRESS = False
+
+
+def pop_timer_dict():
+    """Returns the times recorded so far and resets them"""
+    global timer_dict
+    recorded, timer_dict = timer_dict, {}
+    return recorded
+
+
 def time(f):
     @wraps(f)
     def wrap(*args, **kw):
@@ -32,6 +48,10 @@ def time(f):
             else:
                 timer_dict[method_name] = tt
 
+            # Worker processes only record the times, which are sent back to the main process.
+            if not PRINT_PROGRESS:
+                return result
+
             # If code is finished, display timing summary
             if method_name == "Evaluator.evaluate":
                 print("")
@@ -55,6 +75,6 @@ def time(f):
 
             return result
         else:
-            # If config["TIME_PROGRESS"] is false, or config["USE_PARALLEL"] is true, run functions normally without timing.
+            # If config["TIME_PROGRESS"] is false, run functions normally without timing.
             return f(*args, **kw)
     return wrap
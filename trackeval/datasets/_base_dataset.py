@@ -2,13 +2,18 @@ import csv
 import io
 import zipfile
 import os
+import sys
 import traceback
 import numpy as np
-from copy import deepcopy
+from collections import OrderedDict
+from copy import copy, deepcopy
 from abc import ABC, abstractmethod
 from .. import _timing
 from ..utils import TrackEvalException
 
+# Typical size of the row of a detection in a text file, used to estimate the number of detections of other files.
+_BYTES_PER_ROW = 64
+
 
 class _BaseDataset(ABC):
     @abstractmethod
@@ -18,6 +23,12 @@ class _BaseDataset(ABC):
         self.class_list = None
         self.output_fol = None
         self.output_sub_fol = None
+        self.seq_lengths = None
+        self.seqmap_file = None  # Set by datasets which read the sequences to evaluate from a seqmap file
+        self.uses_mask_similarity = False  # Set by datasets whose similarities are calculated between masks
+        self.gt_cache = OrderedDict()  # Loaded gt data for each sequence, least recently used first
+        self.gt_cache_nbytes = 0
+        self.pinned_gt_data = {}  # Gt data which is always kept, e.g. when it is in shared memory
 
     # Functions to implement:
 
@@ -58,6 +69,75 @@ class _BaseDataset(ABC):
         """Return info about the dataset needed for the Evaluator"""
         return self.tracker_list, self.seq_list, self.class_list
 
+    def get_seq_files(self, tracker, seq):
+        """ Returns the locations of the files which are read to load a tracker and the ground-truth on a sequence, as
+        a tuple (gt_file, tracker_file). If the data is zipped the zip files are returned.
+        Can be overwritten by datasets which load one file per sequence. By default (None, None) is returned.
+        """
+        return None, None
+
+    def get_seq_info_files(self, seq):
+        """ Returns the locations of the files other than the gt and tracker files from which information about a
+        sequence is read, e.g. its number of timesteps. By default this is the seqmap file, if one is read.
+        """
+        return [self.seqmap_file] if self.seqmap_file is not None else []
+
+    def get_seq_cost_estimate(self, tracker, seq):
+        """ Returns a cheap estimate of the relative cost of evaluating a tracker on a sequence, which is used to
+        schedule the heaviest sequences first when evaluating in parallel.
+        The estimate only uses metadata: the number of timesteps, the number of rows in the gt and tracker files (or
+        their size, if they are not text files) and whether masks or boxes are compared. Can be overwritten by datasets
+        which hold this information in memory or can count the detections of their files more precisely.
+        """
+        if self.seq_lengths is not None:
+            num_timesteps = self.seq_lengths.get(seq, 0) or 0
+        else:
+            num_timesteps = 0
+        gt_file, tracker_file = self.get_seq_files(tracker, seq)
+        return self._seq_cost_model(num_timesteps, self._estimate_file_rows(gt_file),
+                                    self._estimate_file_rows(tracker_file))
+
+    def _seq_cost_model(self, num_timesteps, num_gt_dets, num_tracker_dets):
+        """ Cost model used for load balancing. Loading, preprocessing and the metrics scale with the number of
+        timesteps (per class) and detections, while the similarity calculation scales with the number of gt-tracker
+        pairs per timestep, which is much more expensive for masks than for boxes.
+        """
+        num_pairs = num_gt_dets * num_tracker_dets / max(1, num_timesteps)
+        if self.uses_mask_similarity:
+            num_pairs *= 10
+        return len(self.class_list) * num_timesteps + num_gt_dets + num_tracker_dets + num_pairs
+
+    @classmethod
+    def _estimate_file_rows(cls, file):
+        """ Counts the rows of a text file. Other files (e.g. zipped or json files) and folders are taken to hold a row
+        for each _BYTES_PER_ROW bytes. Returns 0 if the file is unknown."""
+        if file is None:
+            return 0
+        if file.endswith('.txt') and os.path.isfile(file):
+            return cls._count_file_occurrences(file, b'\n')
+        if os.path.isfile(file):
+            return os.path.getsize(file) // _BYTES_PER_ROW
+        num_bytes = 0
+        for root, _, files in os.walk(file):
+            num_bytes += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return num_bytes // _BYTES_PER_ROW
+
+    @staticmethod
+    def _count_file_occurrences(file, token):
+        """ Counts the occurrences of a byte string in a file, e.g. of a key which each detection of a json file has.
+        Returns 0 if the file does not exist."""
+        if file is None or not os.path.isfile(file):
+            return 0
+        count = 0
+        tail = b''
+        with open(file, 'rb') as fp:
+            for block in iter(lambda: fp.read(1 << 20), b''):
+                block = tail + block
+                count += block.count(token)
+                # Keep the end of the block, in case an occurrence is split between two blocks.
+                tail = block[len(block) - len(token) + 1:]
+        return count
+
     @_timing.time
     def get_raw_seq_data(self, tracker, seq):
         """ Loads raw data (tracker and ground-truth) for a single tracker on a single sequence.
@@ -72,6 +152,7 @@ class _BaseDataset(ABC):
         [gt_dets, tracker_dets, gt_crowd_ignore_regions]: list (for each timestep) of lists of detections.
         [similarity_scores]: list (for each timestep) of 2D NDArrays.
         [gt_extras]: dict (for each extra) of lists (for each timestep) of 1D NDArrays (for each det).
+        [gt_derived]: dict of quantities derived only from the gt (see get_gt_derived).
 
         gt_extras contains dataset specific information used for preprocessing such as occlusion and truncation levels.
 
@@ -84,17 +165,80 @@ class _BaseDataset(ABC):
         calculation of metrics such as class confusion matrices. Typically the impact of this on performance is low.
         """
         # Load raw data.
-        raw_gt_data = self._load_raw_file(tracker, seq, is_gt=True)
+        raw_gt_data = self._get_raw_gt_data(tracker, seq)
         raw_tracker_data = self._load_raw_file(tracker, seq, is_gt=False)
         raw_data = {**raw_tracker_data, **raw_gt_data}  # Merges dictionaries
 
         # Calculate similarities for each timestep.
+        raw_data['similarity_scores'] = self._calculate_seq_similarities(raw_data['gt_dets'], raw_data['tracker_dets'])
+        return raw_data
+
+    @_timing.time
+    def _calculate_seq_similarities(self, gt_dets, tracker_dets):
+        """Calculates the similarities between gt and tracker dets for each timestep of a sequence"""
         similarity_scores = []
-        for t, (gt_dets_t, tracker_dets_t) in enumerate(zip(raw_data['gt_dets'], raw_data['tracker_dets'])):
+        for t, (gt_dets_t, tracker_dets_t) in enumerate(zip(gt_dets, tracker_dets)):
             ious = self._calculate_similarities(gt_dets_t, tracker_dets_t)
             similarity_scores.append(ious)
-        raw_data['similarity_scores'] = similarity_scores
-        return raw_data
+        return similarity_scores
+
+    def _get_raw_gt_data(self, tracker, seq):
+        """ Loads the raw gt data of a sequence, which is cached so that the gt is only loaded once when evaluating
+        many trackers. The cache holds at most GT_CACHE_SIZE_MB of data, and the least recently used sequences are
+        removed first. The cached data also includes the quantities derived from it (gt_derived), which are thus only
+        computed once as well.
+        Lists and dicts are copied when returned, so that preprocessing and metrics can replace entries without
+        changing the cached data. The arrays and detections themselves are not copied and must not be modified.
+        """
+        if seq in self.pinned_gt_data:
+            raw_gt_data = self.pinned_gt_data[seq]
+        elif seq in self.gt_cache:
+            self.gt_cache.move_to_end(seq)
+            raw_gt_data = self.gt_cache[seq][0]
+        else:
+            raw_gt_data = self._load_raw_file(tracker, seq, is_gt=True)
+            raw_gt_data['gt_derived'] = {}
+            max_nbytes = self.config.get('GT_CACHE_SIZE_MB', 0) * 2 ** 20
+            nbytes = self._get_nbytes(raw_gt_data)
+            if nbytes <= max_nbytes:
+                self.gt_cache[seq] = (raw_gt_data, nbytes)
+                self.gt_cache_nbytes += nbytes
+                while self.gt_cache_nbytes > max_nbytes:
+                    _, (_, removed_nbytes) = self.gt_cache.popitem(last=False)
+                    self.gt_cache_nbytes -= removed_nbytes
+        return {key: value if key == 'gt_derived' else copy(value) for key, value in raw_gt_data.items()}
+
+    def pin_raw_gt_data(self, seq, raw_gt_data):
+        """ Adds raw gt data loaded elsewhere (e.g. from shared memory) to the gt cache. Pinned data is not counted
+        towards GT_CACHE_SIZE_MB and is never removed.
+        """
+        raw_gt_data['gt_derived'] = {}
+        self.pinned_gt_data[seq] = raw_gt_data
+
+    @staticmethod
+    def get_gt_derived(raw_data, key, compute_fn):
+        """ Returns a quantity derived only from the gt data in raw_data (e.g. gt ids relabelled for a class), which
+        is computed by compute_fn() the first time it is requested for a sequence, and then reused for all trackers
+        for as long as the gt data of the sequence is cached.
+        """
+        if 'gt_derived' not in raw_data:
+            return compute_fn()
+        gt_derived = raw_data['gt_derived']
+        if key not in gt_derived:
+            gt_derived[key] = compute_fn()
+        return gt_derived[key]
+
+    @staticmethod
+    def _get_nbytes(data):
+        """Estimates the memory used by data consisting of (nested) dicts, lists, tuples and numpy arrays"""
+        if isinstance(data, np.ndarray):
+            return sys.getsizeof(data) + (0 if data.base is None else data.nbytes)
+        if isinstance(data, dict):
+            return sys.getsizeof(data) + sum(_BaseDataset._get_nbytes(k) + _BaseDataset._get_nbytes(v)
+                                             for k, v in data.items())
+        if isinstance(data, (list, tuple)):
+            return sys.getsizeof(data) + sum(_BaseDataset._get_nbytes(v) for v in data)
+        return sys.getsizeof(data)
 
     @staticmethod
     def _load_simple_text_file(file, time_col=0, id_col=None, remove_negative_ids=False, valid_filter=None,
@@ -282,9 +426,12 @@ class _BaseDataset(ABC):
 
     @staticmethod
     def _check_unique_ids(data, after_preproc=False):
-        """Check the requirement that the tracker_ids and gt_ids are unique per timestep"""
+        """Check the requirement that the tracker_ids and gt_ids are unique per timestep.
+        The gt_ids of raw data are only checked once for all trackers, while the gt data is cached.
+        """
         gt_ids = data['gt_ids']
         tracker_ids = data['tracker_ids']
+        check_gt = 'gt_derived' not in data or not data['gt_derived'].get('unique_ids_checked', False)
         for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(gt_ids, tracker_ids)):
             if len(tracker_ids_t) > 0:
                 unique_ids, counts = np.unique(tracker_ids_t, return_counts=True)
@@ -297,7 +444,7 @@ class _BaseDataset(ABC):
                         exc_str_init += '\n Note that this error occurred after preprocessing (but not before), ' \
                                         'so ids may not be as in file, and something seems wrong with preproc.'
                     raise TrackEvalException(exc_str)
-            if len(gt_ids_t) > 0:
+            if check_gt and len(gt_ids_t) > 0:
                 unique_ids, counts = np.unique(gt_ids_t, return_counts=True)
                 if np.max(counts) != 1:
                     duplicate_ids = unique_ids[counts > 1]
@@ -308,3 +455,5 @@ class _BaseDataset(ABC):
                         exc_str_init += '\n Note that this error occurred after preprocessing (but not before), ' \
                                         'so ids may not be as in file, and something seems wrong with preproc.'
                     raise TrackEvalException(exc_str)
+        if 'gt_derived' in data:
+            data['gt_derived']['unique_ids_checked'] = True
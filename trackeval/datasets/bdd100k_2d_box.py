@@ -2,7 +2,7 @@
 import os
 import json
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ..utils import TrackEvalException
 from ._base_dataset import _BaseDataset
 from .. import utils
@@ -26,6 +26,7 @@ class BDD100K2DBox(_BaseDataset):
             'SPLIT_TO_EVAL': 'val',  # Valid: 'training', 'val',
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -95,6 +96,18 @@ class BDD100K2DBox(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        return (os.path.join(self.gt_fol, seq + '.json'),
+                os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.json'))
+
+    def get_seq_cost_estimate(self, tracker, seq):
+        # The json files have no rows to count, and the number of timesteps is only known once the gt is loaded, so
+        # the frames and dets are counted by the keys of their entries instead.
+        gt_file, tracker_file = self.get_seq_files(tracker, seq)
+        num_timesteps = self.seq_lengths.get(seq) or self._count_file_occurrences(gt_file, b'"index"')
+        return self._seq_cost_model(num_timesteps, self._count_file_occurrences(gt_file, b'"box2d"'),
+                                    self._count_file_occurrences(tracker_file, b'"box2d"'))
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the BDD100K format
 
@@ -241,7 +254,7 @@ class BDD100K2DBox(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
                 unmatched_indices = np.delete(unmatched_indices, match_cols, axis=0)
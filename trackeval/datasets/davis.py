@@ -22,6 +22,7 @@ class DAVIS(_BaseDataset):
             'SPLIT_TO_EVAL': 'val',  # Valid: 'val', 'train'
             'CLASSES_TO_EVAL': ['general'],
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -37,6 +38,7 @@ class DAVIS(_BaseDataset):
         super().__init__()
         # Fill non-given config values with defaults
         self.config = utils.init_config(config, self.get_default_dataset_config(), self.get_name())
+        self.uses_mask_similarity = True
         # defining a default class since there are no classes in DAVIS
         self.should_classes_combine = False
         self.use_super_categories = False
@@ -69,6 +71,7 @@ class DAVIS(_BaseDataset):
             seqmap_file = self.config["SEQMAP_FILE"]
             if not os.path.isfile(seqmap_file):
                 raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+            self.seqmap_file = seqmap_file
             with open(seqmap_file) as fp:
                 reader = csv.reader(fp)
                 for i, row in enumerate(reader):
@@ -106,6 +109,9 @@ class DAVIS(_BaseDataset):
         else:
             raise TrackEvalException('List of tracker files and tracker display names do not match.')
 
+    def get_seq_files(self, tracker, seq):
+        return os.path.join(self.gt_fol, seq), os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq)
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the DAVIS format
 
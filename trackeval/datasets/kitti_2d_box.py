@@ -2,7 +2,7 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from ..utils import TrackEvalException
@@ -25,6 +25,7 @@ class Kitti2DBox(_BaseDataset):
             'SPLIT_TO_EVAL': 'training',  # Valid: 'training', 'val', 'training_minus_val', 'test'
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -69,6 +70,7 @@ class Kitti2DBox(_BaseDataset):
         seqmap_file = os.path.join(self.gt_fol, seqmap_name)
         if not os.path.isfile(seqmap_file):
             raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+        self.seqmap_file = seqmap_file
         with open(seqmap_file) as fp:
             dialect = csv.Sniffer().sniff(fp.read(1024))
             fp.seek(0)
@@ -117,6 +119,13 @@ class Kitti2DBox(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        if self.data_is_zipped:
+            return (os.path.join(self.gt_fol, 'data.zip'),
+                    os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol + '.zip'))
+        return (os.path.join(self.gt_fol, 'label_02', seq + '.txt'),
+                os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt'))
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the kitti 2D box format
 
@@ -309,7 +318,7 @@ class Kitti2DBox(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
@@ -1,7 +1,7 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
@@ -24,6 +24,7 @@ class KittiMOTS(_BaseDataset):
             'SPLIT_TO_EVAL': 'val',  # Valid: 'training', 'val'
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -39,6 +40,7 @@ class KittiMOTS(_BaseDataset):
         super().__init__()
         # Fill non-given config values with defaults
         self.config = utils.init_config(config, self.get_default_dataset_config(), self.get_name())
+        self.uses_mask_similarity = True
         self.gt_fol = self.config['GT_FOLDER']
         self.tracker_fol = self.config['TRACKERS_FOLDER']
         self.split_to_eval = self.config['SPLIT_TO_EVAL']
@@ -111,6 +113,13 @@ class KittiMOTS(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        if self.data_is_zipped:
+            return (os.path.join(self.gt_fol, 'data.zip'),
+                    os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol + '.zip'))
+        return (self.config["GT_LOC_FORMAT"].format(gt_folder=self.gt_fol, seq=seq),
+                os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt'))
+
     def _get_seq_info(self):
         seq_list = []
         seq_lengths = {}
@@ -130,6 +139,7 @@ class KittiMOTS(_BaseDataset):
             if not os.path.isfile(seqmap_file):
                 print('no seqmap found: ' + seqmap_file)
                 raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+            self.seqmap_file = seqmap_file
             with open(seqmap_file) as fp:
                 reader = csv.reader(fp)
                 for i, _ in enumerate(reader):
@@ -326,8 +336,8 @@ class KittiMOTS(_BaseDataset):
             unmatched_indices = np.arange(tracker_ids.shape[0])
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
-                matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = -10000
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
 
@@ -2,7 +2,7 @@ import os
 import csv
 import configparser
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
@@ -26,6 +26,7 @@ class MotChallenge2DBox(_BaseDataset):
             'SPLIT_TO_EVAL': 'train',  # Valid: 'train', 'test', 'all'
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'DO_PREPROC': True,  # Whether to perform preprocessing (never done for MOT15)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
@@ -128,6 +129,17 @@ class MotChallenge2DBox(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        if self.data_is_zipped:
+            return (os.path.join(self.gt_fol, 'data.zip'),
+                    os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol + '.zip'))
+        return (self.config["GT_LOC_FORMAT"].format(gt_folder=self.gt_fol, seq=seq),
+                os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt'))
+
+    def get_seq_info_files(self, seq):
+        # The number of timesteps is read from the ini file unless given in SEQ_INFO.
+        return super().get_seq_info_files(seq) + [os.path.join(self.gt_fol, seq, 'seqinfo.ini')]
+
     def _get_seq_info(self):
         seq_list = []
         seq_lengths = {}
@@ -156,6 +168,7 @@ class MotChallenge2DBox(_BaseDataset):
             if not os.path.isfile(seqmap_file):
                 print('no seqmap found: ' + seqmap_file)
                 raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+            self.seqmap_file = seqmap_file
             with open(seqmap_file) as fp:
                 reader = csv.reader(fp)
                 for i, row in enumerate(reader):
@@ -328,9 +341,13 @@ class MotChallenge2DBox(_BaseDataset):
         distractor_classes = [self.class_name_to_class_id[x] for x in distractor_class_names]
         cls_id = self.class_name_to_class_id[cls]
 
+        # Which gt dets are kept (step 4) and their relabelled ids only depend on the gt, so are only computed once
+        # for all trackers.
+        gt_to_keep_masks, gt_ids_relabelled, num_gt_ids = self.get_gt_derived(
+            raw_data, ('gt_preproc', cls), lambda: self._get_gt_preproc(raw_data, cls_id))
+
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
-        unique_gt_ids = []
         unique_tracker_ids = []
         num_gt_dets = 0
         num_tracker_dets = 0
@@ -340,7 +357,6 @@ class MotChallenge2DBox(_BaseDataset):
             gt_ids = raw_data['gt_ids'][t]
             gt_dets = raw_data['gt_dets'][t]
             gt_classes = raw_data['gt_classes'][t]
-            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
 
             tracker_ids = raw_data['tracker_ids'][t]
             tracker_dets = raw_data['tracker_dets'][t]
@@ -372,7 +388,7 @@ class MotChallenge2DBox(_BaseDataset):
 
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
@@ -388,29 +404,16 @@ class MotChallenge2DBox(_BaseDataset):
 
             # Remove gt detections marked as to remove (zero marked), and also remove gt detections not in pedestrian
             # class (not applicable for MOT15)
-            if self.do_preproc and self.benchmark != 'MOT15':
-                gt_to_keep_mask = (np.not_equal(gt_zero_marked, 0)) & \
-                                  (np.equal(gt_classes, cls_id))
-            else:
-                # There are no classes for MOT15
-                gt_to_keep_mask = np.not_equal(gt_zero_marked, 0)
-            data['gt_ids'][t] = gt_ids[gt_to_keep_mask]
+            gt_to_keep_mask = gt_to_keep_masks[t]
+            data['gt_ids'][t] = gt_ids_relabelled[t]
             data['gt_dets'][t] = gt_dets[gt_to_keep_mask, :]
             data['similarity_scores'][t] = similarity_scores[gt_to_keep_mask]
 
-            unique_gt_ids += list(np.unique(data['gt_ids'][t]))
             unique_tracker_ids += list(np.unique(data['tracker_ids'][t]))
             num_tracker_dets += len(data['tracker_ids'][t])
             num_gt_dets += len(data['gt_ids'][t])
 
         # Re-label IDs such that there are no empty IDs
-        if len(unique_gt_ids) > 0:
-            unique_gt_ids = np.unique(unique_gt_ids)
-            gt_id_map = np.nan * np.ones((np.max(unique_gt_ids) + 1))
-            gt_id_map[unique_gt_ids] = np.arange(len(unique_gt_ids))
-            for t in range(raw_data['num_timesteps']):
-                if len(data['gt_ids'][t]) > 0:
-                    data['gt_ids'][t] = gt_id_map[data['gt_ids'][t]].astype(np.int)
         if len(unique_tracker_ids) > 0:
             unique_tracker_ids = np.unique(unique_tracker_ids)
             tracker_id_map = np.nan * np.ones((np.max(unique_tracker_ids) + 1))
@@ -423,7 +426,7 @@ class MotChallenge2DBox(_BaseDataset):
         data['num_tracker_dets'] = num_tracker_dets
         data['num_gt_dets'] = num_gt_dets
         data['num_tracker_ids'] = len(unique_tracker_ids)
-        data['num_gt_ids'] = len(unique_gt_ids)
+        data['num_gt_ids'] = num_gt_ids
         data['num_timesteps'] = raw_data['num_timesteps']
         data['seq'] = raw_data['seq']
 
@@ -432,6 +435,35 @@ class MotChallenge2DBox(_BaseDataset):
 
         return data
 
+    def _get_gt_preproc(self, raw_data, cls_id):
+        """ Returns the gt part of preprocessing for a class: the mask of gt dets to keep and the relabelled gt ids
+        for each timestep, and the number of gt ids.
+        """
+        gt_to_keep_masks = []
+        gt_ids_kept = []
+        unique_gt_ids = []
+        for t in range(raw_data['num_timesteps']):
+            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
+            if self.do_preproc and self.benchmark != 'MOT15':
+                gt_to_keep_mask = (np.not_equal(gt_zero_marked, 0)) & \
+                                  (np.equal(raw_data['gt_classes'][t], cls_id))
+            else:
+                # There are no classes for MOT15
+                gt_to_keep_mask = np.not_equal(gt_zero_marked, 0)
+            gt_to_keep_masks.append(gt_to_keep_mask)
+            gt_ids_kept.append(raw_data['gt_ids'][t][gt_to_keep_mask])
+            unique_gt_ids += list(np.unique(gt_ids_kept[t]))
+
+        # Re-label IDs such that there are no empty IDs
+        if len(unique_gt_ids) > 0:
+            unique_gt_ids = np.unique(unique_gt_ids)
+            gt_id_map = np.nan * np.ones((np.max(unique_gt_ids) + 1))
+            gt_id_map[unique_gt_ids] = np.arange(len(unique_gt_ids))
+            for t in range(raw_data['num_timesteps']):
+                if len(gt_ids_kept[t]) > 0:
+                    gt_ids_kept[t] = gt_id_map[gt_ids_kept[t]].astype(np.int)
+        return gt_to_keep_masks, gt_ids_kept, len(unique_gt_ids)
+
     def _calculate_similarities(self, gt_dets_t, tracker_dets_t):
         similarity_scores = self._calculate_box_ious(gt_dets_t, tracker_dets_t, box_format='xywh')
         return similarity_scores
@@ -3,7 +3,7 @@ import numpy as np
 import json
 import itertools
 from collections import defaultdict
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ..utils import TrackEvalException
 from ._base_dataset import _BaseDataset
 from .. import utils
@@ -25,6 +25,7 @@ class TAO(_BaseDataset):
             'CLASSES_TO_EVAL': None,  # Classes to eval (if None, all classes)
             'SPLIT_TO_EVAL': 'training',  # Valid: 'training', 'val'
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -52,7 +53,8 @@ class TAO(_BaseDataset):
         if len(gt_dir_files) != 1:
             raise TrackEvalException(self.gt_fol + ' does not contain exactly one json file.')
 
-        with open(os.path.join(self.gt_fol, gt_dir_files[0])) as f:
+        self.gt_file = os.path.join(self.gt_fol, gt_dir_files[0])
+        with open(self.gt_file) as f:
             self.gt_data = json.load(f)
 
         # merge categories marked with a merged tag in TAO dataset
@@ -108,6 +110,7 @@ class TAO(_BaseDataset):
             raise TrackEvalException('List of tracker files and tracker display names do not match.')
 
         self.tracker_data = {tracker: dict() for tracker in self.tracker_list}
+        self.tracker_files = {}
 
         for tracker in self.tracker_list:
             tr_dir_files = [file for file in os.listdir(os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol))
@@ -115,7 +118,8 @@ class TAO(_BaseDataset):
             if len(tr_dir_files) != 1:
                 raise TrackEvalException(os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol)
                                          + ' does not contain exactly one json file.')
-            with open(os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, tr_dir_files[0])) as f:
+            self.tracker_files[tracker] = os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, tr_dir_files[0])
+            with open(self.tracker_files[tracker]) as f:
                 curr_data = json.load(f)
 
             # limit detections if MAX_DETECTIONS > 0
@@ -139,6 +143,17 @@ class TAO(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        # All sequences are in the same files.
+        return self.gt_file, self.tracker_files[tracker]
+
+    def get_seq_cost_estimate(self, tracker, seq):
+        seq_id = self.seq_name_to_seq_id[seq]
+        num_gt_dets = sum(len(track['annotations']) for track in self.videos_to_gt_tracks.get(seq_id, []))
+        num_tracker_dets = sum(len(track['annotations']) for track
+                               in self.tracker_data[tracker]['vids_to_tracks'].get(seq_id, []))
+        return self._seq_cost_model(self.seq_lengths[seq_id], num_gt_dets, num_tracker_dets)
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the TAO format
 
@@ -318,7 +333,7 @@ class TAO(_BaseDataset):
             if gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_cols = match_cols[actually_matched_mask]
                 unmatched_indices = np.delete(unmatched_indices, match_cols, axis=0)
@@ -2,7 +2,7 @@
 import os
 import csv
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from ..utils import TrackEvalException
@@ -26,6 +26,7 @@ class Unified(_BaseDataset):
             'SPLIT_TO_EVAL': None,
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/DATA_LOC_FORMAT/OUTPUT_SUB_FOLDER
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/DATA_LOC_FORMAT/TRACKER_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -45,6 +46,7 @@ class Unified(_BaseDataset):
 
         # associated dataset folder for benchmark
         self.benchmark = self.config['BENCHMARK']
+        self.uses_mask_similarity = self.benchmark in ['MOTS', 'kitti_mots', 'davis_unsupervised', 'youtube_vis']
         if self.benchmark in ['MOT15', 'MOT16', 'MOT17', 'MOT20', 'MOTS']:
             self.dataset = 'mot_challenge'
         elif self.benchmark in ['kitti_2d_box', 'kitti_mots']:
@@ -175,6 +177,15 @@ class Unified(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        gt_fol = os.path.join(self.gt_fol, self.config['DATA_LOC_FORMAT'].format(dataset=self.dataset,
+                                                                                  benchmark=self.benchmark,
+                                                                                  split=self.split))
+        if self.data_is_zipped:
+            return os.path.join(gt_fol, 'data.zip'), os.path.join(self.tracker_fol, tracker, 'data.zip')
+        return (os.path.join(gt_fol, 'data', seq + '.txt'),
+                os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt'))
+
     def _get_seq_info(self):
         self.seq_list = []
         self.seq_lengths = {}
@@ -193,6 +204,7 @@ class Unified(_BaseDataset):
                 seqmap_file = os.path.join(self.config["SEQMAP_FOLDER"], self.benchmark + '_' + self.split + '.seqmap')
         if not os.path.isfile(seqmap_file):
             raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+        self.seqmap_file = seqmap_file
         with open(seqmap_file) as fp:
             dialect = csv.Sniffer().sniff(fp.readline(), delimiters=' ')
             fp.seek(0)
@@ -728,7 +740,7 @@ class Unified(_BaseDataset):
                 if self.benchmark != 'MOT15' and gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
                     matching_scores = similarity_scores.copy()
                     matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                    match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                    match_rows, match_cols = max_score_assignment(matching_scores)
                     actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                     match_rows = match_rows[actually_matched_mask]
                     match_cols = match_cols[actually_matched_mask]
@@ -23,6 +23,7 @@ class YouTubeVIS(_BaseDataset):
             'CLASSES_TO_EVAL': None,  # Classes to eval (if None, all classes)
             'SPLIT_TO_EVAL': 'train_sub_split',  # Valid: 'train', 'val', 'train_sub_split'
             'PRINT_CONFIG': True,  # Whether to print current config
+            'GT_CACHE_SIZE_MB': 512,  # Memory for caching loaded gt data across trackers (0: no caching)
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -34,6 +35,7 @@ class YouTubeVIS(_BaseDataset):
         super().__init__()
         # Fill non-given config values with defaults
         self.config = utils.init_config(config, self.get_default_dataset_config(), self.get_name())
+        self.uses_mask_similarity = True
         self.gt_fol = self.config['GT_FOLDER'] + 'youtube_vis_' + self.config['SPLIT_TO_EVAL']
         self.tracker_fol = self.config['TRACKERS_FOLDER'] + 'youtube_vis_' + self.config['SPLIT_TO_EVAL']
         self.use_super_categories = False
@@ -52,7 +54,8 @@ class YouTubeVIS(_BaseDataset):
         if len(gt_dir_files) != 1:
             raise TrackEvalException(self.gt_fol + ' does not contain exactly one json file.')
 
-        with open(os.path.join(self.gt_fol, gt_dir_files[0])) as f:
+        self.gt_file = os.path.join(self.gt_fol, gt_dir_files[0])
+        with open(self.gt_file) as f:
             self.gt_data = json.load(f)
 
         # Get classes to eval
@@ -91,17 +94,23 @@ class YouTubeVIS(_BaseDataset):
         else:
             raise TrackEvalException('List of tracker files and tracker display names do not match.')
 
+        # number of detections per video, computed when first needed for estimating the cost of a sequence
+        self.gt_seq_det_counts = None
+        self.tracker_seq_det_counts = {}
+
         # counter for globally unique track IDs
         self.global_tid_counter = 0
 
         self.tracker_data = dict()
+        self.tracker_files = {}
         for tracker in self.tracker_list:
             tracker_dir_path = os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol)
             tr_dir_files = [file for file in os.listdir(tracker_dir_path) if file.endswith('.json')]
             if len(tr_dir_files) != 1:
                 raise TrackEvalException(tracker_dir_path + ' does not contain exactly one json file.')
 
-            with open(os.path.join(tracker_dir_path, tr_dir_files[0])) as f:
+            self.tracker_files[tracker] = os.path.join(tracker_dir_path, tr_dir_files[0])
+            with open(self.tracker_files[tracker]) as f:
                 curr_data = json.load(f)
 
             self.tracker_data[tracker] = curr_data
@@ -109,6 +118,27 @@ class YouTubeVIS(_BaseDataset):
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_files(self, tracker, seq):
+        # All sequences are in the same files.
+        return self.gt_file, self.tracker_files[tracker]
+
+    def get_seq_cost_estimate(self, tracker, seq):
+        if self.gt_seq_det_counts is None:
+            self.gt_seq_det_counts = self._count_seq_dets(self.gt_data['annotations'])
+        if tracker not in self.tracker_seq_det_counts:
+            self.tracker_seq_det_counts[tracker] = self._count_seq_dets(self.tracker_data[tracker])
+        seq_id = self.seq_name_to_seq_id[seq]
+        return self._seq_cost_model(self.seq_lengths[seq_id], self.gt_seq_det_counts.get(seq_id, 0),
+                                    self.tracker_seq_det_counts[tracker].get(seq_id, 0))
+
+    @staticmethod
+    def _count_seq_dets(annotations):
+        """Counts the number of (non-empty) detections of a list of track annotations for each video id"""
+        counts = {}
+        for ann in annotations:
+            counts[ann['video_id']] = counts.get(ann['video_id'], 0) + sum(1 for seg in ann['segmentations'] if seg)
+        return counts
+
     def _load_raw_file(self, tracker, seq, is_gt):
         """Load a file (gt or tracker) in the YouTubeVIS format
         If is_gt, this returns a dict which contains the fields:
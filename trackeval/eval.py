@@ -1,12 +1,18 @@
+import csv
 import time
 import traceback
+import numpy as np
 from multiprocessing.pool import Pool
 from functools import partial
 import os
 from . import utils
 from .utils import TrackEvalException
 from . import _timing
+from . import _assignment
+from ._shared_memory import SharedGtData, attach_shared_gt_data
+from ._result_cache import ResultCache
 from .metrics import Count
+from .metrics._shared_products import compute_shared_products
 
 
 class Evaluator:
@@ -19,6 +25,13 @@ class Evaluator:
         default_config = {
             'USE_PARALLEL': False,
             'NUM_PARALLEL_CORES': 8,
+            'ORDER_BY_COST_ESTIMATE': True,  # In parallel, dispatch the sequences estimated to be slowest first
+            'COST_REPORT_FILE': None,  # if not None, save the estimated and actual cost of each sequence to this file
+            'USE_WORKER_INITIALIZER': True,  # Send datasets and metrics to each worker once, instead of with each task
+            'USE_SHARED_MEMORY_GT': False,  # Load gt once and share it between workers (needs USE_WORKER_INITIALIZER)
+            'CLASSES_PER_TASK': None,  # if not None, split costly sequences into multiples of this many classes
+            'USE_RESULT_CACHE': False,  # Reuse per sequence results cached on disk for unchanged gt, tracker and config
+            'TIME_CHUNK_SIZE': None,  # if not None, parallelize within sequences over chunks of this many timesteps
             'BREAK_ON_ERROR': True,  # Raises exception and exits with error
             'RETURN_ON_ERROR': False,  # if not BREAK_ON_ERROR, then returns from function on error
             'LOG_ON_ERROR': os.path.join(code_path, 'error_log.txt'),  # if not None, save any errors into a log file.
@@ -39,8 +52,8 @@ class Evaluator:
     def __init__(self, config=None):
         """Initialise the evaluator with a config file"""
         self.config = utils.init_config(config, self.get_default_eval_config(), 'Eval')
-        # Only run timing analysis if not run in parallel.
-        if self.config['TIME_PROGRESS'] and not self.config['USE_PARALLEL']:
+        # When run in parallel, times are recorded by the workers and printed in a separate timing analysis.
+        if self.config['TIME_PROGRESS']:
             _timing.DO_TIMING = True
             if self.config['DISPLAY_LESS_PROGRESS']:
                 _timing.DISPLAY_LESS_PROGRESS = True
@@ -55,138 +68,469 @@ class Evaluator:
         output_res = {}
         output_msg = {}
 
-        for dataset, dataset_name in zip(dataset_list, dataset_names):
-            # Get dataset info about what to evaluate
+        for dataset_name in dataset_names:
             output_res[dataset_name] = {}
             output_msg[dataset_name] = {}
-            tracker_list, seq_list, class_list = dataset.get_eval_info()
-            print('\nEvaluating %i tracker(s) on %i sequence(s) for %i class(es) on %s dataset using the following '
-                  'metrics: %s\n' % (len(tracker_list), len(seq_list), len(class_list), dataset_name,
-                                     ', '.join(metric_names)))
-
-            # Evaluate each tracker
-            for tracker in tracker_list:
-                # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
-                try:
-                    # Evaluate each sequence in parallel or in series.
-                    # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
-                    # e.g. res[seq_0001][pedestrian][hota][DetA]
-                    print('\nEvaluating %s\n' % tracker)
-                    time_start = time.time()
-                    if config['USE_PARALLEL']:
-                        with Pool(config['NUM_PARALLEL_CORES']) as pool:
-                            _eval_sequence = partial(eval_sequence, dataset=dataset, tracker=tracker,
-                                                     class_list=class_list, metrics_list=metrics_list,
-                                                     metric_names=metric_names)
-                            results = pool.map(_eval_sequence, seq_list)
-                            res = dict(zip(seq_list, results))
-                    else:
-                        res = {}
-                        for curr_seq in sorted(seq_list):
-                            res[curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list, metrics_list,
-                                                          metric_names)
-
-                    # Combine results over all sequences and then over all classes
-
-                    # collecting combined cls keys (cls averaged, det averaged, super classes)
-                    combined_cls_keys = []
-                    res['COMBINED_SEQ'] = {}
-                    # combine sequences for each class
-                    for c_cls in class_list:
-                        res['COMBINED_SEQ'][c_cls] = {}
-                        for metric, metric_name in zip(metrics_list, metric_names):
-                            curr_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value in res.items() if
-                                        seq_key is not 'COMBINED_SEQ'}
-                            res['COMBINED_SEQ'][c_cls][metric_name] = metric.combine_sequences(curr_res)
-                    # combine classes
-                    if dataset.should_classes_combine:
-                        combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av']
-                        for seq in res.keys():
-                            res[seq]['cls_comb_cls_av'] = {}
-                            res[seq]['cls_comb_det_av'] = {}
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                           res[seq].items() if cls_key not in combined_cls_keys}
-                                res[seq]['cls_comb_cls_av'][metric_name] = \
-                                    metric.combine_classes_class_averaged(cls_res)
-                                res[seq]['cls_comb_det_av'][metric_name] = \
-                                    metric.combine_classes_det_averaged(cls_res)
-                    # combine classes to super classes
-                    if dataset.use_super_categories:
-                        for cat, sub_cats in dataset.super_categories.items():
-                            combined_cls_keys.append(cat)
-                            for seq in res.keys():
-                                res[seq][cat] = {}
-                                for metric, metric_name in zip(metrics_list, metric_names):
-                                    cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                               res[seq].items() if cls_key in sub_cats}
-                                    res[seq][cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
-
-                    # Print and output results in various formats
-                    if config['TIME_PROGRESS']:
-                        print('\nAll sequences for %s finished in %.2f seconds' % (tracker, time.time() - time_start))
-                    output_fol = dataset.get_output_fol(tracker)
-                    tracker_display_name = dataset.get_display_name(tracker)
-                    for c_cls in res['COMBINED_SEQ'].keys():  # class_list + combined classes if calculated
-                        summaries = []
-                        details = []
-                        num_dets = res['COMBINED_SEQ'][c_cls]['Count']['Dets']
-                        if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                table_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value
-                                             in res.items()}
-                                if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
-                                    metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
-                                                       tracker_display_name, c_cls)
-                                elif config['PRINT_RESULTS']:
-                                    metric.print_table(table_res, tracker_display_name, c_cls)
-                                if config['OUTPUT_SUMMARY']:
-                                    summaries.append(metric.summary_results(table_res))
-                                if config['OUTPUT_DETAILED']:
-                                    details.append(metric.detailed_results(table_res))
-                                if config['PLOT_CURVES']:
-                                    metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
-                                                                       output_fol)
-                            if config['OUTPUT_SUMMARY']:
-                                utils.write_summary_results(summaries, c_cls, output_fol)
-                            if config['OUTPUT_DETAILED']:
-                                utils.write_detailed_results(details, c_cls, output_fol)
-
-                    # Output for returning from function
-                    output_res[dataset_name][tracker] = res
-                    output_msg[dataset_name][tracker] = 'Success'
 
-                except Exception as err:
+        # Results of sequences whose gt, tracker and config are unchanged can be loaded from disk instead of evaluated.
+        if config['USE_RESULT_CACHE']:
+            result_caches = [ResultCache(dataset, metrics_list, metric_names) for dataset in dataset_list]
+        else:
+            result_caches = [None] * len(dataset_list)
+
+        if config['USE_PARALLEL'] and config['TIME_CHUNK_SIZE'] is None:
+            # All (dataset, tracker, sequence) work items are served by a single pool, so that cores are not left idle
+            # at the end of each tracker. Results for a tracker are combined as soon as its last sequence finishes.
+            # If CLASSES_PER_TASK is set, sequences are further split into tasks for chunks of classes, which is
+            # useful for datasets with many classes (see _split_class_tasks). Each task is (dataset_idx, tracker, seq,
+            # classes), where classes is None for all classes.
+            tasks = []
+            remaining = {}
+            seq_results = {}
+            cached_trackers = []
+            num_cached_seqs = 0
+            for dataset_idx, (dataset, dataset_name) in enumerate(zip(dataset_list, dataset_names)):
+                # Get dataset info about what to evaluate
+                tracker_list, seq_list, class_list = dataset.get_eval_info()
+                self._print_eval_info(dataset_name, tracker_list, seq_list, class_list, metric_names)
+                for tracker in tracker_list:
+                    # Reserve the output position of each tracker so that results are returned in tracker_list order.
                     output_res[dataset_name][tracker] = None
-                    if type(err) == TrackEvalException:
-                        output_msg[dataset_name][tracker] = str(err)
+                    seq_results[dataset_idx, tracker] = {seq: {} for seq in seq_list}
+                    tracker_tasks = []
+                    for seq in seq_list:
+                        if result_caches[dataset_idx] is not None:
+                            cached_res = result_caches[dataset_idx].get(tracker, seq, class_list)
+                            if cached_res is not None:
+                                seq_results[dataset_idx, tracker][seq] = cached_res
+                                num_cached_seqs += 1
+                                continue
+                        tracker_tasks.append((dataset_idx, tracker, seq, None))
+                    if tracker_tasks:
+                        tasks += tracker_tasks
                     else:
-                        output_msg[dataset_name][tracker] = 'Unknown error occurred.'
-                    print('Tracker %s was unable to be evaluated.' % tracker)
-                    print(err)
-                    traceback.print_exc()
-                    if config['LOG_ON_ERROR'] is not None:
-                        with open(config['LOG_ON_ERROR'], 'a') as f:
-                            print(dataset_name, file=f)
-                            print(tracker, file=f)
-                            print(traceback.format_exc(), file=f)
-                            print('\n\n\n', file=f)
-                    if config['BREAK_ON_ERROR']:
-                        raise err
-                    elif config['RETURN_ON_ERROR']:
+                        cached_trackers.append((dataset_idx, tracker))
+            # Longest job first: tasks are handed out one at a time, heaviest first, so that a long sequence does not
+            # start last and keep the whole evaluation waiting on it.
+            cost_estimates = {}
+            if config['ORDER_BY_COST_ESTIMATE'] or config['COST_REPORT_FILE'] is not None or \
+                    config['CLASSES_PER_TASK'] is not None:
+                for dataset_idx, tracker, seq, _ in tasks:
+                    cost_estimates[dataset_idx, tracker, seq] = \
+                        dataset_list[dataset_idx].get_seq_cost_estimate(tracker, seq)
+            if config['CLASSES_PER_TASK'] is not None:
+                tasks = self._split_class_tasks(tasks, dataset_list, cost_estimates, config['CLASSES_PER_TASK'],
+                                                config['NUM_PARALLEL_CORES'])
+            for dataset_idx, tracker, _, _ in tasks:
+                remaining[dataset_idx, tracker] = remaining.get((dataset_idx, tracker), 0) + 1
+            if config['ORDER_BY_COST_ESTIMATE']:
+                # The cost of a chunk of classes is taken to be proportional to its number of classes.
+                tasks.sort(key=lambda task: cost_estimates[task[:3]] * (
+                    1 if task[3] is None else len(task[3]) / len(dataset_list[task[0]].get_eval_info()[2])),
+                    reverse=True)
+            if config['USE_RESULT_CACHE']:
+                print('\nLoaded the results of %i sequence(s) from the result cache' % num_cached_seqs)
+            print('\nEvaluating %i task(s) in parallel on %i cores\n' % (len(tasks), config['NUM_PARALLEL_CORES']))
+
+            time_start = time.time()
+            seq_times = {}
+            task_timings = []
+            # Trackers with all results cached are finished right away.
+            for dataset_idx, tracker in cached_trackers:
+                dataset_name = dataset_names[dataset_idx]
+                try:
+                    self._finish_tracker(dataset_list[dataset_idx], dataset_name, tracker,
+                                         seq_results.pop((dataset_idx, tracker)), metrics_list, metric_names,
+                                         time_start, output_res, output_msg)
+                except Exception as err:
+                    if self._handle_error(err, dataset_name, tracker, output_res, output_msg):
                         return output_res, output_msg
+            shared_gt_data = None
+            try:
+                if config['USE_WORKER_INITIALIZER']:
+                    # The datasets and metrics are passed to each worker once when it starts (and are simply inherited
+                    # if processes are forked), so that tasks only carry their (dataset, tracker, sequence) keys.
+                    shared_gt_descriptors = None
+                    if config['USE_SHARED_MEMORY_GT'] and tasks:
+                        shared_gt_data = SharedGtData(dataset_list)
+                        shared_gt_descriptors = shared_gt_data.descriptors
+                    pool = Pool(config['NUM_PARALLEL_CORES'], initializer=_init_worker,
+                                initargs=(dataset_list, metrics_list, metric_names, shared_gt_descriptors,
+                                          config['TIME_PROGRESS']))
+                    eval_task = _eval_sequence_task
+                else:
+                    pool = Pool(config['NUM_PARALLEL_CORES'], initializer=_init_worker,
+                                initargs=(None, None, None, None, config['TIME_PROGRESS']))
+                    eval_task = partial(_eval_sequence_task, dataset_list=dataset_list, metrics_list=metrics_list,
+                                        metric_names=metric_names)
+                with pool:
+                    for task, seq_res, err, task_timing in pool.imap_unordered(eval_task, tasks, chunksize=1):
+                        dataset_idx, tracker, seq, _ = task
+                        seq_time = task_timing['end'] - task_timing['start']
+                        seq_times[dataset_idx, tracker, seq] = seq_times.get((dataset_idx, tracker, seq), 0) + seq_time
+                        task_timings.append(task_timing)
+                        dataset, dataset_name = dataset_list[dataset_idx], dataset_names[dataset_idx]
+                        if (dataset_idx, tracker) not in remaining:
+                            continue  # An earlier task of this tracker already failed.
+                        try:
+                            if err is not None:
+                                raise err
+                            seq_results[dataset_idx, tracker][seq].update(seq_res)
+                            if result_caches[dataset_idx] is not None:
+                                result_caches[dataset_idx].put(tracker, seq, seq_res)
+                            remaining[dataset_idx, tracker] -= 1
+                            if remaining[dataset_idx, tracker] > 0:
+                                continue
+                            del remaining[dataset_idx, tracker]
+                            self._finish_tracker(dataset, dataset_name, tracker,
+                                                 seq_results.pop((dataset_idx, tracker)), metrics_list, metric_names,
+                                                 time_start, output_res, output_msg)
+                        except Exception as err:
+                            remaining.pop((dataset_idx, tracker), None)
+                            seq_results.pop((dataset_idx, tracker), None)
+                            if self._handle_error(err, dataset_name, tracker, output_res, output_msg):
+                                return output_res, output_msg
+            finally:
+                # Shared memory is owned by this process and must always be released, also on errors.
+                if shared_gt_data is not None:
+                    shared_gt_data.unlink()
+            if config['TIME_PROGRESS']:
+                self._print_parallel_timing(task_timings, time_start, time.time())
+            if config['COST_REPORT_FILE'] is not None:
+                self._output_cost_report(dataset_names, cost_estimates, seq_times)
+        else:
+            # Sequences are evaluated one after the other. With TIME_CHUNK_SIZE, the timesteps of each sequence are
+            # split into chunks for the metrics which support it, and in parallel the chunks are evaluated by a pool.
+            chunk_pool = None
+            chunk_map = map
+            if config['USE_PARALLEL']:
+                # The times of the chunks are not collected from the workers, so they neither record nor print them.
+                chunk_pool = Pool(config['NUM_PARALLEL_CORES'], initializer=_init_worker,
+                                  initargs=(None, None, None, None, False))
+                chunk_map = chunk_pool.map
+            _assignment.pop_counts()
+            try:
+                for dataset, dataset_name, result_cache in zip(dataset_list, dataset_names, result_caches):
+                    # Get dataset info about what to evaluate
+                    tracker_list, seq_list, class_list = dataset.get_eval_info()
+                    self._print_eval_info(dataset_name, tracker_list, seq_list, class_list, metric_names)
+
+                    # Evaluate each tracker
+                    for tracker in tracker_list:
+                        # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
+                        try:
+                            # Evaluate each sequence in series.
+                            # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
+                            # e.g. res[seq_0001][pedestrian][hota][DetA]
+                            print('\nEvaluating %s\n' % tracker)
+                            time_start = time.time()
+                            res = {}
+                            for curr_seq in sorted(seq_list):
+                                if result_cache is not None:
+                                    res[curr_seq] = result_cache.get(tracker, curr_seq, class_list)
+                                    if res[curr_seq] is not None:
+                                        continue
+                                res[curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list, metrics_list,
+                                                              metric_names, time_chunk_size=config['TIME_CHUNK_SIZE'],
+                                                              chunk_map=chunk_map)
+                                if result_cache is not None:
+                                    result_cache.put(tracker, curr_seq, res[curr_seq])
+                            self._combine_and_output(res, dataset, tracker, class_list, metrics_list, metric_names,
+                                                     time_start)
+
+                            # Output for returning from function
+                            output_res[dataset_name][tracker] = res
+                            output_msg[dataset_name][tracker] = 'Success'
+
+                        except Exception as err:
+                            if self._handle_error(err, dataset_name, tracker, output_res, output_msg):
+                                return output_res, output_msg
+            finally:
+                if chunk_pool is not None:
+                    chunk_pool.terminate()
+            # The assignments of chunks evaluated by the pool are counted in its workers and are not included.
+            if config['TIME_PROGRESS'] and chunk_pool is None:
+                self._print_assignment_counts(_assignment.pop_counts())
 
         return output_res, output_msg
 
+    @staticmethod
+    def _print_eval_info(dataset_name, tracker_list, seq_list, class_list, metric_names):
+        print('\nEvaluating %i tracker(s) on %i sequence(s) for %i class(es) on %s dataset using the following '
+              'metrics: %s\n' % (len(tracker_list), len(seq_list), len(class_list), dataset_name,
+                                 ', '.join(metric_names)))
+
+    def _finish_tracker(self, dataset, dataset_name, tracker, tracker_seq_results, metrics_list, metric_names,
+                        time_start, output_res, output_msg):
+        """Combines and outputs the results of a tracker evaluated in parallel, once all its results are available"""
+        # Keep the sequence and class order of the dataset in the combined results.
+        _, seq_list, class_list = dataset.get_eval_info()
+        res = {seq: {cls: tracker_seq_results[seq][cls] for cls in class_list} for seq in seq_list}
+        self._combine_and_output(res, dataset, tracker, class_list, metrics_list, metric_names, time_start)
+        output_res[dataset_name][tracker] = res
+        output_msg[dataset_name][tracker] = 'Success'
+
+    def _combine_and_output(self, res, dataset, tracker, class_list, metrics_list, metric_names, time_start):
+        """Combines the per sequence results (res) of one tracker over all sequences and over all classes, and then
+        prints and outputs the results in various formats. res is updated in place.
+        """
+        config = self.config
+
+        # Combine results over all sequences and then over all classes
+
+        # collecting combined cls keys (cls averaged, det averaged, super classes)
+        combined_cls_keys = []
+        res['COMBINED_SEQ'] = {}
+        # combine sequences for each class
+        for c_cls in class_list:
+            res['COMBINED_SEQ'][c_cls] = {}
+            for metric, metric_name in zip(metrics_list, metric_names):
+                curr_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value in res.items() if
+                            seq_key != 'COMBINED_SEQ'}
+                res['COMBINED_SEQ'][c_cls][metric_name] = metric.combine_sequences(curr_res)
+        # combine classes
+        if dataset.should_classes_combine:
+            combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av']
+            for seq in res.keys():
+                res[seq]['cls_comb_cls_av'] = {}
+                res[seq]['cls_comb_det_av'] = {}
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                               res[seq].items() if cls_key not in combined_cls_keys}
+                    res[seq]['cls_comb_cls_av'][metric_name] = \
+                        metric.combine_classes_class_averaged(cls_res)
+                    res[seq]['cls_comb_det_av'][metric_name] = \
+                        metric.combine_classes_det_averaged(cls_res)
+        # combine classes to super classes
+        if dataset.use_super_categories:
+            for cat, sub_cats in dataset.super_categories.items():
+                combined_cls_keys.append(cat)
+                for seq in res.keys():
+                    res[seq][cat] = {}
+                    for metric, metric_name in zip(metrics_list, metric_names):
+                        cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                                   res[seq].items() if cls_key in sub_cats}
+                        res[seq][cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
+
+        # Print and output results in various formats
+        if config['TIME_PROGRESS']:
+            print('\nAll sequences for %s finished in %.2f seconds' % (tracker, time.time() - time_start))
+        output_fol = dataset.get_output_fol(tracker)
+        tracker_display_name = dataset.get_display_name(tracker)
+        for c_cls in res['COMBINED_SEQ'].keys():  # class_list + combined classes if calculated
+            summaries = []
+            details = []
+            num_dets = res['COMBINED_SEQ'][c_cls]['Count']['Dets']
+            if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    table_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value
+                                 in res.items()}
+                    if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
+                        metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
+                                           tracker_display_name, c_cls)
+                    elif config['PRINT_RESULTS']:
+                        metric.print_table(table_res, tracker_display_name, c_cls)
+                    if config['OUTPUT_SUMMARY']:
+                        summaries.append(metric.summary_results(table_res))
+                    if config['OUTPUT_DETAILED']:
+                        details.append(metric.detailed_results(table_res))
+                    if config['PLOT_CURVES']:
+                        metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
+                                                           output_fol)
+                if config['OUTPUT_SUMMARY']:
+                    utils.write_summary_results(summaries, c_cls, output_fol)
+                if config['OUTPUT_DETAILED']:
+                    utils.write_detailed_results(details, c_cls, output_fol)
+
+    @staticmethod
+    def _split_class_tasks(tasks, dataset_list, cost_estimates, classes_per_task, num_cores):
+        """ Splits the tasks of sequences into tasks for chunks of their classes, each of a multiple of classes_per_task
+        classes. Each task loads the raw data of its sequence, so sequences are only split as far as needed to spread
+        the work evenly over the cores: into about as many tasks as their share of the estimated cost of all tasks
+        times the number of cores. Without cost estimates, all sequences are split alike.
+        """
+        total_cost = sum(cost_estimates[task[:3]] for task in tasks)
+        split_tasks = []
+        for task in tasks:
+            class_list = dataset_list[task[0]].get_eval_info()[2]
+            num_chunks = -(-len(class_list) // classes_per_task)
+            if total_cost > 0:
+                num_splits = int(round(num_cores * cost_estimates[task[:3]] / total_cost))
+            else:
+                num_splits = -(-num_cores // len(tasks))
+            num_splits = min(num_splits, num_chunks)
+            if num_splits <= 1:
+                split_tasks.append(task)
+                continue
+            bounds = np.round(np.linspace(0, num_chunks, num_splits + 1)).astype(int) * classes_per_task
+            split_tasks += [task[:3] + (tuple(class_list[start:end]),) for start, end in zip(bounds[:-1], bounds[1:])]
+        return split_tasks
+
+    @staticmethod
+    def _print_parallel_timing(task_timings, time_start, time_end):
+        """Prints the time spent in each function summed over all worker processes, and for each worker process how
+        long it spent evaluating tasks and how long it was idle, between the start of the pool (time_start) and the end
+        of the last task (time_end).
+        """
+        total_time = time_end - time_start
+        workers = {}
+        timer_dict = {}
+        assignment_counts = dict.fromkeys(_assignment.counts, 0)
+        for task_timing in task_timings:
+            num_tasks, busy_time = workers.get(task_timing['pid'], (0, 0))
+            workers[task_timing['pid']] = (num_tasks + 1, busy_time + task_timing['end'] - task_timing['start'])
+            for method_name, tt in task_timing['timer_dict'].items():
+                timer_dict[method_name] = timer_dict.get(method_name, 0) + tt
+            for key, count in task_timing['assignment_counts'].items():
+                assignment_counts[key] += count
+
+        print('\nTiming analysis of workers (summed over all workers):')
+        for method_name, tt in timer_dict.items():
+            print('%-70s %2.4f sec' % (method_name, tt))
+        print('\nWorker utilization over %.2f sec:' % total_time)
+        print('%-12s%8s%14s%14s%14s' % ('worker', 'tasks', 'busy (sec)', 'idle (sec)', 'utilization'))
+        total_busy_time = 0
+        for pid, (num_tasks, busy_time) in sorted(workers.items()):
+            print('%-12s%8i%14.2f%14.2f%13.1f%%' % (pid, num_tasks, busy_time, total_time - busy_time,
+                                                   100 * busy_time / max(total_time, 1e-9)))
+            total_busy_time += busy_time
+        if workers:
+            print('%-12s%8i%14.2f%14.2f%13.1f%%' % ('all', len(task_timings), total_busy_time,
+                                                   len(workers) * total_time - total_busy_time,
+                                                   100 * total_busy_time / max(len(workers) * total_time, 1e-9)))
+        Evaluator._print_assignment_counts(assignment_counts)
+
+    @staticmethod
+    def _print_assignment_counts(assignment_counts):
+        """Prints how many assignment problems were solved, and how many of them were partial permutations which did
+        not need the hungarian algorithm (see _assignment)"""
+        num_assignments = sum(assignment_counts.values())
+        print('\nAssignments: %i, of which %i (%.1f%%) were partial permutations solved without the hungarian '
+              'algorithm' % (num_assignments, assignment_counts['permutation'],
+                             100 * assignment_counts['permutation'] / max(num_assignments, 1)))
+
+    def _output_cost_report(self, dataset_names, cost_estimates, seq_times):
+        """Compares the estimated cost of each sequence with the time it actually took to evaluate, so that the cost
+        model used for load balancing can be tuned. The estimate is also given scaled to seconds.
+        """
+        tasks = [task for task in cost_estimates.keys() if task in seq_times]
+        estimates = np.array([cost_estimates[task] for task in tasks], dtype=float)
+        times = np.array([seq_times[task] for task in tasks], dtype=float)
+        secs_per_cost = times.sum() / max(estimates.sum(), np.finfo('float').eps)
+        if len(tasks) > 1 and estimates.std() > 0 and times.std() > 0:
+            correlation = np.corrcoef(estimates, times)[0, 1]
+        else:
+            correlation = np.nan
+        if self.config['TIME_PROGRESS']:
+            print('\nCost estimate vs actual time: correlation %.3f, %.3g seconds per unit of estimated cost'
+                  % (correlation, secs_per_cost))
+
+        out_file = self.config['COST_REPORT_FILE']
+        os.makedirs(os.path.dirname(os.path.abspath(out_file)), exist_ok=True)
+        with open(out_file, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(['dataset', 'tracker', 'seq', 'estimated_cost', 'scaled_estimate', 'seconds'])
+            for (dataset_idx, tracker, seq), estimate, seq_time in zip(tasks, estimates, times):
+                writer.writerow([dataset_names[dataset_idx], tracker, seq, '%.6g' % estimate,
+                                 '%.6g' % (estimate * secs_per_cost), '%.6g' % seq_time])
+            writer.writerow(['COMBINED', '', '', '%.6g' % estimates.sum(), '%.6g' % (estimates.sum() * secs_per_cost),
+                             '%.6g' % times.sum()])
+            writer.writerow(['CORRELATION', '', '', '%.6g' % correlation, '', ''])
+
+    def _handle_error(self, err, dataset_name, tracker, output_res, output_msg):
+        """Records and logs an error which occurred while evaluating a tracker.
+        Raises the error if BREAK_ON_ERROR, and returns whether the evaluation should return early (RETURN_ON_ERROR).
+        """
+        config = self.config
+        output_res[dataset_name][tracker] = None
+        if type(err) == TrackEvalException:
+            output_msg[dataset_name][tracker] = str(err)
+        else:
+            output_msg[dataset_name][tracker] = 'Unknown error occurred.'
+        # Errors raised in a worker process carry the traceback of the worker, as it is lost when pickled.
+        err_traceback = getattr(err, 'worker_traceback', None) or traceback.format_exc()
+        print('Tracker %s was unable to be evaluated.' % tracker)
+        print(err)
+        print(err_traceback)
+        if config['LOG_ON_ERROR'] is not None:
+            with open(config['LOG_ON_ERROR'], 'a') as f:
+                print(dataset_name, file=f)
+                print(tracker, file=f)
+                print(err_traceback, file=f)
+                print('\n\n\n', file=f)
+        if config['BREAK_ON_ERROR']:
+            raise err
+        return config['RETURN_ON_ERROR']
+
 
 @_timing.time
-def eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names):
-    """Function for evaluating a single sequence"""
-    raw_data = dataset.get_raw_seq_data(tracker, seq)
+def eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names, raw_data=None, time_chunk_size=None,
+                  chunk_map=map):
+    """Function for evaluating a single sequence. raw_data can be given if it has already been loaded.
+    If time_chunk_size is given, the metrics evaluate sequences with more timesteps in chunks using chunk_map.
+    """
+    if raw_data is None:
+        raw_data = dataset.get_raw_seq_data(tracker, seq)
     seq_res = {}
     for cls in class_list:
         seq_res[cls] = {}
         data = dataset.get_preprocessed_seq_data(raw_data, cls)
+        use_chunks = time_chunk_size is not None and data['num_timesteps'] > time_chunk_size
+        if not use_chunks:
+            # Calculate the products shared between metrics once for all metrics (chunks calculate their own).
+            compute_shared_products(data, [key for metric in metrics_list for key in metric.shared_products])
         for metric, met_name in zip(metrics_list, metric_names):
-            seq_res[cls][met_name] = metric.eval_sequence(data)
+            if use_chunks:
+                seq_res[cls][met_name] = metric.eval_sequence_chunked(data, time_chunk_size, chunk_map)
+            else:
+                seq_res[cls][met_name] = metric.eval_sequence(data)
     return seq_res
+
+
+# Datasets and metrics of a worker process, set once by _init_worker when the worker starts.
+_worker_eval_objects = None
+# Shared memory blocks a worker process is attached to, which need to stay open while the worker runs.
+_worker_shared_memory_blocks = []
+
+
+def _init_worker(dataset_list, metrics_list, metric_names, shared_gt_descriptors=None, do_timing=False):
+    """Pool initializer which stores the datasets and metrics to evaluate in the worker process.
+    If shared_gt_descriptors are given, the gt data of the datasets is used from shared memory.
+    If do_timing, the time spent in each function is recorded and sent back with the result of each task.
+    """
+    global _worker_eval_objects, _worker_shared_memory_blocks
+    _worker_eval_objects = (dataset_list, metrics_list, metric_names)
+    if shared_gt_descriptors is not None:
+        _worker_shared_memory_blocks = attach_shared_gt_data(dataset_list, shared_gt_descriptors)
+    if do_timing:
+        _timing.start_worker_timing()
+    else:
+        _timing.DO_TIMING = False
+
+
+def _eval_sequence_task(task, dataset_list=None, metrics_list=None, metric_names=None):
+    """Evaluates a single (dataset, tracker, sequence, classes) work item in a worker process.
+    If classes is None all classes of the dataset are evaluated, otherwise only the given classes.
+    If the datasets and metrics are not given, those stored in the worker by _init_worker are used.
+    Errors are returned rather than raised, so that a failing tracker does not stop the pool serving the others.
+    Returns (task, result, error, timing), where timing holds the process id, the start and end time of the task, the
+    time spent in each function (if recorded) and the number of assignment problems of each kind (see _assignment).
+    """
+    if dataset_list is None:
+        dataset_list, metrics_list, metric_names = _worker_eval_objects
+    dataset_idx, tracker, seq, classes = task
+    dataset = dataset_list[dataset_idx]
+    _timing.pop_timer_dict()
+    _assignment.pop_counts()
+    time_start = time.time()
+    try:
+        class_list = dataset.get_eval_info()[2] if classes is None else list(classes)
+        seq_res = eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names)
+    except Exception as err:
+        err.worker_traceback = traceback.format_exc()
+        seq_res, task_err = None, err
+    else:
+        task_err = None
+    timing = {'pid': os.getpid(), 'start': time_start, 'end': time.time(), 'timer_dict': _timing.pop_timer_dict(),
+              'assignment_counts': _assignment.pop_counts()}
+    return task, seq_res, task_err, timing
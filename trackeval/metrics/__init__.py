@@ -5,3 +5,4 @@ from .count import Count
 from .j_and_f import JAndF
 from .track_map import TrackMAP
 from .vace import VACE
+from ._shared_products import register_shared_product, get_shared_product
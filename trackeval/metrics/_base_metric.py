@@ -17,6 +17,8 @@ class _BaseMetric(ABC):
         self.fields = []
         self.summary_fields = []
         self.registered = False
+        # Shared products (see _shared_products) used by eval_sequence, as (name, *args) tuples
+        self.shared_products = []
 
     #####################################################################
     # Abstract functions for subclasses to implement
@@ -38,6 +40,13 @@ class _BaseMetric(ABC):
     def combine_classes_det_averaged(self, all_res):
         ...
 
+    def eval_sequence_chunked(self, data, chunk_size, chunk_map=map):
+        """ Calculates the metric for one sequence, with the timesteps split into chunks of chunk_size which are
+        evaluated with chunk_map (e.g. the map of a process pool), for very long sequences. Gives exactly the same
+        results as eval_sequence. Metrics which do not implement this evaluate the whole sequence at once.
+        """
+        return self.eval_sequence(data)
+
     def plot_single_tracker_results(self, all_res, tracker, output_folder, cls):
         """Plot results of metrics, only valid for metrics with self.plottable"""
         if self.plottable:
@@ -52,6 +61,11 @@ class _BaseMetric(ABC):
     def get_name(cls):
         return cls.__name__
 
+    @staticmethod
+    def _split_time_chunks(data, chunk_size, keys=('gt_ids', 'tracker_ids', 'similarity_scores')):
+        """Splits the per-timestep data of a sequence into chunks of chunk_size timesteps"""
+        return [{key: data[key][t:t + chunk_size] for key in keys} for t in range(0, data['num_timesteps'], chunk_size)]
+
     @staticmethod
     def _combine_sum(all_res, field):
         """Combine sequence results via sum"""
@@ -63,6 +77,14 @@ class _BaseMetric(ABC):
         return sum([all_res[k][field] * all_res[k][weight_field] for k in all_res.keys()]) / np.maximum(1.0, comb_res[
             weight_field])
 
+    def _stack_array_fields(self, array_res):
+        """Combines the results for each of the array_labels into one result, with the array fields holding the values
+        for all labels. The other fields are taken from the first result."""
+        res = dict(array_res[0])
+        for field in self.integer_array_fields + self.float_array_fields:
+            res[field] = np.array([r[field] for r in array_res])
+        return res
+
     def print_table(self, table_res, tracker, cls):
         """Prints table of results for all sequences"""
         print('')
@@ -81,6 +103,8 @@ class _BaseMetric(ABC):
         for h in self.summary_fields:
             if h in self.float_array_fields:
                 vals.append("{0:1.5g}".format(100 * np.mean(results_[h])))
+            elif h in self.integer_array_fields:
+                vals.append("{0:1.5g}".format(np.mean(results_[h])))
             elif h in self.float_fields:
                 vals.append("{0:1.5g}".format(100 * float(results_[h])))
             elif h in self.integer_fields:
@@ -0,0 +1,161 @@
+""" Cache of intermediate products of the data of a sequence which are used by several metrics, e.g. the number of dets
+of each id or the pairs of ids whose dets overlap by at least a threshold in each timestep.
+
+Each product is calculated when first requested, and stored in data['shared_products'] for the other metrics. As the
+evaluator passes the same data (of a sequence and class) to all metrics, each product is calculated once however many
+metrics use it. Products are given in time order, and must not be modified by the metrics.
+
+Products are registered with register_shared_product, which is also how custom metrics add their own products. Most
+products are calculated from the data of the whole sequence at once: flat_similarity concatenates the dets and
+similarity scores of all timesteps, and the products built on it (id_counts, track_lifespans, threshold_matches,
+soft_iou_matches) are then calculated with numpy operations on these arrays rather than by looping over the timesteps.
+Products which are calculated timestep by timestep (per_timestep, e.g. max_similarity_matches) are calculated by a
+function called for each timestep. Metrics declare the products they use in metric.shared_products, and the evaluator
+calculates these for all metrics before evaluating them (compute_shared_products), calling the functions of all
+per-timestep products in a single loop over the timesteps.
+"""
+
+import numpy as np
+from .._assignment import max_score_assignment
+from ..utils import TrackEvalException
+
+
+_PRODUCTS = {}
+
+
+def register_shared_product(name, per_timestep=False):
+    """ Decorator registering a function calculating a shared product under the given name.
+    The function is called as function(data, *args), or if per_timestep as function(data, t, *args) for each timestep t
+    with the product being the list of its results. Functions can use other products with get_shared_product.
+    """
+    def register(function):
+        if name in _PRODUCTS:
+            raise TrackEvalException('A shared product named %s is already registered.' % name)
+        _PRODUCTS[name] = (function, per_timestep)
+        return function
+    return register
+
+
+def get_shared_product(data, name, *args):
+    """Returns the product of the given name (and arguments) of the data of a sequence, or of a chunk of timesteps"""
+    products = data.setdefault('shared_products', {})
+    key = (name,) + args
+    if key not in products:
+        compute_shared_products(data, [key])
+    return products[key]
+
+
+def compute_shared_products(data, product_keys):
+    """ Calculates the products given as (name, *args) tuples which are not yet calculated for the data. The
+    per-timestep products are calculated together in one loop over the timesteps."""
+    products = data.setdefault('shared_products', {})
+    product_keys = [key for key in dict.fromkeys(tuple(key) for key in product_keys) if key not in products]
+    for key in product_keys:
+        if key[0] not in _PRODUCTS:
+            raise TrackEvalException('Unknown shared product: %s' % key[0])
+    timestep_keys = [key for key in product_keys if _PRODUCTS[key[0]][1]]
+    if timestep_keys:
+        timestep_products = {key: [] for key in timestep_keys}
+        for t in range(len(data['gt_ids'])):
+            for key, values in timestep_products.items():
+                values.append(_PRODUCTS[key[0]][0](data, t, *key[1:]))
+        products.update(timestep_products)
+    for key in product_keys:
+        if key not in products:
+            products[key] = _PRODUCTS[key[0]][0](data, *key[1:])
+
+
+@register_shared_product('flat_similarity')
+def _flat_similarity(data):
+    """ Flattens the similarity scores of all timesteps into one array. Returns a dict of the scores ('similarity'), the
+    index of the gt det and tracker det of each score into the concatenated dets of all timesteps ('gt_det',
+    'tracker_det'), and the ids and timesteps of the gt dets and tracker dets ('gt_ids', 'tracker_ids',
+    'gt_timesteps', 'tracker_timesteps')."""
+    no_ids = [np.zeros(0, dtype=np.int64)]
+    gt_ids = np.concatenate(no_ids + list(data['gt_ids'])).astype(np.int64)
+    tracker_ids = np.concatenate(no_ids + list(data['tracker_ids'])).astype(np.int64)
+    num_gt_dets_t = np.array([len(gt_ids_t) for gt_ids_t in data['gt_ids']], dtype=np.int64)
+    num_tracker_dets_t = np.array([len(tracker_ids_t) for tracker_ids_t in data['tracker_ids']], dtype=np.int64)
+    similarity = np.concatenate([np.zeros(0)] + [np.asarray(similarity_t, dtype=float).ravel()
+                                                 for similarity_t in data['similarity_scores']])
+    # Scores are in row-major order in each timestep: each gt det has a row of scores with the tracker dets of the
+    # timestep.
+    gt_timesteps = np.repeat(np.arange(len(num_gt_dets_t)), num_gt_dets_t)
+    tracker_timesteps = np.repeat(np.arange(len(num_tracker_dets_t)), num_tracker_dets_t)
+    row_lengths = num_tracker_dets_t[gt_timesteps]
+    row_starts = np.cumsum(row_lengths) - row_lengths
+    gt_det = np.repeat(np.arange(len(gt_ids)), row_lengths)
+    tracker_det = np.arange(len(similarity)) - np.repeat(
+        row_starts - (np.cumsum(num_tracker_dets_t) - num_tracker_dets_t)[gt_timesteps], row_lengths)
+    return {'similarity': similarity, 'gt_det': gt_det, 'tracker_det': tracker_det, 'gt_ids': gt_ids,
+            'tracker_ids': tracker_ids, 'gt_timesteps': gt_timesteps, 'tracker_timesteps': tracker_timesteps}
+
+
+@register_shared_product('id_counts')
+def _id_counts(data):
+    """Returns the number of dets of each gt_id and tracker_id"""
+    flat = get_shared_product(data, 'flat_similarity')
+    return (np.bincount(flat['gt_ids'], minlength=data.get('num_gt_ids', 0)),
+            np.bincount(flat['tracker_ids'], minlength=data.get('num_tracker_ids', 0)))
+
+
+@register_shared_product('track_lifespans')
+def _track_lifespans(data):
+    """ Returns the first and the last timestep in which each gt_id and each tracker_id has a det, as (gt_first,
+    gt_last, tracker_first, tracker_last), with -1 for ids without dets. Together with id_counts, this gives the number
+    of timesteps in which a track is missing between its first and last det."""
+    flat = get_shared_product(data, 'flat_similarity')
+    lifespans = []
+    for ids, timesteps, num_ids in [(flat['gt_ids'], flat['gt_timesteps'], data.get('num_gt_ids', 0)),
+                                    (flat['tracker_ids'], flat['tracker_timesteps'], data.get('num_tracker_ids', 0))]:
+        first = -np.ones(max(num_ids, ids.max() + 1 if len(ids) else 0), dtype=np.int64)
+        last = first.copy()
+        # The dets are in time order, so the first det of each id, forwards and in reverse, gives its lifespan.
+        unique_ids, first_det = np.unique(ids, return_index=True)
+        first[unique_ids] = timesteps[first_det]
+        unique_ids, last_det = np.unique(ids[::-1], return_index=True)
+        last[unique_ids] = timesteps[::-1][last_det]
+        lifespans += [first, last]
+    return tuple(lifespans)
+
+
+def count_pairs(gt_ids, tracker_ids, counts=None):
+    """ Counts the occurrences (or sums the counts) of each distinct (gt_id, tracker_id) pair, e.g. of the pairs given
+    by threshold_matches. Returns the pairs, sorted by gt_id and then tracker_id, and their counts."""
+    keys = (np.asarray(gt_ids, dtype=np.int64) << 32) | np.asarray(tracker_ids, dtype=np.int64)
+    keys, idx = np.unique(keys, return_inverse=True)
+    counts = np.bincount(idx, weights=counts, minlength=len(keys)).astype(np.int64)
+    return keys >> 32, keys & 0xffffffff, counts
+
+
+@register_shared_product('threshold_matches')
+def _threshold_matches(data, threshold):
+    """Returns the (gt_id, tracker_id) of each pair of dets with a similarity of at least threshold"""
+    flat = get_shared_product(data, 'flat_similarity')
+    matches = np.flatnonzero(np.greater_equal(flat['similarity'], threshold))
+    return flat['gt_ids'][flat['gt_det'][matches]], flat['tracker_ids'][flat['tracker_det'][matches]]
+
+
+@register_shared_product('soft_iou_matches')
+def _soft_iou_matches(data):
+    """ Returns the (gt_id, tracker_id, sim_iou) of each pair of dets with non-zero soft IoU, which is their similarity
+    normalised by the sum of the similarities of both dets to all dets in the timestep minus their own similarity."""
+    flat = get_shared_product(data, 'flat_similarity')
+    similarity, gt_det, tracker_det = flat['similarity'], flat['gt_det'], flat['tracker_det']
+    similarity_gt_sums = np.bincount(gt_det, weights=similarity, minlength=len(flat['gt_ids']))
+    similarity_tracker_sums = np.bincount(tracker_det, weights=similarity, minlength=len(flat['tracker_ids']))
+    sim_iou_denom = similarity_tracker_sums[tracker_det] + similarity_gt_sums[gt_det] - similarity
+    sim_iou = np.zeros_like(similarity)
+    sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+    sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+    matches = np.flatnonzero(sim_iou)
+    return flat['gt_ids'][gt_det[matches]], flat['tracker_ids'][tracker_det[matches]], sim_iou[matches]
+
+
+@register_shared_product('max_similarity_matches', per_timestep=True)
+def _max_similarity_matches(data, t):
+    """ Returns the (rows, cols) of the matches maximising the total similarity of a timestep, or None if it has no gt
+    dets or tracker dets."""
+    if len(data['gt_ids'][t]) == 0 or len(data['tracker_ids'][t]) == 0:
+        return None
+    return max_score_assignment(data['similarity_scores'][t])
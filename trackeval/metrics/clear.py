@@ -1,13 +1,27 @@
 
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_metric import _BaseMetric
+from ._shared_products import get_shared_product
 from .. import _timing
+from .. import utils
+from ..utils import TrackEvalException
 
 
 class CLEAR(_BaseMetric):
     """Class which implements the CLEAR metrics"""
-    def __init__(self):
+
+    @staticmethod
+    def get_default_metric_config():
+        """Default class config values"""
+        default_config = {
+            'THRESHOLD': 0.5,  # Similarity score threshold required for a TP match. Default 0.5. A list of thresholds
+            # evaluates all of them at once, with array fields holding the results of each threshold.
+            'PRINT_CONFIG': False,
+        }
+        return default_config
+
+    def __init__(self, config=None):
         super().__init__()
         main_integer_fields = ['CLR_TP', 'CLR_FN', 'CLR_FP', 'IDSW', 'MT', 'PT', 'ML', 'Frag']
         extra_integer_fields = ['CLR_Frames']
@@ -15,11 +29,23 @@ class CLEAR(_BaseMetric):
         main_float_fields = ['MOTA', 'MOTP', 'MODA', 'CLR_Re', 'CLR_Pr', 'MTR', 'PTR', 'MLR', 'sMOTA']
         extra_float_fields = ['CLR_F1', 'FP_per_frame', 'MOTAL', 'MOTP_sum']
         self.float_fields = main_float_fields + extra_float_fields
-        self.fields = self.float_fields + self.integer_fields
         self.summed_fields = self.integer_fields + ['MOTP_sum']
         self.summary_fields = main_float_fields + main_integer_fields
 
-        self.threshold = 0.5
+        self.config = utils.init_config(config, self.get_default_metric_config(), self.get_name())
+        self.threshold = self.config['THRESHOLD']
+        self.thresholds = np.atleast_1d(np.array(self.threshold, dtype=float))
+        if len(self.thresholds) == 0:
+            raise TrackEvalException('At least one THRESHOLD is required for CLEAR metrics.')
+        if np.ndim(self.threshold) > 0:
+            # All fields but the number of frames have a value for each threshold.
+            self.array_labels = self.thresholds
+            self.integer_array_fields = main_integer_fields
+            self.float_array_fields = self.float_fields
+            self.integer_fields = extra_integer_fields
+            self.float_fields = []
+        self.fields = self.float_fields + self.integer_fields + self.float_array_fields + self.integer_array_fields
+        self.shared_products = [('id_counts',)]
 
     @_timing.time
     def eval_sequence(self, data):
@@ -34,48 +60,123 @@ class CLEAR(_BaseMetric):
             res['CLR_FN'] = data['num_gt_dets']
             res['ML'] = data['num_gt_ids']
             res['MLR'] = 1.0
-            return res
+            return self._stack_array_fields([res] * len(self.thresholds))
         if data['num_gt_dets'] == 0:
             res['CLR_FP'] = data['num_tracker_dets']
             res['MLR'] = 1.0
-            return res
+            return self._stack_array_fields([res] * len(self.thresholds))
+
+        # Match the detections of each timestep, and then accumulate the statistics of the matches.
+        return self._accumulate_matches(data, self._match_timesteps(data))
+
+    @_timing.time
+    def eval_sequence_chunked(self, data, chunk_size, chunk_map=map):
+        """ Calculates CLEAR metrics for one sequence, with the detections of chunks of chunk_size timesteps matched
+        with chunk_map. Gives exactly the same results as eval_sequence.
+        """
+        if data['num_tracker_dets'] == 0 or data['num_gt_dets'] == 0:
+            return self.eval_sequence(data)
+        chunks = self._split_time_chunks(data, chunk_size)
+        chunk_matches = list(chunk_map(self._match_timesteps, chunks))
+
+        # Matching continues the tracks matched in the previous timestep, which each chunk after the first does not
+        # know at its start. Timesteps are matched again in order with the tracks of the previous chunk, until the
+        # matches agree with those of the chunk (for all thresholds). From then on the matches of the chunk are the same
+        # as when matching all timesteps in order.
+        prev_timestep_tracker_ids = [{} for _ in self.thresholds]
+        for chunk, matches in zip(chunks, chunk_matches):
+            for t, (gt_ids_t, tracker_ids_t, similarity) in enumerate(zip(chunk['gt_ids'], chunk['tracker_ids'],
+                                                                          chunk['similarity_scores'])):
+                if matches[t] is None:
+                    continue
+                rematched = self._match_timestep(gt_ids_t, tracker_ids_t, similarity, prev_timestep_tracker_ids)
+                if all(np.array_equal(r[0], m[0]) and np.array_equal(r[1], m[1])
+                       for r, m in zip(rematched, matches[t])):
+                    break
+                matches[t] = rematched
+                prev_timestep_tracker_ids = self._get_matched_tracker_ids(rematched)
+            chunk_last_matches = [m for m in matches if m is not None]
+            if chunk_last_matches:
+                prev_timestep_tracker_ids = self._get_matched_tracker_ids(chunk_last_matches[-1])
+
+        return self._accumulate_matches(data, [m for matches in chunk_matches for m in matches])
+
+    def _match_timesteps(self, data):
+        """Matches the detections of each timestep of data (a sequence or a chunk of it) in order. For each
+        timestep returns a list of (matched_gt_ids, matched_tracker_ids, motp_sum) for each threshold, or None if it
+        has no gt or tracker dets."""
+        timestep_matches = []
+        prev_timestep_tracker_ids = [{} for _ in self.thresholds]
+        for gt_ids_t, tracker_ids_t, similarity in zip(data['gt_ids'], data['tracker_ids'], data['similarity_scores']):
+            if len(gt_ids_t) == 0 or len(tracker_ids_t) == 0:
+                timestep_matches.append(None)
+                continue
+            matches = self._match_timestep(gt_ids_t, tracker_ids_t, similarity, prev_timestep_tracker_ids)
+            timestep_matches.append(matches)
+            prev_timestep_tracker_ids = self._get_matched_tracker_ids(matches)
+        return timestep_matches
+
+    def _match_timestep(self, gt_ids_t, tracker_ids_t, similarity, prev_timestep_tracker_ids):
+        """Matches the detections of one timestep for each threshold, given the tracker_id matched to each gt_id in
+        the previous timestep (with gt and tracker dets) as a dict for each threshold"""
+        matches = []
+        for threshold, prev_timestep_tracker_id in zip(self.thresholds, prev_timestep_tracker_ids):
+            # Calc score matrix to first minimise IDSWs from previous frame, and then maximise MOTP secondarily
+            prev_tracker_ids = np.array([prev_timestep_tracker_id.get(gt_id, np.nan) for gt_id in gt_ids_t.tolist()])
+            score_mat = (tracker_ids_t[np.newaxis, :] == prev_tracker_ids[:, np.newaxis])
+            score_mat = 1000 * score_mat + similarity
+            score_mat[similarity < threshold - np.finfo('float').eps] = 0
+
+            # Hungarian algorithm to find best matches
+            match_rows, match_cols = max_score_assignment(score_mat)
+            actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
+            match_rows = match_rows[actually_matched_mask]
+            match_cols = match_cols[actually_matched_mask]
+            motp_sum = sum(similarity[match_rows, match_cols]) if len(match_rows) > 0 else 0
+            matches.append((gt_ids_t[match_rows], tracker_ids_t[match_cols], motp_sum))
+        return matches
+
+    @staticmethod
+    def _get_matched_tracker_ids(matches):
+        """Returns the tracker_id matched to each gt_id as a dict for each threshold, from the matches of a timestep"""
+        return [dict(zip(matched_gt_ids.tolist(), matched_tracker_ids.tolist()))
+                for matched_gt_ids, matched_tracker_ids, _ in matches]
+
+    def _accumulate_matches(self, data, timestep_matches):
+        """Calculates CLEAR metrics for one sequence from the matches of each timestep, for each threshold"""
+        return self._stack_array_fields([
+            self._accumulate_threshold_matches(data, [None if matches is None else matches[i]
+                                                      for matches in timestep_matches])
+            for i in range(len(self.thresholds))])
+
+    def _accumulate_threshold_matches(self, data, timestep_matches):
+        """Calculates CLEAR metrics for one sequence from the matches of each timestep for one threshold"""
+        # Initialise results
+        res = {}
+        for field in self.fields:
+            res[field] = 0
 
         # Variables counting global association
         num_gt_ids = data['num_gt_ids']
-        gt_id_count = np.zeros(num_gt_ids)  # For MT/ML/PT
+        gt_id_count = get_shared_product(data, 'id_counts')[0].astype(float)  # For MT/ML/PT
         gt_matched_count = np.zeros(num_gt_ids)  # For MT/ML/PT
         gt_frag_count = np.zeros(num_gt_ids)  # For Frag
 
         # Note that IDSWs are counted based on the last time each gt_id was present (any number of frames previously),
         # but are only used in matching to continue current tracks based on the gt_id in the single previous timestep.
         prev_tracker_id = np.nan * np.zeros(num_gt_ids)  # For scoring IDSW
-        prev_timestep_tracker_id = np.nan * np.zeros(num_gt_ids)  # For matching IDSW
+        prev_timestep_tracker_id = np.nan * np.zeros(num_gt_ids)  # For Frag
 
         # Calculate scores for each timestep
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        for gt_ids_t, tracker_ids_t, matches in zip(data['gt_ids'], data['tracker_ids'], timestep_matches):
             # Deal with the case that there are no gt_det/tracker_det in a timestep.
             if len(gt_ids_t) == 0:
                 res['CLR_FP'] += len(tracker_ids_t)
                 continue
             if len(tracker_ids_t) == 0:
                 res['CLR_FN'] += len(gt_ids_t)
-                gt_id_count[gt_ids_t] += 1
                 continue
-
-            # Calc score matrix to first minimise IDSWs from previous frame, and then maximise MOTP secondarily
-            similarity = data['similarity_scores'][t]
-            score_mat = (tracker_ids_t[np.newaxis, :] == prev_timestep_tracker_id[gt_ids_t[:, np.newaxis]])
-            score_mat = 1000 * score_mat + similarity
-            score_mat[similarity < self.threshold - np.finfo('float').eps] = 0
-
-            # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
-            actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
-            match_rows = match_rows[actually_matched_mask]
-            match_cols = match_cols[actually_matched_mask]
-
-            matched_gt_ids = gt_ids_t[match_rows]
-            matched_tracker_ids = tracker_ids_t[match_cols]
+            matched_gt_ids, matched_tracker_ids, motp_sum = matches
 
             # Calc IDSW for MOTA
             prev_matched_tracker_ids = prev_tracker_id[matched_gt_ids]
@@ -84,7 +185,6 @@ class CLEAR(_BaseMetric):
             res['IDSW'] += np.sum(is_idsw)
 
             # Update counters for MT/ML/PT/Frag and record for IDSW/Frag for next timestep
-            gt_id_count[gt_ids_t] += 1
             gt_matched_count[matched_gt_ids] += 1
             not_previously_tracked = np.isnan(prev_timestep_tracker_id)
             prev_tracker_id[matched_gt_ids] = matched_tracker_ids
@@ -99,7 +199,7 @@ class CLEAR(_BaseMetric):
             res['CLR_FN'] += len(gt_ids_t) - num_matches
             res['CLR_FP'] += len(tracker_ids_t) - num_matches
             if num_matches > 0:
-                res['MOTP_sum'] += sum(similarity[match_rows, match_cols])
+                res['MOTP_sum'] += motp_sum
 
         # Calculate MT/ML/PT/Frag/MOTP
         tracked_ratio = gt_matched_count[gt_id_count > 0] / gt_id_count[gt_id_count > 0]
@@ -134,12 +234,13 @@ class CLEAR(_BaseMetric):
     def combine_classes_class_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the class values"""
         res = {}
-        for field in self.integer_fields:
+        # Classes either have gt or tracker dets for all thresholds or for none of them.
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(
-                {k: v for k, v in all_res.items() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0}, field)
-        for field in self.float_fields:
+                {k: v for k, v in all_res.items() if np.any(v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0)}, field)
+        for field in self.float_fields + self.float_array_fields:
             res[field] = np.mean(
-                [v[field] for v in all_res.values() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0], axis=0)
+                [v[field] for v in all_res.values() if np.any(v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0)], axis=0)
         return res
 
     @staticmethod
@@ -160,6 +261,6 @@ class CLEAR(_BaseMetric):
 
         res['CLR_F1'] = res['CLR_TP'] / np.maximum(1.0, res['CLR_TP'] + 0.5*res['CLR_FN'] + 0.5*res['CLR_FP'])
         res['FP_per_frame'] = res['CLR_FP'] / np.maximum(1.0, res['CLR_Frames'])
-        safe_log_idsw = np.log10(res['IDSW']) if res['IDSW'] > 0 else res['IDSW']
+        safe_log_idsw = np.log10(np.maximum(1, res['IDSW']))  # 0 for no IDSW
         res['MOTAL'] = (res['CLR_TP'] - res['CLR_FP'] - safe_log_idsw) / np.maximum(1.0, res['CLR_TP'] + res['CLR_FN'])
         return res
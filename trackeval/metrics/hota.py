@@ -1,8 +1,9 @@
 
 import os
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import max_score_assignment
 from ._base_metric import _BaseMetric
+from ._shared_products import get_shared_product
 from .. import _timing
 
 
@@ -19,6 +20,9 @@ class HOTA(_BaseMetric):
         self.float_fields = ['HOTA(0)', 'LocA(0)', 'HOTALocA(0)']
         self.fields = self.float_array_fields + self.integer_array_fields + self.float_fields
         self.summary_fields = self.float_array_fields + self.float_fields
+        # Above this number of (gt_id, tracker_id) pairs, the global alignment scores are stored sparsely.
+        self.sparse_id_pairs_threshold = 10 ** 7
+        self.shared_products = [('soft_iou_matches',), ('id_counts',)]
 
     @_timing.time
     def eval_sequence(self, data):
@@ -43,72 +47,197 @@ class HOTA(_BaseMetric):
             res['LocA(0)'] = 1.0
             return res
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros((data['num_gt_ids'], 1))
-        tracker_id_count = np.zeros((1, data['num_tracker_ids']))
-
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            # These are normalised, weighted by the match similarity.
-            similarity = data['similarity_scores'][t]
-            sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
-            sim_iou = np.zeros_like(similarity)
-            sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
-            sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
-            potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
-
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[0, tracker_ids_t] += 1
-
-        # Calculate overall jaccard alignment score (before unique matching) between IDs
-        global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count - potential_matches_count)
-        matches_counts = [np.zeros_like(potential_matches_count) for _ in self.array_labels]
-
-        # Calculate scores for each timestep
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Deal with the case that there are no gt_det/tracker_det in a timestep.
-            if len(gt_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FP'][a] += len(tracker_ids_t)
-                continue
-            if len(tracker_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FN'][a] += len(gt_ids_t)
+        # First loop through each timestep and accumulate global track information, and calculate the overall jaccard
+        # alignment score (before unique matching) between IDs.
+        global_alignment_score, gt_id_count, tracker_id_count = self._calculate_global_alignment(
+            data, [self._count_potential_matches(data)])
+
+        # Match the dets of each timestep. The matches of all timesteps are collected, and the scores for all alpha
+        # values are then calculated at once.
+        match_similarities, matched_gt_ids, matched_tracker_ids = self._match_chunk((data, global_alignment_score))
+        return self._compute_alpha_fields(data, match_similarities, matched_gt_ids, matched_tracker_ids, gt_id_count,
+                                          tracker_id_count)
+
+    @_timing.time
+    def eval_sequence_chunked(self, data, chunk_size, chunk_map=map):
+        """ Calculates the HOTA metrics for one sequence, with both passes over the timesteps run on chunks of
+        chunk_size timesteps which are evaluated with chunk_map. The chunk results are reduced in time order, so that
+        the results are exactly the same as those of eval_sequence.
+        """
+        if data['num_tracker_dets'] == 0 or data['num_gt_dets'] == 0:
+            return self.eval_sequence(data)
+        chunks = self._split_time_chunks(data, chunk_size)
+
+        # First pass: accumulate global track information over the chunks.
+        global_alignment_score, gt_id_count, tracker_id_count = self._calculate_global_alignment(
+            data, chunk_map(self._count_potential_matches, chunks))
+
+        # Second pass: match the detections of each chunk. Each chunk only receives the alignment scores of its ids.
+        pair_ids, pair_scores = self._to_sparse_alignment(global_alignment_score)
+        chunk_args = []
+        for chunk in chunks:
+            chunk_pairs = (np.isin(pair_ids // data['num_tracker_ids'], np.concatenate(chunk['gt_ids']))
+                           & np.isin(pair_ids % data['num_tracker_ids'], np.concatenate(chunk['tracker_ids'])))
+            chunk_args.append((chunk, (pair_ids[chunk_pairs], pair_scores[chunk_pairs], data['num_tracker_ids'])))
+        match_similarities, matched_gt_ids, matched_tracker_ids = [], [], []
+        for chunk_match_similarities, chunk_matched_gt_ids, chunk_matched_tracker_ids in chunk_map(
+                self._match_chunk, chunk_args):
+            match_similarities += chunk_match_similarities
+            matched_gt_ids += chunk_matched_gt_ids
+            matched_tracker_ids += chunk_matched_tracker_ids
+
+        return self._compute_alpha_fields(data, match_similarities, matched_gt_ids, matched_tracker_ids, gt_id_count,
+                                          tracker_id_count)
+
+    @staticmethod
+    def _count_potential_matches(chunk):
+        """ First pass over the timesteps of a sequence (or a chunk of it). Returns the (gt_id, tracker_id, sim_iou)
+        of each potential match in time order, and the number of dets of each gt_id and tracker_id.
+        The potential matches are the pairs of dets with non-zero soft IoU, normalised and weighted by their
+        similarity. These are calculated for all timesteps at once (see _shared_products)."""
+        gt_ids, tracker_ids, sim_ious = get_shared_product(chunk, 'soft_iou_matches')
+        gt_id_count, tracker_id_count = get_shared_product(chunk, 'id_counts')
+        return gt_ids, tracker_ids, sim_ious, gt_id_count, tracker_id_count
+
+    def _calculate_global_alignment(self, data, potential_matches):
+        """ Reduces the potential matches of the chunks of a sequence (see _count_potential_matches, in time order) to
+        the global alignment score between ids, and the number of dets of each gt_id and tracker_id.
+        The alignment score is a dense (num_gt_ids x num_tracker_ids) matrix, unless there are more id pairs than
+        sparse_id_pairs_threshold. It is then only stored for the id pairs with potential matches (see
+        _to_sparse_alignment), so that memory grows with the number of co-occurring id pairs instead.
+        """
+        num_gt_ids, num_tracker_ids = data['num_gt_ids'], data['num_tracker_ids']
+        gt_id_count = np.zeros((num_gt_ids, 1))
+        tracker_id_count = np.zeros((1, num_tracker_ids))
+        gt_ids, tracker_ids, sim_ious = [], [], []
+        for chunk_gt_ids, chunk_tracker_ids, chunk_sim_ious, chunk_gt_id_count, chunk_tracker_id_count in \
+                potential_matches:
+            gt_ids.append(chunk_gt_ids)
+            tracker_ids.append(chunk_tracker_ids)
+            sim_ious.append(chunk_sim_ious)
+            gt_id_count[:len(chunk_gt_id_count), 0] += chunk_gt_id_count
+            tracker_id_count[0, :len(chunk_tracker_id_count)] += chunk_tracker_id_count
+        gt_ids, tracker_ids, sim_ious = np.concatenate(gt_ids), np.concatenate(tracker_ids), np.concatenate(sim_ious)
+
+        # np.add.at adds in order, so that the counts are the same as when accumulated timestep by timestep.
+        if num_gt_ids * num_tracker_ids <= self.sparse_id_pairs_threshold:
+            potential_matches_count = np.zeros((num_gt_ids, num_tracker_ids))
+            np.add.at(potential_matches_count, (gt_ids, tracker_ids), sim_ious)
+            global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count
+                                                                - potential_matches_count)
+            return global_alignment_score, gt_id_count, tracker_id_count
+        pair_ids, pair_idx = np.unique(gt_ids * num_tracker_ids + tracker_ids, return_inverse=True)
+        potential_matches_count = np.zeros(len(pair_ids))
+        np.add.at(potential_matches_count, pair_idx, sim_ious)
+        pair_gt_ids, pair_tracker_ids = pair_ids // num_tracker_ids, pair_ids % num_tracker_ids
+        pair_scores = potential_matches_count / (gt_id_count[pair_gt_ids, 0] + tracker_id_count[0, pair_tracker_ids]
+                                                 - potential_matches_count)
+        return (pair_ids, pair_scores, num_tracker_ids), gt_id_count, tracker_id_count
+
+    @staticmethod
+    def _to_sparse_alignment(global_alignment_score):
+        """ Returns the sorted ids (gt_id * num_tracker_ids + tracker_id) and alignment scores of the id pairs with
+        non-zero alignment score, given a dense or sparse global alignment score."""
+        if not isinstance(global_alignment_score, np.ndarray):
+            return global_alignment_score[:2]
+        pair_ids = np.flatnonzero(global_alignment_score)
+        return pair_ids, global_alignment_score.ravel()[pair_ids]
+
+    @staticmethod
+    def _get_alignment_scores(global_alignment_score, gt_ids_t, tracker_ids_t):
+        """Returns the global alignment scores between the gt_ids and tracker_ids of a timestep"""
+        if isinstance(global_alignment_score, np.ndarray):
+            return global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]]
+        pair_ids, pair_scores, num_tracker_ids = global_alignment_score
+        if len(pair_ids) == 0:
+            return np.zeros((len(gt_ids_t), len(tracker_ids_t)))
+        ids_t = (gt_ids_t.astype(np.int64)[:, np.newaxis] * num_tracker_ids
+                 + tracker_ids_t.astype(np.int64)[np.newaxis, :])
+        idx = np.minimum(np.searchsorted(pair_ids, ids_t), len(pair_ids) - 1)
+        return np.where(pair_ids[idx] == ids_t, pair_scores[idx], 0)
+
+    @staticmethod
+    def _match_chunk(chunk_args):
+        """ Second pass over the timesteps of a sequence (or a chunk of it), given the global alignment scores (dense,
+        or sparse for at least the id pairs of the chunk). Returns the similarity and ids of the matches of each
+        timestep."""
+        chunk, global_alignment_score = chunk_args
+        match_similarities, matched_gt_ids, matched_tracker_ids = [], [], []
+        for gt_ids_t, tracker_ids_t, similarity in zip(chunk['gt_ids'], chunk['tracker_ids'],
+                                                        chunk['similarity_scores']):
+            # Timesteps without gt_dets or tracker_dets have no matches.
+            if len(gt_ids_t) == 0 or len(tracker_ids_t) == 0:
                 continue
 
             # Get matching scores between pairs of dets for optimizing HOTA
-            similarity = data['similarity_scores'][t]
-            score_mat = global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] * similarity
+            score_mat = HOTA._get_alignment_scores(global_alignment_score, gt_ids_t, tracker_ids_t) * similarity
 
             # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
-
-            # Calculate and accumulate basic statistics
-            for a, alpha in enumerate(self.array_labels):
-                actually_matched_mask = similarity[match_rows, match_cols] >= alpha - np.finfo('float').eps
-                alpha_match_rows = match_rows[actually_matched_mask]
-                alpha_match_cols = match_cols[actually_matched_mask]
-                num_matches = len(alpha_match_rows)
-                res['HOTA_TP'][a] += num_matches
-                res['HOTA_FN'][a] += len(gt_ids_t) - num_matches
-                res['HOTA_FP'][a] += len(tracker_ids_t) - num_matches
-                if num_matches > 0:
-                    res['LocA'][a] += sum(similarity[alpha_match_rows, alpha_match_cols])
-                    matches_counts[a][gt_ids_t[alpha_match_rows], tracker_ids_t[alpha_match_cols]] += 1
+            match_rows, match_cols = max_score_assignment(score_mat)
+            match_similarities.append(similarity[match_rows, match_cols])
+            matched_gt_ids.append(gt_ids_t[match_rows])
+            matched_tracker_ids.append(tracker_ids_t[match_cols])
+        return match_similarities, matched_gt_ids, matched_tracker_ids
+
+    def _compute_alpha_fields(self, data, match_similarities, matched_gt_ids, matched_tracker_ids, gt_id_count,
+                              tracker_id_count):
+        """ Calculates the HOTA scores of a sequence for all alpha values at once, from the similarity and ids of the
+        matches of all timesteps (as lists of arrays, in time order).
+        A match counts for the alpha values up to its similarity. The similarity of a match therefore gives the number
+        of alpha values for which it counts (its level), and sorting the matches by similarity gives the matches of
+        each alpha value as a prefix.
+        """
+        num_alphas = len(self.array_labels)
+        match_similarities = np.concatenate([np.zeros(0)] + list(match_similarities))
+        matched_gt_ids = np.concatenate([np.zeros(0, dtype=np.int64)] + list(matched_gt_ids)).astype(np.int64)
+        matched_tracker_ids = np.concatenate([np.zeros(0, dtype=np.int64)] + list(matched_tracker_ids)).astype(np.int64)
+        match_levels = self._get_match_levels(match_similarities)
+
+        # Count the matches of each gt_id/tracker_id combo for each alpha value.
+        num_tracker_ids = data['num_tracker_ids']
+        pairs, pair_idx = np.unique(matched_gt_ids * num_tracker_ids + matched_tracker_ids, return_inverse=True)
+        pair_level_counts = np.bincount(pair_idx * (num_alphas + 1) + match_levels,
+                                        minlength=len(pairs) * (num_alphas + 1)).reshape(len(pairs), num_alphas + 1)
+        matches_count = np.cumsum(pair_level_counts[:, ::-1], axis=1)[:, ::-1][:, 1:].astype(np.float)
+
+        # The matches of each alpha value are those with the largest similarities.
+        similarity_sums = np.concatenate(([0], np.cumsum(np.sort(match_similarities)[::-1])))
+        similarity_sums = similarity_sums[matches_count.sum(axis=0).astype(np.int64)]
+        return self._compute_pair_count_fields(data, pairs // num_tracker_ids, pairs % num_tracker_ids, matches_count,
+                                               similarity_sums, gt_id_count, tracker_id_count)
+
+    def _get_match_levels(self, match_similarities):
+        """Returns the number of alpha values for which each match counts, given the similarity of the matches"""
+        return np.searchsorted(self.array_labels - np.finfo('float').eps, match_similarities, side='right')
+
+    def _compute_pair_count_fields(self, data, pair_gt_ids, pair_tracker_ids, matches_count, similarity_sums,
+                                   gt_id_count, tracker_id_count):
+        """ Calculates the HOTA scores of a sequence for all alpha values, from the number of matches of each matched
+        gt_id/tracker_id combo (a num_pairs x num_alphas array) and the sum of the similarities of the matches of each
+        alpha value. Only the number of gt and tracker dets are used from data.
+        """
+        res = {}
+        for field in self.float_array_fields + self.integer_array_fields:
+            res[field] = np.zeros((len(self.array_labels)), dtype=np.float)
+        for field in self.float_fields:
+            res[field] = 0
+
+        # Calculate and accumulate basic statistics
+        res['HOTA_TP'] = matches_count.sum(axis=0)
+        res['HOTA_FN'] = data['num_gt_dets'] - res['HOTA_TP']
+        res['HOTA_FP'] = data['num_tracker_dets'] - res['HOTA_TP']
+        res['LocA'] = similarity_sums
 
         # Calculate association scores (AssA, AssRe, AssPr) for the alpha value.
         # First calculate scores per gt_id/tracker_id combo and then average over the number of detections.
-        for a, alpha in enumerate(self.array_labels):
-            matches_count = matches_counts[a]
-            ass_a = matches_count / np.maximum(1, gt_id_count + tracker_id_count - matches_count)
-            res['AssA'][a] = np.sum(matches_count * ass_a) / np.maximum(1, res['HOTA_TP'][a])
-            ass_re = matches_count / np.maximum(1, gt_id_count)
-            res['AssRe'][a] = np.sum(matches_count * ass_re) / np.maximum(1, res['HOTA_TP'][a])
-            ass_pr = matches_count / np.maximum(1, tracker_id_count)
-            res['AssPr'][a] = np.sum(matches_count * ass_pr) / np.maximum(1, res['HOTA_TP'][a])
+        pair_gt_id_count = gt_id_count.ravel()[pair_gt_ids][:, np.newaxis]
+        pair_tracker_id_count = tracker_id_count.ravel()[pair_tracker_ids][:, np.newaxis]
+        ass_a = matches_count / np.maximum(1, pair_gt_id_count + pair_tracker_id_count - matches_count)
+        res['AssA'] = np.sum(matches_count * ass_a, axis=0) / np.maximum(1, res['HOTA_TP'])
+        ass_re = matches_count / np.maximum(1, pair_gt_id_count)
+        res['AssRe'] = np.sum(matches_count * ass_re, axis=0) / np.maximum(1, res['HOTA_TP'])
+        ass_pr = matches_count / np.maximum(1, pair_tracker_id_count)
+        res['AssPr'] = np.sum(matches_count * ass_pr, axis=0) / np.maximum(1, res['HOTA_TP'])
 
         # Calculate final scores
         res['LocA'] = np.maximum(1e-10, res['LocA']) / np.maximum(1e-10, res['HOTA_TP'])
@@ -1,20 +1,44 @@
 
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import sparse_max_score_assignment
 from ._base_metric import _BaseMetric
+from ._shared_products import count_pairs, get_shared_product
 from .. import _timing
+from .. import utils
+from ..utils import TrackEvalException
 
 
 class Identity(_BaseMetric):
     """Class which implements the ID metrics"""
-    def __init__(self):
+
+    @staticmethod
+    def get_default_metric_config():
+        """Default class config values"""
+        default_config = {
+            'THRESHOLD': 0.5,  # Similarity score threshold required for a potential match. Default 0.5. A list of
+            # thresholds evaluates all of them at once, with array fields holding the results of each threshold.
+            'PRINT_CONFIG': False,
+        }
+        return default_config
+
+    def __init__(self, config=None):
         super().__init__()
         self.integer_fields = ['IDTP', 'IDFN', 'IDFP']
         self.float_fields = ['IDF1', 'IDR', 'IDP']
-        self.fields = self.float_fields + self.integer_fields
-        self.summary_fields = self.fields
 
-        self.threshold = 0.5
+        self.config = utils.init_config(config, self.get_default_metric_config(), self.get_name())
+        self.threshold = self.config['THRESHOLD']
+        self.thresholds = np.atleast_1d(np.array(self.threshold, dtype=float))
+        if len(self.thresholds) == 0:
+            raise TrackEvalException('At least one THRESHOLD is required for Identity metrics.')
+        if np.ndim(self.threshold) > 0:
+            self.array_labels = self.thresholds
+            self.integer_array_fields, self.integer_fields = self.integer_fields, []
+            self.float_array_fields, self.float_fields = self.float_fields, []
+        self.fields = self.float_fields + self.integer_fields + self.float_array_fields + self.integer_array_fields
+        self.summary_fields = self.fields
+        self.shared_products = [('threshold_matches', threshold) for threshold in self.thresholds.tolist()] + [
+            ('id_counts',)]
 
     @_timing.time
     def eval_sequence(self, data):
@@ -27,50 +51,70 @@ class Identity(_BaseMetric):
         # Return result quickly if tracker or gt sequence is empty
         if data['num_tracker_dets'] == 0:
             res['IDFN'] = data['num_gt_dets']
-            return res
+            return self._stack_array_fields([res] * len(self.thresholds))
         if data['num_gt_dets'] == 0:
             res['IDFP'] = data['num_tracker_dets']
-            return res
+            return self._stack_array_fields([res] * len(self.thresholds))
+
+        # Count the potential matches between ids (the number of timesteps in which their dets overlap by at least the
+        # threshold), and the total number of dets for each gt_id and tracker_id.
+        return self._compute_threshold_id_scores(data, [self._count_potential_matches(data)])
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
+    @_timing.time
+    def eval_sequence_chunked(self, data, chunk_size, chunk_map=map):
+        """ Calculates ID metrics for one sequence, with the global track information accumulated over chunks of
+        chunk_size timesteps with chunk_map. Gives exactly the same results as eval_sequence.
+        """
+        if data['num_tracker_dets'] == 0 or data['num_gt_dets'] == 0:
+            return self.eval_sequence(data)
+        potential_matches = chunk_map(self._count_potential_matches, self._split_time_chunks(data, chunk_size))
+        return self._compute_threshold_id_scores(data, potential_matches)
+
+    def _count_potential_matches(self, chunk):
+        """Returns the (gt_ids, tracker_ids) of the potential matches in a sequence (or a chunk of timesteps) for each
+        threshold, and the number of dets of each gt_id and tracker_id"""
+        threshold_matches = [get_shared_product(chunk, 'threshold_matches', threshold)
+                             for threshold in self.thresholds.tolist()]
+        gt_id_count, tracker_id_count = get_shared_product(chunk, 'id_counts')
+        return threshold_matches, gt_id_count, tracker_id_count
+
+    def _compute_threshold_id_scores(self, data, potential_matches):
+        """Calculates ID metrics for one sequence for each threshold, from the potential matches and det counts of
+        the chunks of the sequence (see _count_potential_matches)"""
+        potential_matches = list(potential_matches)
         gt_id_count = np.zeros(data['num_gt_ids'])
         tracker_id_count = np.zeros(data['num_tracker_ids'])
+        for _, chunk_gt_id_count, chunk_tracker_id_count in potential_matches:
+            gt_id_count[:len(chunk_gt_id_count)] += chunk_gt_id_count
+            tracker_id_count[:len(chunk_tracker_id_count)] += chunk_tracker_id_count
+
+        threshold_res = []
+        for i in range(len(self.thresholds)):
+            gt_ids, tracker_ids, potential_matches_count = count_pairs(
+                *(np.concatenate(values) for values in zip(*(matches[i] for matches, _, _ in potential_matches))))
+            threshold_res.append(self._compute_id_scores(gt_ids, tracker_ids, potential_matches_count, gt_id_count,
+                                                         tracker_id_count))
+        return self._stack_array_fields(threshold_res)
+
+    def _compute_id_scores(self, gt_ids, tracker_ids, potential_matches_count, gt_id_count, tracker_id_count):
+        """Calculates ID metrics for one sequence from its global track information, given the number of potential
+        matches of each (gt_id, tracker_id) pair with at least one potential match"""
+        res = {}
+        for field in self.fields:
+            res[field] = 0
 
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            matches_mask = np.greater_equal(data['similarity_scores'][t], self.threshold)
-            match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
-            potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
-
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[tracker_ids_t] += 1
-
-        # Calculate optimal assignment cost matrix for ID metrics
-        num_gt_ids = data['num_gt_ids']
-        num_tracker_ids = data['num_tracker_ids']
-        fp_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
-        fn_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
-        fp_mat[num_gt_ids:, :num_tracker_ids] = 1e10
-        fn_mat[:num_gt_ids, num_tracker_ids:] = 1e10
-        for gt_id in range(num_gt_ids):
-            fn_mat[gt_id, :num_tracker_ids] = gt_id_count[gt_id]
-            fn_mat[gt_id, num_tracker_ids + gt_id] = gt_id_count[gt_id]
-        for tracker_id in range(num_tracker_ids):
-            fp_mat[:num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-            fp_mat[tracker_id + num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-        fn_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
-        fp_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
-
-        # Hungarian algorithm
-        match_rows, match_cols = linear_sum_assignment(fn_mat + fp_mat)
+        # The ID metrics match each gt_id to at most one tracker_id so that IDFN + IDFP is minimal. Matching a gt_id to
+        # a tracker_id gives IDFNs for the dets of the gt_id and IDFPs for the dets of the tracker_id which are not
+        # potential matches of the pair. Unmatched ids give IDFNs or IDFPs for all their dets. IDFN + IDFP is therefore
+        # the total number of dets minus twice the number of potential matches of the matched pairs, which is minimal
+        # for the matching maximising the number of potential matches (IDTP). Only this maximum is used, so that which
+        # of several optimal matchings is found does not matter, and pairs without potential matches are left out.
+        matches = sparse_max_score_assignment(gt_ids, tracker_ids, potential_matches_count)
 
         # Accumulate basic statistics
-        res['IDFN'] = fn_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDFP'] = fp_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDTP'] = (gt_id_count.sum() - res['IDFN']).astype(np.int)
+        res['IDTP'] = potential_matches_count[matches].sum().astype(np.int)
+        res['IDFN'] = (gt_id_count.sum() - res['IDTP']).astype(np.int)
+        res['IDFP'] = (tracker_id_count.sum() - res['IDTP']).astype(np.int)
 
         # Calculate final ID scores
         res = self._compute_final_fields(res)
@@ -79,18 +123,20 @@ class Identity(_BaseMetric):
     def combine_classes_class_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the class values"""
         res = {}
-        for field in self.integer_fields:
+        # Classes either have gt or tracker dets for all thresholds or for none of them.
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum({k: v for k, v in all_res.items()
-                                            if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps}, field)
-        for field in self.float_fields:
+                                            if np.any(v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps)},
+                                           field)
+        for field in self.float_fields + self.float_array_fields:
             res[field] = np.mean([v[field] for v in all_res.values()
-                                  if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps], axis=0)
+                                  if np.any(v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps)], axis=0)
         return res
 
     def combine_classes_det_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the detection values"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -98,7 +144,7 @@ class Identity(_BaseMetric):
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -70,10 +70,7 @@ class JAndF(_BaseMetric):
 
         # perform matching
         if self.optim_type == 'J&F':
-            f = np.zeros_like(j)
-            for k in range(num_tracker_ids):
-                for i in range(num_gt_ids):
-                    f[k, i, :] = self._compute_f(gt_dets, tracker_dets, k, i, bound_th)
+            f = self._compute_f(gt_dets, tracker_dets, range(num_tracker_ids), range(num_gt_ids), bound_th)
             optim_metrics = (np.mean(j, axis=2) + np.mean(f, axis=2)) / 2
             row_ind, col_ind = linear_sum_assignment(- optim_metrics)
             j_m = j[row_ind, col_ind, :]
@@ -82,9 +79,7 @@ class JAndF(_BaseMetric):
             optim_metrics = np.mean(j, axis=2)
             row_ind, col_ind = linear_sum_assignment(- optim_metrics)
             j_m = j[row_ind, col_ind, :]
-            f_m = np.zeros_like(j_m)
-            for i, (tr_ind, gt_ind) in enumerate(zip(row_ind, col_ind)):
-                f_m[i] = self._compute_f(gt_dets, tracker_dets, tr_ind, gt_ind, bound_th)
+            f_m = self._compute_f(gt_dets, tracker_dets, row_ind, col_ind, bound_th, paired=True)
         else:
             raise TrackEvalException('Unsupported optimization type %s for J&F metric.' % self.optim_type)
 
@@ -202,16 +197,20 @@ class JAndF(_BaseMetric):
         return bmap
 
     @staticmethod
-    def _compute_f(gt_data, tracker_data, tracker_data_id, gt_id, bound_th):
+    def _compute_f(gt_data, tracker_data, tracker_data_ids, gt_ids, bound_th, paired=False):
         """
-        Perform F computation for a given gt and a given tracker ID. Adapted from
-        https://github.com/davisvideochallenge/davis2017-evaluation
+        Perform F computation for all pairs of the given tracker IDs and gt IDs, or if paired only for the pairs
+        (tracker_data_ids[k], gt_ids[k]). The masks of each timestep are decoded together, and the boundary and dilated
+        boundary of each mask are computed once and used for all its pairs.
+        Adapted from https://github.com/davisvideochallenge/davis2017-evaluation
         :param gt_data: the encoded gt masks
         :param tracker_data: the encoded tracker masks
-        :param tracker_data_id: the tracker ID
-        :param gt_id: the ground truth ID
+        :param tracker_data_ids: the tracker IDs
+        :param gt_ids: the ground truth IDs
         :param bound_th: boundary threshold parameter
-        :return: the F value for the given tracker and gt ID
+        :param paired: whether to compute F only for the pairs of the k-th tracker ID and the k-th gt ID
+        :return: the F values for each pair of the given tracker and gt IDs (num tracker IDs x num gt IDs x num
+                 timesteps), or if paired for each of the given pairs (num pairs x num timesteps)
         """
 
         # Only loaded when run to reduce minimum requirements
@@ -219,53 +218,64 @@ class JAndF(_BaseMetric):
         from skimage.morphology import disk
         import cv2
 
-        f = np.zeros(len(gt_data))
-
-        for t, (gt_masks, tracker_masks) in enumerate(zip(gt_data, tracker_data)):
-            curr_tracker_mask = mask_utils.decode(tracker_masks[tracker_data_id])
-            curr_gt_mask = mask_utils.decode(gt_masks[gt_id])
-            
-            bound_pix = bound_th if bound_th >= 1 - np.finfo('float').eps else \
-                np.ceil(bound_th * np.linalg.norm(curr_tracker_mask.shape))
-
-            # Get the pixel boundaries of both masks
-            fg_boundary = JAndF._seg2bmap(curr_tracker_mask)
-            gt_boundary = JAndF._seg2bmap(curr_gt_mask)
+        tracker_data_ids, gt_ids = list(tracker_data_ids), list(gt_ids)
+        num_tracker_masks = len(tracker_data_ids)
+        if paired:
+            if len(gt_ids) != num_tracker_masks:
+                raise TrackEvalException('Paired F computation needs the same number of tracker IDs and gt IDs.')
+            f = np.zeros((num_tracker_masks, len(gt_data)))
+        else:
+            f = np.zeros((num_tracker_masks, len(gt_ids), len(gt_data)))
+        if num_tracker_masks == 0 or len(gt_ids) == 0:
+            return f
 
-            # fg_dil = binary_dilation(fg_boundary, disk(bound_pix))
-            fg_dil = cv2.dilate(fg_boundary.astype(np.uint8), disk(bound_pix).astype(np.uint8))
-            # gt_dil = binary_dilation(gt_boundary, disk(bound_pix))
-            gt_dil = cv2.dilate(gt_boundary.astype(np.uint8), disk(bound_pix).astype(np.uint8))
+        # dilation kernels for each frame shape
+        kernels = {}
 
-            # Get the intersection
-            gt_match = gt_boundary * fg_dil
-            fg_match = fg_boundary * gt_dil
+        for t, (gt_masks, tracker_masks) in enumerate(zip(gt_data, tracker_data)):
+            masks = mask_utils.decode([tracker_masks[k] for k in tracker_data_ids] + [gt_masks[i] for i in gt_ids])
+            frame_shape = masks.shape[:2]
+            if frame_shape not in kernels:
+                bound_pix = bound_th if bound_th >= 1 - np.finfo('float').eps else \
+                    np.ceil(bound_th * np.linalg.norm(frame_shape))
+                kernels[frame_shape] = disk(bound_pix).astype(np.uint8)
+
+            # Get the pixel boundaries of all masks, and dilate them
+            boundaries = [JAndF._seg2bmap(masks[:, :, n]) for n in range(masks.shape[2])]
+            dilated = np.array([cv2.dilate(boundary.astype(np.uint8), kernels[frame_shape]).ravel()
+                                for boundary in boundaries])
+            boundary_pixels = [np.flatnonzero(boundary) for boundary in boundaries]
+            n_boundary = np.array([len(pixels) for pixels in boundary_pixels])
+
+            if paired:
+                # Area of the intersection of the boundary of each mask with the dilated boundary of the other mask of
+                # its pair
+                fg_match = np.array([dilated[num_tracker_masks + k, boundary_pixels[k]].sum()
+                                     for k in range(num_tracker_masks)])
+                gt_match = np.array([dilated[k, boundary_pixels[num_tracker_masks + k]].sum()
+                                     for k in range(num_tracker_masks)])
+
+                # Area of the boundaries
+                n_fg = n_boundary[:num_tracker_masks]
+                n_gt = n_boundary[num_tracker_masks:]
+            else:
+                # Area of the intersection of the boundary of each mask with the dilated boundaries of the other masks
+                fg_match = np.array([dilated[num_tracker_masks:, pixels].sum(axis=1)
+                                     for pixels in boundary_pixels[:num_tracker_masks]])
+                gt_match = np.array([dilated[:num_tracker_masks, pixels].sum(axis=1)
+                                     for pixels in boundary_pixels[num_tracker_masks:]]).T
 
-            # Area of the intersection
-            n_fg = np.sum(fg_boundary)
-            n_gt = np.sum(gt_boundary)
+                # Area of the boundaries
+                n_fg = n_boundary[:num_tracker_masks, np.newaxis]
+                n_gt = n_boundary[np.newaxis, num_tracker_masks:]
 
             # % Compute precision and recall
-            if n_fg == 0 and n_gt > 0:
-                precision = 1
-                recall = 0
-            elif n_fg > 0 and n_gt == 0:
-                precision = 0
-                recall = 1
-            elif n_fg == 0 and n_gt == 0:
-                precision = 1
-                recall = 1
-            else:
-                precision = np.sum(fg_match) / float(n_fg)
-                recall = np.sum(gt_match) / float(n_gt)
-
-            # Compute F measure
-            if precision + recall == 0:
-                f_val = 0
-            else:
-                f_val = 2 * precision * recall / (precision + recall)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                precision = np.where(n_fg == 0, 1, np.where(n_gt == 0, 0, fg_match / n_fg))
+                recall = np.where(n_gt == 0, 1, np.where(n_fg == 0, 0, gt_match / n_gt))
 
-            f[t] = f_val
+                # Compute F measure
+                f[..., t] = np.where(precision + recall == 0, 0, 2 * precision * recall / (precision + recall))
 
         return f
 
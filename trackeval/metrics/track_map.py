@@ -1,7 +1,6 @@
 import numpy as np
 from ._base_metric import _BaseMetric
 from .. import _timing
-from functools import partial
 from .. import utils
 from ..utils import TrackEvalException
 
@@ -93,59 +92,31 @@ class TrackMAP(_BaseMetric):
         ious = self._compute_track_ious(data['dt_tracks'], data['gt_tracks'], iou_function=data['iou_type'],
                                         boxformat=boxformat)
 
+        # Sort gt ignore last, for each ignore mask
+        gt_idx_masks, gt_ids_masks, gt_ig_arrays = [], [], []
         for mask_idx in range(self.num_ig_masks):
             gt_ig_mask = gt_ig_masks[mask_idx]
-
-            # Sort gt ignore last
             gt_idx = np.argsort([g for g in gt_ig_mask], kind="mergesort")
             gt_ids = [gt_ids[i] for i in gt_idx]
+            gt_idx_masks.append(gt_idx)
+            gt_ids_masks.append(gt_ids)
+            gt_ig_arrays.append(np.array([gt_ig_mask[idx] for idx in gt_idx]))
+
+        num_thrs = len(self.array_labels)
+        num_gt = len(gt_ids)
+        num_dt = len(dt_ids)
 
-            ious_sorted = ious[:, gt_idx] if len(ious) > 0 else ious
-
-            num_thrs = len(self.array_labels)
-            num_gt = len(gt_ids)
-            num_dt = len(dt_ids)
-
-            # Array to store the "id" of the matched dt/gt
-            gt_m = np.zeros((num_thrs, num_gt)) - 1
-            dt_m = np.zeros((num_thrs, num_dt)) - 1
-
-            gt_ig = np.array([gt_ig_mask[idx] for idx in gt_idx])
-            dt_ig = np.zeros((num_thrs, num_dt))
-
-            for iou_thr_idx, iou_thr in enumerate(self.array_labels):
-                if len(ious_sorted) == 0:
-                    break
-
-                for dt_idx, _dt in enumerate(dt_ids):
-                    iou = min([iou_thr, 1 - 1e-10])
-                    # information about best match so far (m=-1 -> unmatched)
-                    # store the gt_idx which matched for _dt
-                    m = -1
-                    for gt_idx, _ in enumerate(gt_ids):
-                        # if this gt already matched continue
-                        if gt_m[iou_thr_idx, gt_idx] > 0:
-                            continue
-                        # if _dt matched to reg gt, and on ignore gt, stop
-                        if m > -1 and gt_ig[m] == 0 and gt_ig[gt_idx] == 1:
-                            break
-                        # continue to next gt unless better match made
-                        if ious_sorted[dt_idx, gt_idx] < iou - np.finfo('float').eps:
-                            continue
-                        # if match successful and best so far, store appropriately
-                        iou = ious_sorted[dt_idx, gt_idx]
-                        m = gt_idx
-
-                    # No match found for _dt, go to next _dt
-                    if m == -1:
-                        continue
-
-                    # if gt to ignore for some reason update dt_ig.
-                    # Should not be used in evaluation.
-                    dt_ig[iou_thr_idx, dt_idx] = gt_ig[m]
-                    # _dt match found, update gt_m, and dt_m with "id"
-                    dt_m[iou_thr_idx, dt_idx] = gt_ids[m]
-                    gt_m[iou_thr_idx, m] = _dt
+        # Match all IoU thresholds and ignore masks at once
+        dt_m_masks, gt_m_masks, dt_ig_masks_matched = self._match_tracks(
+            ious, dt_ids, np.array(gt_idx_masks, dtype=int).reshape(self.num_ig_masks, num_gt),
+            np.array(gt_ids_masks).reshape(self.num_ig_masks, num_gt), gt_ig_arrays)
+
+        for mask_idx in range(self.num_ig_masks):
+            gt_ids = gt_ids_masks[mask_idx]
+            gt_ig = gt_ig_arrays[mask_idx]
+            dt_m = dt_m_masks[mask_idx]
+            gt_m = gt_m_masks[mask_idx]
+            dt_ig = dt_ig_masks_matched[mask_idx]
 
             dt_ig_mask = dt_ig_masks[mask_idx]
 
@@ -167,6 +138,93 @@ class TrackMAP(_BaseMetric):
 
         return res
 
+    def _match_tracks(self, ious, dt_ids, gt_idx_masks, gt_ids_masks, gt_ig_arrays):
+        """
+        Greedily matches the detected tracks (in order) to the ground truth tracks, for all IoU thresholds and ignore
+        masks at once. Each detected track is matched to the best unmatched gt track whose IoU is at least the
+        threshold, with gt tracks which are not ignored preferred over ignored ones.
+        :param ious: the track IoUs (num_dt x num_gt)
+        :param dt_ids: the detected track ids
+        :param gt_idx_masks: for each ignore mask, the order of the gt tracks (ignored last) (num_ig_masks x num_gt)
+        :param gt_ids_masks: for each ignore mask, the gt track ids in that order (num_ig_masks x num_gt)
+        :param gt_ig_arrays: for each ignore mask, the gt ignore values in that order
+        :return: the matched gt id of each detected track (-1 if unmatched), the matched detected track id of each gt
+                 track (-1 if unmatched) and whether each detected track is matched to an ignored gt track, each as a
+                 (num_ig_masks x num_thrs x num) array
+        """
+        num_masks, num_gt = gt_idx_masks.shape
+        num_thrs, num_dt = len(self.array_labels), len(dt_ids)
+        gt_m = np.zeros((num_masks, num_thrs, num_gt)) - 1
+        dt_m = np.zeros((num_masks, num_thrs, num_dt)) - 1
+        dt_ig = np.zeros((num_masks, num_thrs, num_dt))
+        if num_dt == 0 or num_gt == 0:
+            return dt_m, gt_m, dt_ig
+
+        gt_ig = np.array(gt_ig_arrays).reshape(num_masks, num_gt)
+        gt_not_ig = (gt_ig == 0)[:, np.newaxis, :]
+        ious_sorted = np.moveaxis(ious[:, gt_idx_masks], 0, 1)  # num_masks x num_dt x num_gt
+        iou_thrs = np.minimum(self.array_labels, 1 - 1e-10)[np.newaxis, :, np.newaxis]
+        mask_idx, thr_idx = np.indices((num_masks, num_thrs))
+        for dt_idx, dt_id in enumerate(dt_ids):
+            iou = np.broadcast_to(ious_sorted[:, np.newaxis, dt_idx, :], gt_m.shape)
+            # gt tracks which are unmatched (or matched to a detected track of id 0) with a large enough IoU
+            candidates = np.logical_not(gt_m > 0) & np.logical_not(iou < iou_thrs - np.finfo('float').eps)
+            # ignored gt tracks are only matched if no other gt track can be
+            not_ig_candidates = candidates & gt_not_ig
+            candidates = np.where(np.any(not_ig_candidates, axis=2, keepdims=True), not_ig_candidates, candidates)
+            # the last of the gt tracks with the highest IoU is matched
+            candidate_ious = np.where(candidates, iou, -np.inf)
+            best_iou = np.max(candidate_ious, axis=2, keepdims=True)
+            m = num_gt - 1 - np.argmax((candidate_ious == best_iou)[:, :, ::-1], axis=2)
+            matched = np.any(candidates, axis=2)
+
+            # IoUs within eps of the best IoU are treated as equal, which (rarely) makes the result depend on their
+            # order. These are matched as in the original evaluation, one gt track after the other.
+            ambiguous = np.any(np.logical_not(gt_m > 0) & (iou >= best_iou - np.finfo('float').eps) &
+                               (iou < best_iou), axis=2) | np.isnan(best_iou[:, :, 0])
+            for amb_mask_idx, amb_thr_idx in zip(*np.nonzero(ambiguous)):
+                m[amb_mask_idx, amb_thr_idx] = self._match_track(
+                    iou[amb_mask_idx, amb_thr_idx], gt_m[amb_mask_idx, amb_thr_idx] > 0, gt_ig[amb_mask_idx],
+                    self.array_labels[amb_thr_idx])
+                matched[amb_mask_idx, amb_thr_idx] = m[amb_mask_idx, amb_thr_idx] > -1
+
+            mask_idx_m, thr_idx_m, m = mask_idx[matched], thr_idx[matched], m[matched]
+            # if gt to ignore for some reason update dt_ig.
+            # Should not be used in evaluation.
+            dt_ig[mask_idx_m, thr_idx_m, dt_idx] = gt_ig[mask_idx_m, m]
+            # _dt match found, update gt_m, and dt_m with "id"
+            dt_m[mask_idx_m, thr_idx_m, dt_idx] = gt_ids_masks[mask_idx_m, m]
+            gt_m[mask_idx_m, thr_idx_m, m] = dt_id
+        return dt_m, gt_m, dt_ig
+
+    @staticmethod
+    def _match_track(ious, gt_matched, gt_ig, iou_thr):
+        """
+        Matches one detected track to the gt tracks for one IoU threshold and ignore mask, one gt track after the other
+        :param ious: the IoUs of the detected track with the gt tracks (ignored gt tracks last)
+        :param gt_matched: whether each gt track is already matched
+        :param gt_ig: the gt ignore values
+        :param iou_thr: the IoU threshold
+        :return: the index of the matched gt track, -1 if unmatched
+        """
+        iou = min([iou_thr, 1 - 1e-10])
+        # information about best match so far (m=-1 -> unmatched)
+        m = -1
+        for gt_idx in range(len(ious)):
+            # if this gt already matched continue
+            if gt_matched[gt_idx]:
+                continue
+            # if _dt matched to reg gt, and on ignore gt, stop
+            if m > -1 and gt_ig[m] == 0 and gt_ig[gt_idx] == 1:
+                break
+            # continue to next gt unless better match made
+            if ious[gt_idx] < iou - np.finfo('float').eps:
+                continue
+            # if match successful and best so far, store appropriately
+            iou = ious[gt_idx]
+            m = gt_idx
+        return m
+
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences. Computes precision and recall values based on track matches.
         Adapted from https://github.com/TAO-Dataset/
@@ -180,6 +238,7 @@ class TrackMAP(_BaseMetric):
         )
         recall = -np.ones((num_thrs, self.num_ig_masks))
 
+        ig_idxs, dt_m_masks, dt_ig_masks, num_gt_masks = [], [], [], []
         for ig_idx in range(self.num_ig_masks):
             ig_idx_results = [res[ig_idx] for res in all_res.values() if res[ig_idx] is not None]
 
@@ -217,43 +276,52 @@ class TrackMAP(_BaseMetric):
             if num_gt == 0:
                 continue
 
+            ig_idxs.append(ig_idx)
+            dt_m_masks.append(dt_m)
+            dt_ig_masks.append(dt_ig)
+            num_gt_masks.append(num_gt)
+
+        # Compute precision and recall for all ignore masks and IoU thresholds at once. All sequences have results for
+        # all ignore masks or for none, so the masks have the same detections.
+        if ig_idxs:
+            dt_m = np.stack(dt_m_masks)  # num_ig_masks x num_thrs x num_dt
+            dt_ig = np.stack(dt_ig_masks)
+            num_dt = dt_m.shape[2]
+
             tps = np.logical_and(dt_m != -1, np.logical_not(dt_ig))
             fps = np.logical_and(dt_m == -1, np.logical_not(dt_ig))
 
-            tp_sum = np.cumsum(tps, axis=1).astype(dtype=np.float)
-            fp_sum = np.cumsum(fps, axis=1).astype(dtype=np.float)
+            tp_sum = np.cumsum(tps, axis=2).astype(dtype=np.float)
+            fp_sum = np.cumsum(fps, axis=2).astype(dtype=np.float)
 
-            for iou_thr_idx, (tp, fp) in enumerate(zip(tp_sum, fp_sum)):
-                tp = np.array(tp)
-                fp = np.array(fp)
-                num_tp = len(tp)
-                rc = tp / num_gt
-                if num_tp:
-                    recall[iou_thr_idx, ig_idx] = rc[-1]
-                else:
-                    recall[iou_thr_idx, ig_idx] = 0
+            rc = tp_sum / np.array(num_gt_masks)[:, np.newaxis, np.newaxis]
+            recall[:, ig_idxs] = (rc[:, :, -1] if num_dt else np.zeros(rc.shape[:2])).T
 
-                # np.spacing(1) ~= eps
-                pr = tp / (fp + tp + np.spacing(1))
-                pr = pr.tolist()
+            # np.spacing(1) ~= eps
+            pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
 
-                # Ensure precision values are monotonically decreasing
-                for i in range(num_tp - 1, 0, -1):
-                    if pr[i] > pr[i - 1]:
-                        pr[i - 1] = pr[i]
+            # Ensure precision values are monotonically decreasing
+            pr = np.maximum.accumulate(pr[:, :, ::-1], axis=2)[:, :, ::-1]
 
-                # find indices at the predefined recall values
-                rec_thrs_insert_idx = np.searchsorted(rc, self.rec_thrs, side="left")
+            # find indices at the predefined recall values, i.e. the number of recall values below each recall
+            # threshold. These are counted from the number of (sorted) recall thresholds up to each recall value.
+            rec_thrs_order = np.argsort(self.rec_thrs, kind='mergesort')
+            num_rows = rc.shape[0] * rc.shape[1]
+            num_thrs_up_to = np.searchsorted(np.asarray(self.rec_thrs)[rec_thrs_order], rc, side='right')
+            row_offsets = np.arange(num_rows).reshape(rc.shape[:2] + (1,)) * (num_recalls + 1)
+            thr_counts = np.bincount((num_thrs_up_to + row_offsets).ravel(), minlength=num_rows * (num_recalls + 1))
+            rec_thrs_insert_idx = np.zeros(rc.shape[:2] + (num_recalls,), dtype=int)
+            rec_thrs_insert_idx[:, :, rec_thrs_order] = np.cumsum(
+                thr_counts.reshape(rc.shape[:2] + (num_recalls + 1,)), axis=2)[:, :, :num_recalls]
 
-                pr_at_recall = [0.0] * num_recalls
+            # precision is 0 at the recall thresholds from the first one beyond the final recall on
+            pr_at_recall = np.zeros(rec_thrs_insert_idx.shape)
+            if num_dt:
+                found = np.logical_and.accumulate(rec_thrs_insert_idx < num_dt, axis=2)
+                pr_at_recall[found] = np.take_along_axis(pr, np.minimum(rec_thrs_insert_idx, num_dt - 1),
+                                                         axis=2)[found]
 
-                try:
-                    for _idx, pr_idx in enumerate(rec_thrs_insert_idx):
-                        pr_at_recall[_idx] = pr[pr_idx]
-                except IndexError:
-                    pass
-
-                precision[iou_thr_idx, :, ig_idx] = (np.array(pr_at_recall))
+            precision[:, :, ig_idxs] = np.moveaxis(pr_at_recall, 0, 2)
 
         res = {'precision': precision, 'recall': recall}
 
@@ -345,88 +413,118 @@ class TrackMAP(_BaseMetric):
         return track_ig_masks
 
     @staticmethod
-    def _compute_bb_track_iou(dt_track, gt_track, boxformat='xywh'):
+    def _compute_bb_track_ious(dt, gt, boxformat='xywh'):
         """
-        Calculates the track IoU for one detected track and one ground truth track for bounding boxes
-        :param dt_track: the detected track (format: dictionary with frame index as keys and
+        Calculates the track IoUs of all detected tracks with all ground truth tracks for bounding boxes. The tracks are
+        converted to arrays of the boxes in all frames of the sequence, and only pairs of tracks whose frame spans
+        overlap are intersected (the union of the other pairs is the sum of their areas).
+        :param dt: the detected tracks (format: list of dictionaries with frame index as keys and
                             numpy arrays as values)
-        :param gt_track: the ground truth track (format: dictionary with frame index as keys and
+        :param gt: the ground truth tracks (format: list of dictionaries with frame index as keys and
                         numpy array as values)
         :param boxformat: the format of the boxes
-        :return: the track IoU
+        :return: the track IoUs (num_dt x num_gt)
         """
-        intersect = 0
-        union = 0
-        image_ids = set(gt_track.keys()) | set(dt_track.keys())
-        for image in image_ids:
-            g = gt_track.get(image, None)
-            d = dt_track.get(image, None)
+        if boxformat not in ['xywh', 'x0y0x1y1']:
+            raise TrackEvalException('BoxFormat not implemented')
+        frames = sorted(set().union(*[track.keys() for track in list(dt) + list(gt)]))
+        frame_idx = {frame: idx for idx, frame in enumerate(frames)}
+        num_frames = len(frames)
+        if num_frames == 0:
+            return np.zeros((len(dt), len(gt)))
+
+        def track_arrays(tracks):
+            """Returns the boxes (x0, y0, x1, y1) of the tracks in each frame, whether the tracks are present in each
+            frame, their total areas and their first and last frames"""
+            boxes = np.zeros((len(tracks), num_frames, 4))
+            present = np.zeros((len(tracks), num_frames), dtype=bool)
+            for track_idx, track in enumerate(tracks):
+                idx = [frame_idx[frame] for frame in track.keys()]
+                boxes[track_idx, idx] = np.array(list(track.values()), dtype=float).reshape(len(idx), 4)
+                present[track_idx, idx] = True
             if boxformat == 'xywh':
-                if d is not None and g is not None:
-                    dx, dy, dw, dh = d
-                    gx, gy, gw, gh = g
-                    w = max(min(dx + dw, gx + gw) - max(dx, gx), 0)
-                    h = max(min(dy + dh, gy + gh) - max(dy, gy), 0)
-                    i = w * h
-                    u = dw * dh + gw * gh - i
-                    intersect += i
-                    union += u
-                elif d is None and g is not None:
-                    union += g[2] * g[3]
-                elif d is not None and g is None:
-                    union += d[2] * d[3]
-            elif boxformat == 'x0y0x1y1':
-                if d is not None and g is not None:
-                    dx0, dy0, dx1, dy1 = d
-                    gx0, gy0, gx1, gy1 = g
-                    w = max(min(dx1, gx1) - max(dx0, gx0), 0)
-                    h = max(min(dy1, gy1) - max(dy0, gy0), 0)
-                    i = w * h
-                    u = (dx1 - dx0) * (dy1 - dy0) + (gx1 - gx0) * (gy1 - gy0) - i
-                    intersect += i
-                    union += u
-                elif d is None and g is not None:
-                    union += (g[2] - g[0]) * (g[3] - g[1])
-                elif d is not None and g is None:
-                    union += (d[2] - d[0]) * (d[3] - d[1])
+                areas = boxes[:, :, 2] * boxes[:, :, 3]
+                boxes[:, :, 2:] += boxes[:, :, :2]
             else:
-                raise TrackEvalException('BoxFormat not implemented')
-        if intersect > union:
+                areas = (boxes[:, :, 2] - boxes[:, :, 0]) * (boxes[:, :, 3] - boxes[:, :, 1])
+            first = np.where(np.any(present, axis=1), np.argmax(present, axis=1), num_frames)
+            last = num_frames - 1 - np.argmax(present[:, ::-1], axis=1)
+            return boxes, present, np.sum(areas * present, axis=1), first, last
+
+        dt_boxes, dt_present, dt_areas, dt_first, dt_last = track_arrays(dt)
+        gt_boxes, gt_present, gt_areas, gt_first, gt_last = track_arrays(gt)
+
+        # Intersect the pairs of tracks whose frame spans overlap, in blocks of pairs to limit memory
+        intersect = np.zeros((len(dt), len(gt)))
+        pair_dt, pair_gt = np.nonzero((dt_first[:, np.newaxis] <= gt_last[np.newaxis, :]) &
+                                      (gt_first[np.newaxis, :] <= dt_last[:, np.newaxis]))
+        block_size = max(1, 2 ** 20 // max(1, num_frames))
+        for block_start in range(0, len(pair_dt), block_size):
+            block_dt = pair_dt[block_start:block_start + block_size]
+            block_gt = pair_gt[block_start:block_start + block_size]
+            d, g = dt_boxes[block_dt], gt_boxes[block_gt]
+            w = np.maximum(np.minimum(d[:, :, 2], g[:, :, 2]) - np.maximum(d[:, :, 0], g[:, :, 0]), 0)
+            h = np.maximum(np.minimum(d[:, :, 3], g[:, :, 3]) - np.maximum(d[:, :, 1], g[:, :, 1]), 0)
+            both_present = dt_present[block_dt] & gt_present[block_gt]
+            intersect[block_dt, block_gt] = np.sum(w * h * both_present, axis=1)
+
+        union = dt_areas[:, np.newaxis] + gt_areas[np.newaxis, :] - intersect
+        if np.any(intersect > union):
             raise TrackEvalException("Intersection value > union value. Are the box values corrupted?")
-        return intersect / union if union > 0 else 0
+        ious = np.zeros((len(dt), len(gt)))
+        np.divide(intersect, union, out=ious, where=union > 0)
+        return ious
 
     @staticmethod
-    def _compute_mask_track_iou(dt_track, gt_track):
+    def _compute_mask_track_ious(dt, gt):
         """
-        Calculates the track IoU for one detected track and one ground truth track for segmentation masks
-        :param dt_track: the detected track (format: dictionary with frame index as keys and
+        Calculates the track IoUs of all detected tracks with all ground truth tracks for segmentation masks. The areas
+        and intersections of the masks are computed for all tracks present in a frame at once, so that the number of
+        pycocotools calls grows with the number of frames (not with the number of pairs of tracks times the frames).
+        :param dt: the detected tracks (format: list of dictionaries with frame index as keys and
                             pycocotools rle encoded masks as values)
-        :param gt_track: the ground truth track (format: dictionary with frame index as keys and
+        :param gt: the ground truth tracks (format: list of dictionaries with frame index as keys and
                             pycocotools rle encoded masks as values)
-        :return: the track IoU
+        :return: the track IoUs (num_dt x num_gt)
         """
         # only loaded when needed to reduce minimum requirements
         from pycocotools import mask as mask_utils
 
-        intersect = .0
-        union = .0
-        image_ids = set(gt_track.keys()) | set(dt_track.keys())
-        for image in image_ids:
-            g = gt_track.get(image, None)
-            d = dt_track.get(image, None)
-            if d and g:
-                intersect += mask_utils.area(mask_utils.merge([d, g], True))
-                union += mask_utils.area(mask_utils.merge([d, g], False))
-            elif not d and g:
-                union += mask_utils.area(g)
-            elif d and not g:
-                union += mask_utils.area(d)
-        if union < 0.0 - np.finfo('float').eps:
+        def frame_masks(tracks):
+            """Returns the indices of the tracks present in each frame and their masks"""
+            masks = {}
+            for track_idx, track in enumerate(tracks):
+                for frame, mask in track.items():
+                    if mask:
+                        masks.setdefault(frame, ([], []))
+                        masks[frame][0].append(track_idx)
+                        masks[frame][1].append(mask)
+            return masks
+
+        dt_masks, gt_masks = frame_masks(dt), frame_masks(gt)
+        intersect = np.zeros((len(dt), len(gt)))
+        dt_areas = np.zeros(len(dt))
+        gt_areas = np.zeros(len(gt))
+        for frame in set(dt_masks.keys()) | set(gt_masks.keys()):
+            dt_idx, dt_frame_masks = dt_masks.get(frame, ([], []))
+            gt_idx, gt_frame_masks = gt_masks.get(frame, ([], []))
+            dt_frame_areas = np.array(mask_utils.area(dt_frame_masks), dtype=float) if dt_idx else np.zeros(0)
+            gt_frame_areas = np.array(mask_utils.area(gt_frame_masks), dtype=float) if gt_idx else np.zeros(0)
+            dt_areas[dt_idx] += dt_frame_areas
+            gt_areas[gt_idx] += gt_frame_areas
+            if dt_idx and gt_idx:
+                # With the gt masks marked as crowd, the IoU is the intersection over the area of the detected mask
+                ioa = np.array(mask_utils.iou(dt_frame_masks, gt_frame_masks, [1] * len(gt_idx)), dtype=float)
+                intersect[np.ix_(dt_idx, gt_idx)] += np.round(np.maximum(ioa, 0) * dt_frame_areas[:, np.newaxis])
+
+        union = dt_areas[:, np.newaxis] + gt_areas[np.newaxis, :] - intersect
+        if np.any(union < 0.0 - np.finfo('float').eps):
             raise TrackEvalException("Union value < 0. Are the segmentaions corrupted?")
-        if intersect > union:
+        if np.any(intersect > union):
             raise TrackEvalException("Intersection value > union value. Are the segmentations corrupted?")
-        iou = intersect / union if union > 0.0 + np.finfo('float').eps else 0.0
-        return iou
+        ious = np.zeros((len(dt), len(gt)))
+        np.divide(intersect, union, out=ious, where=union > 0.0 + np.finfo('float').eps)
+        return ious
 
     @staticmethod
     def _compute_track_ious(dt, gt, iou_function='bbox', boxformat='xywh'):
@@ -438,17 +536,12 @@ class TrackMAP(_BaseMetric):
             return []
 
         if iou_function == 'bbox':
-            track_iou_function = partial(TrackMAP._compute_bb_track_iou, boxformat=boxformat)
+            return TrackMAP._compute_bb_track_ious(dt, gt, boxformat=boxformat)
         elif iou_function == 'mask':
-            track_iou_function = partial(TrackMAP._compute_mask_track_iou)
+            return TrackMAP._compute_mask_track_ious(dt, gt)
         else:
             raise Exception('IoU function not implemented')
 
-        ious = np.zeros([len(dt), len(gt)])
-        for i, j in np.ndindex(ious.shape):
-            ious[i, j] = track_iou_function(dt[i], gt[j])
-        return ious
-
     @staticmethod
     def _row_print(*argv):
         """Prints results in an evenly spaced rows, with more space in first row"""
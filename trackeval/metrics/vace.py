@@ -1,6 +1,7 @@
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from .._assignment import sparse_max_score_assignment
 from ._base_metric import _BaseMetric
+from ._shared_products import count_pairs, get_shared_product
 from .. import _timing
 
 
@@ -26,6 +27,8 @@ class VACE(_BaseMetric):
         self._additive_fields = self.integer_fields + ['STDA', 'FDA']
 
         self.threshold = 0.5
+        self.shared_products = [('threshold_matches', self.threshold), ('flat_similarity',), ('id_counts',),
+                                ('max_similarity_matches',)]
 
     @_timing.time
     def eval_sequence(self, data):
@@ -38,60 +41,123 @@ class VACE(_BaseMetric):
             data['tracker_ids']
             data['similarity_scores']
         """
-        res = {}
+        return self._sum_chunk_results(data, [self._eval_chunk(data)])
 
-        # Obtain Average Tracking Accuracy (ATA) using track correspondence.
-        # Obtain counts necessary to compute temporal IOU.
-        # Assume that integer counts can be represented exactly as floats.
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros(data['num_gt_ids'])
-        tracker_id_count = np.zeros(data['num_tracker_ids'])
-        both_present_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the number of frames in which two tracks satisfy the overlap criterion.
-            matches_mask = np.greater_equal(data['similarity_scores'][t], self.threshold)
-            match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
-            potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
-            # Count the number of frames in which the tracks are present.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[tracker_ids_t] += 1
-            both_present_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += 1
-        # Number of frames in which either track is present (union of the two sets of frames).
-        union_count = (gt_id_count[:, np.newaxis]
-                       + tracker_id_count[np.newaxis, :]
-                       - both_present_count)
-        # The denominator should always be non-zero if all tracks are non-empty.
-        with np.errstate(divide='raise', invalid='raise'):
-            temporal_iou = potential_matches_count / union_count
-        # Find assignment that maximizes temporal IOU.
-        match_rows, match_cols = linear_sum_assignment(-temporal_iou)
-        res['STDA'] = temporal_iou[match_rows, match_cols].sum()
-        res['VACE_IDs'] = data['num_tracker_ids']
-        res['VACE_GT_IDs'] = data['num_gt_ids']
+    @_timing.time
+    def eval_sequence_chunked(self, data, chunk_size, chunk_map=map):
+        """ Calculates VACE metrics for one sequence, with the counts over pairs of tracks and the per-frame
+        correspondences computed for chunks of chunk_size timesteps with chunk_map. Gives exactly the same results as
+        eval_sequence.
+        """
+        return self._sum_chunk_results(data, chunk_map(self._eval_chunk, self._split_time_chunks(data, chunk_size)))
+
+    def _eval_chunk(self, chunk):
+        """Returns the counts over pairs of tracks and the per-frame detection accuracies for a sequence (or a chunk of
+        timesteps)"""
+        # Count the number of frames in which two tracks satisfy the overlap criterion, and find the frames in which the
+        # tracks are present.
+        gt_id_count, tracker_id_count = get_shared_product(chunk, 'id_counts')
+        flat = get_shared_product(chunk, 'flat_similarity')
+        res = {'potential_matches': count_pairs(*get_shared_product(chunk, 'threshold_matches', self.threshold)),
+               'gt_dets': (flat['gt_ids'], flat['gt_timesteps']),
+               'tracker_dets': (flat['tracker_ids'], flat['tracker_timesteps']),
+               'num_timesteps': len(chunk['gt_ids']),
+               'gt_id_count': gt_id_count,
+               'tracker_id_count': tracker_id_count,
+               'fda_per_timestep': [],
+               'num_non_empty_timesteps': 0}
 
         # Obtain Frame Detection Accuracy (FDA) using per-frame correspondence.
-        non_empty_count = 0
-        fda = 0
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        for gt_ids_t, tracker_ids_t, similarity, matches in zip(
+                chunk['gt_ids'], chunk['tracker_ids'], chunk['similarity_scores'],
+                get_shared_product(chunk, 'max_similarity_matches')):
             n_g = len(gt_ids_t)
             n_d = len(tracker_ids_t)
             if not (n_g or n_d):
                 continue
             # n_g > 0 or n_d > 0
-            non_empty_count += 1
+            res['num_non_empty_timesteps'] += 1
             if not (n_g and n_d):
                 continue
             # n_g > 0 and n_d > 0
-            spatial_overlap = data['similarity_scores'][t]
-            match_rows, match_cols = linear_sum_assignment(-spatial_overlap)
-            overlap_ratio = spatial_overlap[match_rows, match_cols].sum()
-            fda += overlap_ratio / (0.5 * (n_g + n_d))
+            match_rows, match_cols = matches
+            overlap_ratio = similarity[match_rows, match_cols].sum()
+            res['fda_per_timestep'].append(overlap_ratio / (0.5 * (n_g + n_d)))
+        return res
+
+    def _sum_chunk_results(self, data, chunk_results):
+        """Calculates VACE metrics for one sequence from the results of its chunks (see _eval_chunk)"""
+        # Obtain Average Tracking Accuracy (ATA) using track correspondence.
+        # Obtain counts necessary to compute temporal IOU.
+        # Assume that integer counts can be represented exactly as floats.
+        res = {}
+        potential_matches, gt_dets, tracker_dets = [], [], []
+        timestep_offset = 0
+        gt_id_count = np.zeros(data['num_gt_ids'])
+        tracker_id_count = np.zeros(data['num_tracker_ids'])
+        non_empty_count = 0
+        fda = 0
+        for chunk_res in chunk_results:
+            potential_matches.append(chunk_res['potential_matches'])
+            gt_dets.append((chunk_res['gt_dets'][0], chunk_res['gt_dets'][1] + timestep_offset))
+            tracker_dets.append((chunk_res['tracker_dets'][0], chunk_res['tracker_dets'][1] + timestep_offset))
+            timestep_offset += chunk_res['num_timesteps']
+            gt_id_count[:len(chunk_res['gt_id_count'])] += chunk_res['gt_id_count']
+            tracker_id_count[:len(chunk_res['tracker_id_count'])] += chunk_res['tracker_id_count']
+            non_empty_count += chunk_res['num_non_empty_timesteps']
+            # Summed frame by frame
+            for fda_t in chunk_res['fda_per_timestep']:
+                fda += fda_t
+        gt_ids, tracker_ids, potential_matches_count = count_pairs(
+            *(np.concatenate(values) for values in zip(*potential_matches)))
+        both_present_count = self._count_both_present(gt_ids, tracker_ids,
+                                                      *(np.concatenate(values) for values in zip(*gt_dets)),
+                                                      *(np.concatenate(values) for values in zip(*tracker_dets)))
+        res['STDA'] = self._compute_stda(gt_ids, tracker_ids, potential_matches_count, both_present_count,
+                                         gt_id_count, tracker_id_count)
+        res['VACE_IDs'] = data['num_tracker_ids']
+        res['VACE_GT_IDs'] = data['num_gt_ids']
         res['FDA'] = fda
         res['num_non_empty_timesteps'] = non_empty_count
 
         res.update(self._compute_final_fields(res))
         return res
 
+    @staticmethod
+    def _count_both_present(gt_ids, tracker_ids, gt_det_ids, gt_det_timesteps, tracker_det_ids,
+                            tracker_det_timesteps):
+        """ Counts the number of frames in which both tracks of each (gt_id, tracker_id) pair are present, given the ids
+        and timesteps of all gt dets and tracker dets. The timesteps of the shorter track of each pair are looked up in
+        the timesteps of the other track, so that this takes time in the order of the summed length of the pairs.
+        """
+        both_present_count = np.zeros(len(gt_ids), dtype=np.int64)
+        gt_timesteps = _TrackTimesteps(gt_det_ids, gt_det_timesteps)
+        tracker_timesteps = _TrackTimesteps(tracker_det_ids, tracker_det_timesteps)
+        gt_shorter = gt_timesteps.count(gt_ids) <= tracker_timesteps.count(tracker_ids)
+        for pairs, shorter, shorter_ids, longer, longer_ids in [
+                (np.flatnonzero(gt_shorter), gt_timesteps, gt_ids, tracker_timesteps, tracker_ids),
+                (np.flatnonzero(~gt_shorter), tracker_timesteps, tracker_ids, gt_timesteps, gt_ids)]:
+            pair_idx, timesteps = shorter.expand(shorter_ids[pairs])
+            is_present = longer.contains(longer_ids[pairs][pair_idx], timesteps)
+            both_present_count[pairs] = np.bincount(pair_idx[is_present], minlength=len(pairs))
+        return both_present_count
+
+    @staticmethod
+    def _compute_stda(gt_ids, tracker_ids, potential_matches_count, both_present_count, gt_id_count,
+                      tracker_id_count):
+        """ Calculates the STDA from the counts of frames in which pairs of tracks match and are both present, given
+        for the (gt_id, tracker_id) pairs which match in at least one frame. The temporal IOU of all other pairs is
+        zero, so that only these pairs are needed."""
+        # Number of frames in which either track is present (union of the two sets of frames).
+        union_count = (gt_id_count[gt_ids]
+                       + tracker_id_count[tracker_ids]
+                       - both_present_count)
+        # The denominator should always be non-zero if all tracks are non-empty.
+        with np.errstate(divide='raise', invalid='raise'):
+            temporal_iou = potential_matches_count / union_count
+        # Find assignment that maximizes temporal IOU.
+        return temporal_iou[sparse_max_score_assignment(gt_ids, tracker_ids, temporal_iou)].sum()
+
     def combine_classes_class_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the class values"""
         res = {}
@@ -124,3 +190,31 @@ class VACE(_BaseMetric):
                             (0.5 * (additive['VACE_IDs'] + additive['VACE_GT_IDs'])))
             final['SFDA'] = additive['FDA'] / additive['num_non_empty_timesteps']
         return final
+
+
+class _TrackTimesteps:
+    """The timesteps in which each track is present, sorted by track id and timestep"""
+
+    def __init__(self, det_ids, det_timesteps):
+        order = np.lexsort((det_timesteps, det_ids))
+        self.keys = (det_ids[order].astype(np.int64) << 32) | det_timesteps[order].astype(np.int64)
+        self.timesteps = det_timesteps[order]
+        self.counts = np.bincount(det_ids)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def count(self, ids):
+        """Returns the number of timesteps in which each of the ids is present"""
+        return self.counts[ids]
+
+    def expand(self, ids):
+        """Returns the timesteps in which each of the ids is present, concatenated, and the index into ids of each"""
+        counts = self.counts[ids]
+        idx = np.repeat(np.arange(len(ids)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return idx, self.timesteps[self.starts[ids][idx] + offsets]
+
+    def contains(self, ids, timesteps):
+        """Returns whether the tracks of ids are present in timesteps"""
+        keys = (ids.astype(np.int64) << 32) | timesteps.astype(np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        return self.keys[pos] == keys if len(self.keys) > 0 else np.zeros(len(keys), dtype=bool)
@@ -0,0 +1,471 @@
+""" Online evaluation of a single tracker on a single sequence, one frame at a time.
+
+The metrics in trackeval.metrics evaluate a whole sequence at once from lists of per-timestep arrays. The
+StreamingEvaluator instead ingests frames as a tracker produces them and keeps running state for CLEAR, Identity, VACE
+and HOTA, so that the memory use does not grow with the length of the sequence:
+    - Per-frame statistics (TP/FN/FP, IDSW, Frag, FDA, ...) are accumulated directly.
+    - Statistics over (gt_id, tracker_id) pairs are stored sparsely, and grow with the number of distinct pairs which
+      are matched (or present) at the same time, rather than with the number of frames.
+    - HOTA needs the global alignment between ids, which is only known at the end of the sequence, to match the
+      detections of each frame. Frames are therefore written to a temporary frame log on disk and matched in a second
+      pass when finish() is called.
+The results of finish() are the same as those of eval_sequence() of each metric on the whole sequence.
+
+Example:
+    evaluator = trackeval.StreamingEvaluator([trackeval.metrics.HOTA(), trackeval.metrics.CLEAR()])
+    for gt_ids, gt_dets, tracker_ids, tracker_dets in frames:
+        evaluator.add_frame(gt_ids, gt_dets, tracker_ids, tracker_dets)
+    res = evaluator.finish()  # e.g. res['HOTA']['HOTA']
+"""
+
+import tempfile
+import numpy as np
+from abc import ABC, abstractmethod
+from ._assignment import max_score_assignment
+from . import _timing
+from . import utils
+from .utils import TrackEvalException
+from .metrics import HOTA, CLEAR, Identity, VACE, Count
+from .datasets._base_dataset import _BaseDataset
+
+
+class StreamingEvaluator:
+    """Evaluates a set of metrics on one sequence, given one frame at a time"""
+
+    @staticmethod
+    def get_default_streaming_config():
+        """Returns the default config values for streaming evaluation"""
+        default_config = {
+            'BOX_FORMAT': 'xywh',  # Valid: 'xywh', 'x0y0x1y1'. Format of the boxes given to add_frame.
+            'FRAME_LOG_FOLDER': None,  # Folder of the temporary HOTA frame log. None for the default temp folder.
+            'PRINT_CONFIG': False,
+        }
+        return default_config
+
+    def __init__(self, metrics_list, config=None):
+        """Initialise the streaming evaluator with a list of metric objects (HOTA, CLEAR, Identity and VACE)"""
+        self.config = utils.init_config(config, self.get_default_streaming_config(), 'Streaming')
+        metrics_list = metrics_list + [Count()]  # Count metrics are always run
+        self.metric_names = utils.validate_metrics_list(metrics_list)
+        accumulator_classes = {HOTA: _StreamingHOTA, CLEAR: _StreamingCLEAR, Identity: _StreamingIdentity,
+                               VACE: _StreamingVACE, Count: _StreamingCount}
+        self.accumulators = []
+        for metric in metrics_list:
+            if type(metric) not in accumulator_classes:
+                raise TrackEvalException('Metric %s is not supported for streaming evaluation.' % metric.get_name())
+            if np.ndim(getattr(metric, 'threshold', 0)) > 0:
+                raise TrackEvalException('Streaming evaluation of %s supports a single THRESHOLD only.'
+                                         % metric.get_name())
+            self.accumulators.append(accumulator_classes[type(metric)](metric, self.config))
+
+        self.gt_ids = _IdCounter()
+        self.tracker_ids = _IdCounter()
+        self.num_timesteps = 0
+        self.finished = False
+
+    def add_frame(self, gt_ids, gt_dets, tracker_ids, tracker_dets, similarity_scores=None):
+        """ Adds the next frame of the sequence.
+        gt_ids and tracker_ids are the (arbitrary integer) ids of the gt and tracker detections in the frame, and
+        gt_dets and tracker_dets their boxes in the BOX_FORMAT of the config. Instead of boxes, the similarity scores
+        between the gt and tracker detections (e.g. mask IoUs) can be given, with shape (num_gt, num_tracker).
+        The detections must already be preprocessed as needed by the benchmark (e.g. with distractors removed).
+        """
+        if self.finished:
+            raise TrackEvalException('Frames cannot be added after the streaming evaluation is finished.')
+        gt_ids = np.asarray(gt_ids, dtype=np.int64).reshape(-1)
+        tracker_ids = np.asarray(tracker_ids, dtype=np.int64).reshape(-1)
+        if len(np.unique(gt_ids)) != len(gt_ids) or len(np.unique(tracker_ids)) != len(tracker_ids):
+            raise TrackEvalException('Gt and tracker ids must be unique in each frame (frame %i).'
+                                     % (self.num_timesteps + 1))
+        if similarity_scores is None:
+            gt_dets = np.asarray(gt_dets, dtype=np.float64).reshape(-1, 4)
+            tracker_dets = np.asarray(tracker_dets, dtype=np.float64).reshape(-1, 4)
+            similarity_scores = _BaseDataset._calculate_box_ious(gt_dets, tracker_dets,
+                                                                 box_format=self.config['BOX_FORMAT'])
+        similarity_scores = np.asarray(similarity_scores, dtype=np.float64).reshape(len(gt_ids), len(tracker_ids))
+
+        # Ids are relabelled to 0, 1, ... in order of appearance, as the metrics index their statistics by id.
+        gt_ids_t = self.gt_ids.add(gt_ids)
+        tracker_ids_t = self.tracker_ids.add(tracker_ids)
+        self.num_timesteps += 1
+        for accumulator in self.accumulators:
+            accumulator.add_frame(gt_ids_t, tracker_ids_t, similarity_scores)
+
+    @_timing.time
+    def finish(self):
+        """ Finishes the evaluation and returns the results for the sequence, indexed like res[metric_name][field].
+        No more frames can be added afterwards.
+        """
+        if self.finished:
+            raise TrackEvalException('The streaming evaluation is already finished.')
+        self.finished = True
+        counts = {'num_gt_ids': self.gt_ids.num_ids,
+                  'num_tracker_ids': self.tracker_ids.num_ids,
+                  'num_gt_dets': int(self.gt_ids.counts.sum()),
+                  'num_tracker_dets': int(self.tracker_ids.counts.sum()),
+                  'num_timesteps': self.num_timesteps,
+                  'gt_id_count': self.gt_ids.counts,
+                  'tracker_id_count': self.tracker_ids.counts}
+        return {metric_name: accumulator.finish(counts)
+                for metric_name, accumulator in zip(self.metric_names, self.accumulators)}
+
+
+class _IdCounter:
+    """Relabels ids to 0, 1, ... in order of appearance and counts the number of detections of each id"""
+
+    def __init__(self):
+        self.index = {}
+        self._counts = np.zeros(16)
+
+    @property
+    def num_ids(self):
+        return len(self.index)
+
+    @property
+    def counts(self):
+        return self._counts[:len(self.index)]
+
+    def add(self, ids):
+        relabelled = np.array([self.index.setdefault(i, len(self.index)) for i in ids.tolist()], dtype=np.int64)
+        self._counts = _ensure_size(self._counts, len(self.index), 0)
+        self._counts[relabelled] += 1
+        return relabelled
+
+
+def _ensure_size(array, size, fill_value):
+    """Returns array, or a copy which is extended with fill_value (doubling its size) to hold at least size values"""
+    if size <= len(array):
+        return array
+    extended = np.full(max(size, 2 * len(array)), fill_value, dtype=array.dtype)
+    extended[:len(array)] = array
+    return extended
+
+
+class _PairSums:
+    """ Sparse sums of values over (gt_id, tracker_id) pairs.
+    Added values are buffered and merged into one entry per pair once the buffer is large, so that memory grows with
+    the number of distinct pairs. Values are summed in the order in which they are added, which gives exactly the same
+    sums as accumulating them into a dense matrix frame by frame.
+    """
+
+    buffer_size = 1 << 16
+
+    def __init__(self, value_shape=()):
+        self.value_shape = value_shape
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((0,) + value_shape)
+        self.buffer = []
+        self.buffered = 0
+
+    def add(self, gt_ids, tracker_ids, values):
+        if len(gt_ids) == 0:
+            return
+        self.buffer.append((self._get_keys(gt_ids, tracker_ids), values))
+        self.buffered += len(gt_ids)
+        if self.buffered >= self.buffer_size:
+            self.merge()
+
+    def merge(self):
+        """Merges the buffered values into the sums, and returns the pairs (sorted) and their sums"""
+        if self.buffer:
+            keys = np.concatenate([self.keys] + [keys for keys, _ in self.buffer])
+            values = np.concatenate([self.values] + [values for _, values in self.buffer])
+            self.keys, inverse = np.unique(keys, return_inverse=True)
+            self.values = np.zeros((len(self.keys),) + self.value_shape)
+            np.add.at(self.values, inverse, values)
+            self.buffer = []
+            self.buffered = 0
+        return self.keys >> 32, self.keys & 0xffffffff, self.values
+
+    def lookup(self, gt_ids, tracker_ids):
+        """Returns the sums for pairs of ids (arrays of the same shape), zero for pairs without values"""
+        self.merge()
+        keys = self._get_keys(gt_ids, tracker_ids)
+        if len(self.keys) == 0:
+            return np.zeros(keys.shape + self.value_shape)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.values[pos], 0)
+
+    @staticmethod
+    def _get_keys(gt_ids, tracker_ids):
+        return (np.asarray(gt_ids, dtype=np.int64) << 32) | np.asarray(tracker_ids, dtype=np.int64)
+
+
+class _StreamingAccumulator(ABC):
+    """Running state of one metric. Receives the frames with relabelled ids, and returns the results at the end."""
+
+    def __init__(self, metric, config):
+        self.metric = metric
+
+    def add_frame(self, gt_ids_t, tracker_ids_t, similarity):
+        pass
+
+    @abstractmethod
+    def finish(self, counts):
+        ...
+
+
+class _StreamingCount(_StreamingAccumulator):
+    """Count metric, from the counts kept by the StreamingEvaluator"""
+
+    def finish(self, counts):
+        return {'Dets': counts['num_tracker_dets'],
+                'GT_Dets': counts['num_gt_dets'],
+                'IDs': counts['num_tracker_ids'],
+                'GT_IDs': counts['num_gt_ids'],
+                'Frames': counts['num_timesteps']}
+
+
+class _StreamingCLEAR(_StreamingAccumulator):
+    """CLEAR metrics, following CLEAR.eval_sequence frame by frame"""
+
+    def __init__(self, metric, config):
+        super().__init__(metric, config)
+        self.res = {field: 0 for field in metric.fields}
+        self.gt_matched_count = np.zeros(16)  # For MT/ML/PT
+        self.gt_frag_count = np.zeros(16)  # For Frag
+        self.prev_tracker_id = np.nan * np.zeros(16)  # For scoring IDSW
+        # Tracker ids matched to gt ids in the previous timestep with gt and tracker detections (for matching IDSW).
+        self.prev_timestep_tracker_id = {}
+
+    def add_frame(self, gt_ids_t, tracker_ids_t, similarity):
+        res = self.res
+        if len(gt_ids_t) == 0:
+            res['CLR_FP'] += len(tracker_ids_t)
+            return
+        if len(tracker_ids_t) == 0:
+            res['CLR_FN'] += len(gt_ids_t)
+            return
+        num_gt_ids = np.max(gt_ids_t) + 1
+        self.gt_matched_count = _ensure_size(self.gt_matched_count, num_gt_ids, 0)
+        self.gt_frag_count = _ensure_size(self.gt_frag_count, num_gt_ids, 0)
+        self.prev_tracker_id = _ensure_size(self.prev_tracker_id, num_gt_ids, np.nan)
+
+        # Calc score matrix to first minimise IDSWs from previous frame, and then maximise MOTP secondarily
+        prev_timestep_tracker_id = np.array([self.prev_timestep_tracker_id.get(gt_id, np.nan)
+                                             for gt_id in gt_ids_t.tolist()])
+        score_mat = (tracker_ids_t[np.newaxis, :] == prev_timestep_tracker_id[:, np.newaxis])
+        score_mat = 1000 * score_mat + similarity
+        score_mat[similarity < self.metric.threshold - np.finfo('float').eps] = 0
+
+        # Hungarian algorithm to find best matches
+        match_rows, match_cols = max_score_assignment(score_mat)
+        actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
+        match_rows = match_rows[actually_matched_mask]
+        match_cols = match_cols[actually_matched_mask]
+
+        matched_gt_ids = gt_ids_t[match_rows]
+        matched_tracker_ids = tracker_ids_t[match_cols]
+
+        # Calc IDSW for MOTA
+        prev_matched_tracker_ids = self.prev_tracker_id[matched_gt_ids]
+        is_idsw = (np.logical_not(np.isnan(prev_matched_tracker_ids))) & (
+            np.not_equal(matched_tracker_ids, prev_matched_tracker_ids))
+        res['IDSW'] += np.sum(is_idsw)
+
+        # Update counters for MT/ML/PT/Frag and record for IDSW/Frag for next timestep
+        self.gt_matched_count[matched_gt_ids] += 1
+        for gt_id in matched_gt_ids.tolist():
+            if gt_id not in self.prev_timestep_tracker_id:
+                self.gt_frag_count[gt_id] += 1
+        self.prev_tracker_id[matched_gt_ids] = matched_tracker_ids
+        self.prev_timestep_tracker_id = dict(zip(matched_gt_ids.tolist(), matched_tracker_ids.tolist()))
+
+        # Calculate and accumulate basic statistics
+        num_matches = len(matched_gt_ids)
+        res['CLR_TP'] += num_matches
+        res['CLR_FN'] += len(gt_ids_t) - num_matches
+        res['CLR_FP'] += len(tracker_ids_t) - num_matches
+        if num_matches > 0:
+            res['MOTP_sum'] += sum(similarity[match_rows, match_cols])
+
+    def finish(self, counts):
+        # Return result quickly if tracker or gt sequence is empty
+        if counts['num_tracker_dets'] == 0 or counts['num_gt_dets'] == 0:
+            res = {field: 0 for field in self.metric.fields}
+            if counts['num_tracker_dets'] == 0:
+                res['CLR_FN'] = counts['num_gt_dets']
+                res['ML'] = counts['num_gt_ids']
+            else:
+                res['CLR_FP'] = counts['num_tracker_dets']
+            res['MLR'] = 1.0
+            return res
+
+        # Calculate MT/ML/PT/Frag/MOTP
+        res = self.res
+        num_gt_ids = counts['num_gt_ids']
+        gt_id_count = counts['gt_id_count']
+        gt_matched_count = _ensure_size(self.gt_matched_count, num_gt_ids, 0)[:num_gt_ids]
+        gt_frag_count = self.gt_frag_count
+        tracked_ratio = gt_matched_count[gt_id_count > 0] / gt_id_count[gt_id_count > 0]
+        res['MT'] = np.sum(np.greater(tracked_ratio, 0.8))
+        res['PT'] = np.sum(np.greater_equal(tracked_ratio, 0.2)) - res['MT']
+        res['ML'] = num_gt_ids - res['MT'] - res['PT']
+        res['Frag'] = np.sum(np.subtract(gt_frag_count[gt_frag_count > 0], 1))
+        res['MOTP'] = res['MOTP_sum'] / np.maximum(1.0, res['CLR_TP'])
+
+        res['CLR_Frames'] = counts['num_timesteps']
+
+        # Calculate final CLEAR scores
+        return self.metric._compute_final_fields(res)
+
+
+class _StreamingIdentity(_StreamingAccumulator):
+    """Identity metrics, following Identity.eval_sequence with sparse counts of potential matches"""
+
+    def __init__(self, metric, config):
+        super().__init__(metric, config)
+        self.potential_matches_count = _PairSums()
+
+    def add_frame(self, gt_ids_t, tracker_ids_t, similarity):
+        # Count the potential matches between ids in each timestep
+        match_idx_gt, match_idx_tracker = np.nonzero(np.greater_equal(similarity, self.metric.threshold))
+        self.potential_matches_count.add(gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker],
+                                         np.ones(len(match_idx_gt)))
+
+    def finish(self, counts):
+        res = {field: 0 for field in self.metric.fields}
+
+        # Return result quickly if tracker or gt sequence is empty
+        if counts['num_tracker_dets'] == 0:
+            res['IDFN'] = counts['num_gt_dets']
+            return res
+        if counts['num_gt_dets'] == 0:
+            res['IDFP'] = counts['num_tracker_dets']
+            return res
+
+        gt_ids, tracker_ids, potential_matches_count = self.potential_matches_count.merge()
+        return self.metric._compute_id_scores(gt_ids, tracker_ids, potential_matches_count, counts['gt_id_count'],
+                                              counts['tracker_id_count'])
+
+
+class _StreamingVACE(_StreamingAccumulator):
+    """VACE metrics, following VACE.eval_sequence with sparse counts over pairs of ids"""
+
+    def __init__(self, metric, config):
+        super().__init__(metric, config)
+        self.potential_matches_count = _PairSums()
+        self.both_present_count = _PairSums()
+        self.non_empty_count = 0
+        self.fda = 0
+
+    def add_frame(self, gt_ids_t, tracker_ids_t, similarity):
+        # Count the number of frames in which two tracks satisfy the overlap criterion, and in which both are present.
+        match_idx_gt, match_idx_tracker = np.nonzero(np.greater_equal(similarity, self.metric.threshold))
+        self.potential_matches_count.add(gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker],
+                                         np.ones(len(match_idx_gt)))
+        both_present_gt, both_present_tracker = np.meshgrid(gt_ids_t, tracker_ids_t, indexing='ij')
+        self.both_present_count.add(both_present_gt.ravel(), both_present_tracker.ravel(),
+                                    np.ones(both_present_gt.size))
+
+        # Obtain Frame Detection Accuracy (FDA) using per-frame correspondence.
+        n_g = len(gt_ids_t)
+        n_d = len(tracker_ids_t)
+        if not (n_g or n_d):
+            return
+        self.non_empty_count += 1
+        if not (n_g and n_d):
+            return
+        match_rows, match_cols = max_score_assignment(similarity)
+        overlap_ratio = similarity[match_rows, match_cols].sum()
+        self.fda += overlap_ratio / (0.5 * (n_g + n_d))
+
+    def finish(self, counts):
+        res = {}
+        num_gt_ids = counts['num_gt_ids']
+        num_tracker_ids = counts['num_tracker_ids']
+        gt_ids, tracker_ids, potential_matches_count = self.potential_matches_count.merge()
+        both_present_count = self.both_present_count.lookup(gt_ids, tracker_ids)
+        res['STDA'] = self.metric._compute_stda(gt_ids, tracker_ids, potential_matches_count, both_present_count,
+                                                counts['gt_id_count'], counts['tracker_id_count'])
+        res['VACE_IDs'] = num_tracker_ids
+        res['VACE_GT_IDs'] = num_gt_ids
+        res['FDA'] = self.fda
+        res['num_non_empty_timesteps'] = self.non_empty_count
+
+        res.update(self.metric._compute_final_fields(res))
+        return res
+
+
+class _StreamingHOTA(_StreamingAccumulator):
+    """ HOTA metrics, following HOTA.eval_sequence.
+    The first pass (counting potential matches between ids) is done as frames are added. Frames with both gt and
+    tracker detections are written to a temporary frame log, which is read back for the second pass at the end. The
+    matches of the second pass are reduced to the number of matches of each id pair for each alpha value as they are
+    found, from which HOTA._compute_pair_count_fields calculates the scores.
+    """
+
+    def __init__(self, metric, config):
+        super().__init__(metric, config)
+        self.potential_matches_count = _PairSums()
+        self.frame_log = tempfile.TemporaryFile(dir=config['FRAME_LOG_FOLDER'])
+        self.num_logged_frames = 0
+
+    def add_frame(self, gt_ids_t, tracker_ids_t, similarity):
+        # Frames without gt or tracker detections do not need to be matched.
+        if len(gt_ids_t) == 0 or len(tracker_ids_t) == 0:
+            return
+
+        # Count the potential matches between ids in each timestep
+        # These are normalised, weighted by the match similarity.
+        sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
+        sim_iou = np.zeros_like(similarity)
+        sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+        sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+        # Pairs without overlap do not change the counts and are not stored.
+        match_idx_gt, match_idx_tracker = np.nonzero(sim_iou)
+        self.potential_matches_count.add(gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker],
+                                         sim_iou[match_idx_gt, match_idx_tracker])
+
+        for array in (gt_ids_t, tracker_ids_t, similarity):
+            np.save(self.frame_log, array, allow_pickle=False)
+        self.num_logged_frames += 1
+
+    def finish(self, counts):
+        try:
+            return self._finish(counts)
+        finally:
+            self.frame_log.close()
+
+    def _finish(self, counts):
+        metric = self.metric
+        num_alphas = len(metric.array_labels)
+
+        # Return result quickly if tracker or gt sequence is empty
+        if counts['num_tracker_dets'] == 0 or counts['num_gt_dets'] == 0:
+            return metric.eval_sequence(counts)
+
+        gt_id_count = counts['gt_id_count']
+        tracker_id_count = counts['tracker_id_count']
+        matches_counts = _PairSums(value_shape=(num_alphas,))
+        level_similarity_sums = np.zeros(num_alphas + 1)
+
+        # Replay the logged frames to match the detections of each timestep, with the overall jaccard alignment score
+        # (before unique matching) between ids.
+        self.frame_log.seek(0)
+        for _ in range(self.num_logged_frames):
+            gt_ids_t, tracker_ids_t, similarity = [np.load(self.frame_log, allow_pickle=False) for _ in range(3)]
+
+            # Get matching scores between pairs of dets for optimizing HOTA
+            potential_matches = self.potential_matches_count.lookup(gt_ids_t[:, np.newaxis],
+                                                                    tracker_ids_t[np.newaxis, :])
+            global_alignment_score = potential_matches / (gt_id_count[gt_ids_t][:, np.newaxis]
+                                                          + tracker_id_count[tracker_ids_t][np.newaxis, :]
+                                                          - potential_matches)
+            score_mat = global_alignment_score * similarity
+
+            # Hungarian algorithm to find best matches
+            match_rows, match_cols = max_score_assignment(score_mat)
+
+            # Count the matches of each id pair for the alpha values up to their similarity (see
+            # HOTA._compute_alpha_fields).
+            match_similarities = similarity[match_rows, match_cols]
+            match_levels = metric._get_match_levels(match_similarities)
+            matches_counts.add(gt_ids_t[match_rows], tracker_ids_t[match_cols],
+                               (match_levels[:, np.newaxis] > np.arange(num_alphas)).astype(np.float))
+            level_similarity_sums += np.bincount(match_levels, weights=match_similarities, minlength=num_alphas + 1)
+
+        gt_ids, tracker_ids, matches_count = matches_counts.merge()
+        similarity_sums = np.cumsum(level_similarity_sums[::-1])[::-1][1:]
+        return metric._compute_pair_count_fields(counts, gt_ids, tracker_ids, matches_count, similarity_sums,
+                                                 gt_id_count, tracker_id_count)